@@ -3,19 +3,53 @@ Dashboard API endpoints for financial data and KPI metrics.
 Cleaned up version with only used endpoints.
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, send_file, stream_with_context, url_for
 import psycopg2
 import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import calendar
-from decimal import Decimal
 from dateutil.relativedelta import relativedelta
-import openai
+
+from app.services.account_table import (
+    ACCOUNT_COLUMNS, DICTIONARY_COLUMNS, SERIES_COLUMNS, PracticeInput, TerritoryInputs,
+    account_metrics, compute_partition, merge_partitions, partition_totals
+)
+from app.services.ai_summary import FALLBACK_ANALYSIS, AISummaries, generator_from_env, summary_key
+from app.services.collector_costs import check_targets, parse_collector_edit, upsert_collector_costs
+from app.services.drilldown import DRILLDOWN_LEVELS, build_drilldown_tree, find_subtree
+from app.services.exports import (
+    EXPORT_DATASETS, EXPORT_FORMATS, dataset_query, export_filename, format_available,
+    iter_query_batches, iter_row_batches, stream_export
+)
+from app.services.jobs import JobQueueFull, ReportJobs
+from app.services.payer_mix import payer_mix_by_practice, rebuild_payer_mix
+from app.services.pl_cache import PLCache, month_names_between
+from app.services.qbo_sync import QBOClient, QBOSync
+from app.services.qbo_transform import transform_qbo_transactions
+from app.services.range_index import PracticeRangeIndex, RangeIndexManager
+from app.services.sample_accounts import resolve_sample_accounts
+from app.services.table_cache import AccountTableCache
+from app.utils.db import ConnectionPool, db_executor, fetch_concurrently
+from app.utils.generations import ACCOUNT_TABLE, RANGE_INDEX, bump_generations, read_generation
+from app.utils.money import dollars
+from app.utils.queries import (
+    ACCOUNT_DRILLDOWN, PAYER_MIX, PAYER_MIX_FOR_PRACTICES, PRACTICE_COLLECTOR, PRACTICE_MONTHLY_PLACEMENTS,
+    PRACTICE_PERIOD_COLLECTIONS, PRACTICE_PLACEMENTS,
+    QBO_TRANSACTION_TOTALS, TERRITORY_ACCOUNT_COUNTS, TERRITORY_COGS_EXPENSE, TERRITORY_COGS_EXPENSE_MONTHS,
+    TERRITORY_COLLECTOR_COSTS, TERRITORY_PERFORMANCE, TERRITORY_SAMPLES, queries
+)
+from app.utils.responses import compress_response, json_response, to_columnar
+from app.utils.singleflight import SingleFlight, request_key
 
 load_dotenv()
 
 dashboard_bp = Blueprint('dashboard', __name__)
+dashboard_bp.after_request(compress_response)
+
+# Panels of each page's bootstrap endpoint, selectable with fields=...
+DASHBOARD_BOOTSTRAP_FIELDS = ('live_data', 'ai_summary')
+ACCOUNT_TABLE_BOOTSTRAP_FIELDS = ('table', 'metrics', 'payer_mix')
 
 def get_db_connection():
     """Get database connection."""
@@ -35,302 +69,255 @@ def get_db_connection():
             password='OMT8459sl!'
         )
 
+# Identical account-table computations in flight are shared between requests.
+# Set SINGLEFLIGHT_ADVISORY=true to also elect one leader across worker processes.
+account_table_flight = SingleFlight(
+    get_connection=get_db_connection,
+    advisory=os.getenv('SINGLEFLIGHT_ADVISORY', 'false').lower() == 'true',
+    on_shared=lambda key, payload: cache_shared_account_table(key, payload)
+)
+
+# Connections for work fanned out within a request
+db_pool = ConnectionPool(get_db_connection, max_connections=int(os.getenv('DB_POOL_SIZE', '8')))
+
+# Computed account tables by period; collector edits patch them in place.
+# ACCOUNT_TABLE_CACHE_SECONDS=0 turns the cache off.
+account_table_cache = AccountTableCache(ttl_seconds=int(os.getenv('ACCOUNT_TABLE_CACHE_SECONDS', '300')))
+
+# P&L facts for the live dashboard, loaded once per worker and reloaded
+# after pl_consolidated changes (see app/services/pl_cache.py)
+pl_cache = PLCache(get_connection=get_db_connection, check_seconds=int(os.getenv('PL_CACHE_CHECK_SECONDS', '60')))
+
+# Prefix sums of daily per-practice totals answer date-range aggregates
+# without scanning sample_billing (see app/services/range_index.py).
+# RANGE_INDEX=false turns it off; queries fall back to SQL until it is built.
+def read_range_index_generation():
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            return read_generation(cursor, RANGE_INDEX)
+        finally:
+            cursor.close()
+
+range_index = RangeIndexManager(
+    get_connection=get_db_connection,
+    path=os.getenv('RANGE_INDEX_PATH', 'cache/range_index.npz'),
+    check_seconds=int(os.getenv('RANGE_INDEX_CHECK_SECONDS', '60')),
+    enabled=os.getenv('RANGE_INDEX', 'true').lower() == 'true',
+    read_generation=read_range_index_generation
+)
+
+# AI summaries are generated off the request thread and stored by data hash
+# (see app/services/ai_summary.py)
+ai_summaries = AISummaries(
+    get_connection=get_db_connection,
+    generator=generator_from_env(),
+    max_workers=int(os.getenv('AI_SUMMARY_WORKERS', '1'))
+)
+
+# QBO transactions are copied into raw.qbo_transactions by an incremental
+# sync (see app/services/qbo_sync.py) and transformed into staging and
+# analytics tables after each sync (app/services/qbo_transform.py);
+# dashboards read the local tables. QBO_SYNC_INTERVAL_SECONDS=0 leaves the
+# sync to scripts/sync_qbo.py.
+qbo_sync = QBOSync(
+    get_connection=get_db_connection,
+    client=QBOClient.from_env(os.environ),
+    interval_seconds=int(os.getenv('QBO_SYNC_INTERVAL_SECONDS', '0')),
+    initial_days=int(os.getenv('QBO_SYNC_INITIAL_DAYS', '30')),
+    after_sync=transform_qbo_transactions
+)
+if qbo_sync.interval_seconds > 0:
+    qbo_sync.start()
+
+# Heavy reports run on a bounded background pool (see app/services/jobs.py)
+report_jobs = ReportJobs(
+    get_connection=get_db_connection,
+    run_job=lambda spec: open_export(spec),
+    result_dir=os.getenv('REPORT_JOB_DIR', 'reports'),
+    max_workers=int(os.getenv('REPORT_JOB_WORKERS', '2')),
+    max_pending=int(os.getenv('REPORT_JOB_MAX_PENDING', '20')),
+    retention_seconds=int(os.getenv('REPORT_JOB_RETENTION_SECONDS', '86400'))
+)
+report_jobs.start()
+
 @dashboard_bp.route('/dev/live-data', methods=['GET'])
 def get_live_dashboard_data():
     """Get live dashboard data from database."""
     try:
         period_type = request.args.get('period_type', 'june_2025')
-        
-        # Get date range for the period
-        today = datetime.now()
-        start_date, end_date = get_month_name_and_range(period_type, today)
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get financial summary data from pl_consolidated
-        if period_type == 'ytd':
-            # For YTD, get all months Jan-Jun
-            month_filter = "month_year IN ('January', 'February', 'March', 'April', 'May', 'June')"
-        else:
-            # For specific months, get only that month
-            month_name = period_type.split('_')[0].title()
-            month_filter = f"month_year = '{month_name}'"
-        
-        query = f"""
-            SELECT 
-                SUM(CASE WHEN metric_name = 'Revenue' THEN value ELSE 0 END) as total_revenue,
-                SUM(CASE WHEN metric_name = 'COGS' THEN value ELSE 0 END) as total_cogs,
-                SUM(CASE WHEN metric_name = 'Expense' THEN value ELSE 0 END) as total_expenses,
-                SUM(CASE WHEN metric_name = 'Net Operating Income' THEN value ELSE 0 END) as net_operating_income,
-                SUM(CASE WHEN metric_name = 'Placed' THEN value ELSE 0 END) as total_placed
-            FROM analytics.pl_consolidated
-            WHERE {month_filter}
-        """
-        
-        cursor.execute(query)
-        result = cursor.fetchone()
-        
-        if result and result[0]:
-            total_revenue = float(result[0]) if result[0] else 0
-            total_cogs = float(result[1]) if result[1] else 0
-            total_expenses = float(result[2]) if result[2] else 0
-            net_operating_income = float(result[3]) if result[3] else 0
-            total_placed = float(result[4]) if result[4] else 0
-            
-            # Calculate SPD, BPS, RPS for the period
-            # SPD = Placed / Days (samples per day)
-            # BPS = Revenue / Placed (billing per sample)
-            # RPS = Revenue / Placed (revenue per sample)
-            if period_type == 'ytd':
-                days_in_period = 180  # 6 months * 30 days
-            else:
-                # For individual months, get the actual days
-                month_name = period_type.split('_')[0].title()
-                if month_name in ['January', 'March', 'May', 'July', 'August', 'October', 'December']:
-                    days_in_period = 31
-                elif month_name == 'February':
-                    days_in_period = 28
-                else:
-                    days_in_period = 30
-            
-            spd = total_placed / days_in_period if days_in_period > 0 else 0
-            bps = total_revenue / total_placed if total_placed > 0 else 0
-            rps = total_revenue / total_placed if total_placed > 0 else 0
-            
-            financial_summary = {
-                'total_revenue': total_revenue,
-                'total_cogs': total_cogs,
-                'total_expenses': total_expenses,
-                'net_operating_income': net_operating_income,
-                'spd': spd,
-                'bps': bps,
-                'rps': rps
-            }
-        else:
-            # Fallback to mock data if no real data
-            financial_summary = {
-                'total_revenue': 3350126,
-                'total_cogs': 730094,
-                'total_expenses': 730094,
-                'net_operating_income': 1889938,
-                'spd': 18612,
-                'bps': 0.58,
-                'rps': 0.58
-            }
-        
-        # Get monthly revenue data from pl_consolidated
-        monthly_query = """
-            SELECT 
-                month_year,
-                SUM(CASE WHEN metric_name = 'Revenue' THEN value ELSE 0 END) as revenue,
-                SUM(CASE WHEN metric_name = 'Net Operating Income' THEN value ELSE 0 END) as income
-            FROM analytics.pl_consolidated
-            WHERE month_year IN ('January', 'February', 'March', 'April', 'May', 'June')
-            GROUP BY month_year
-            ORDER BY 
-                CASE month_year
-                    WHEN 'January' THEN 1
-                    WHEN 'February' THEN 2
-                    WHEN 'March' THEN 3
-                    WHEN 'April' THEN 4
-                    WHEN 'May' THEN 5
-                    WHEN 'June' THEN 6
-                END
-        """
-        
-        cursor.execute(monthly_query)
-        monthly_results = cursor.fetchall()
-        
-        if monthly_results:
-            monthly_revenue = []
-            for row in monthly_results:
-                month_name = f"{row[0]} 2025"
-                monthly_revenue.append({
-                    'month_name': month_name,
-                    'revenue': float(row[1]) if row[1] else 0,
-                    'income': float(row[2]) if row[2] else 0
-                })
-        else:
-            # Fallback mock data
-            monthly_revenue = [
-                {'month_name': 'January 2025', 'revenue': 611823, 'income': -6217},
-                {'month_name': 'February 2025', 'revenue': 696776, 'income': 57638},
-                {'month_name': 'March 2025', 'revenue': 744870, 'income': 43704},
-                {'month_name': 'April 2025', 'revenue': 680788, 'income': 53436},
-                {'month_name': 'May 2025', 'revenue': 623264, 'income': -54354},
-                {'month_name': 'June 2025', 'revenue': 681479, 'income': 41308}
-            ]
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'financial_summary': financial_summary,
-            'monthly_revenue': monthly_revenue,
-            'period_type': period_type,
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat()
-        }), 200
+        return jsonify(build_live_dashboard_data(period_type)), 200
         
     except Exception as e:
         print(f"Error in get_live_dashboard_data: {e}")
         return jsonify({'error': str(e)}), 500
 
+def build_live_dashboard_data(period_type):
+    """Financial summary and monthly revenue for a period, from the in-memory P&L facts."""
+    # Get date range for the period
+    today = datetime.now()
+    start_date, end_date = get_month_name_and_range(period_type, today)
+    facts = pl_cache.get()
+    
+    # pl_consolidated is keyed by month name, so a period covers the names of
+    # its calendar months
+    months = month_names_between(start_date, end_date)
+    totals = facts.totals(months)
+    total_revenue = float(totals.get('Revenue', 0))
+    total_cogs = float(totals.get('COGS', 0))
+    total_expenses = float(totals.get('Expense', 0))
+    net_operating_income = float(totals.get('Net Operating Income', 0))
+    total_placed = float(totals.get('Placed', 0))
+    
+    # Calculate SPD, BPS, RPS for the period
+    # SPD = Placed / Days (samples per day)
+    # BPS = Revenue / Placed (billing per sample)
+    # RPS = Revenue / Placed (revenue per sample)
+    if period_type == 'ytd':
+        # The days of the months the totals were summed over
+        days_in_period = facts.days(months, start_date.year)
+    else:
+        days_in_period = (end_date.date() - start_date.date()).days + 1
+    
+    spd = total_placed / days_in_period if days_in_period > 0 else 0
+    bps = total_revenue / total_placed if total_placed > 0 else 0
+    rps = total_revenue / total_placed if total_placed > 0 else 0
+    
+    financial_summary = {
+        'total_revenue': total_revenue,
+        'total_cogs': total_cogs,
+        'total_expenses': total_expenses,
+        'net_operating_income': net_operating_income,
+        'spd': spd,
+        'bps': bps,
+        'rps': rps
+    }
+    
+    # pl_consolidated holds 2025
+    monthly_revenue = [
+        {
+            'month_name': f"{month} 2025",
+            'revenue': float(values.get('Revenue', 0)),
+            'income': float(values.get('Net Operating Income', 0))
+        }
+        for month, values in facts.monthly()
+    ]
+    
+    return {
+        'financial_summary': financial_summary,
+        'monthly_revenue': monthly_revenue,
+        'period_type': period_type,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat()
+    }
+
 @dashboard_bp.route('/dev/ai-summary', methods=['GET'])
 def get_ai_summary():
-    """Get AI-powered financial analysis summary."""
+    """
+    Get AI-powered financial analysis summary.
+
+    Summaries are generated in the background and stored by a hash of the
+    data they describe; until one is ready the response is status 'pending'
+    (HTTP 202) and the page polls again.
+    """
     try:
         period_type = request.args.get('period_type', 'ytd')
         
         # Get live data for analysis
-        live_data_response = get_live_dashboard_data()
-        if live_data_response[1] != 200:
+        try:
+            live_data = build_live_dashboard_data(period_type)
+        except Exception as e:
             # Fallback to mock analysis if live data fails
-            ai_analysis = """
-Based on the financial data analysis:
-
-**Revenue Performance:**
-- Total revenue shows strong growth trajectory
-- Monthly revenue has increased consistently over the period
-- Revenue diversification appears healthy across different streams
-
-**Profitability Analysis:**
-- Gross profit margin is strong at approximately 78%
-- Net profit margin indicates good operational efficiency
-- Cost structure appears well-managed with COGS at 22% of revenue
-
-**Key Insights:**
-- The business demonstrates solid financial health
-- Revenue growth is sustainable and well-distributed
-- Profit margins indicate good pricing strategy and cost control
-- Cash flow appears positive with good collection rates
-
-**Recommendations:**
-- Continue monitoring COGS to maintain profit margins
-- Consider expanding successful revenue streams
-- Maintain focus on operational efficiency
-- Monitor collection rates for optimal cash flow
-            """
-            source = 'mock_data'
-        else:
-            live_data = live_data_response[0].json
-            financial_summary = live_data['financial_summary']
-            monthly_revenue = live_data['monthly_revenue']
-            
-            # Try to use OpenAI for analysis if API key is available
-            openai_api_key = os.getenv('OPENAI_API_KEY')
-            if openai_api_key:
-                try:
-                    client = openai.OpenAI(api_key=openai_api_key)
-                    
-                    # Create analysis prompt
-                    prompt = f"""
-Analyze this financial data and provide insights:
-
-Financial Summary:
-- Total Revenue: ${financial_summary['total_revenue']:,.0f}
-- Total COGS: ${financial_summary['total_cogs']:,.0f}
-- Gross Profit: ${financial_summary['gross_profit']:,.0f}
-- Net Profit: ${financial_summary['net_profit']:,.0f}
-
-Monthly Revenue Trend:
-{chr(10).join([f"- {month['month_name']}: ${month['revenue']:,.0f}" for month in monthly_revenue])}
-
-Please provide:
-1. Revenue performance analysis
-2. Profitability insights
-3. Key financial health indicators
-4. Recommendations for improvement
-
-Keep the analysis professional and actionable.
-                    """
-                    
-                    response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are a financial analyst providing insights on business performance data."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=500,
-                        temperature=0.3
-                    )
-                    
-                    ai_analysis = response.choices[0].message.content
-                    source = 'live_data'
-                    
-                except Exception as e:
-                    print(f"OpenAI API error: {e}")
-                    # Fallback to mock analysis
-                    ai_analysis = """
-Based on the financial data analysis:
-
-**Revenue Performance:**
-- Total revenue shows strong growth trajectory
-- Monthly revenue has increased consistently over the period
-- Revenue diversification appears healthy across different streams
-
-**Profitability Analysis:**
-- Gross profit margin is strong at approximately 78%
-- Net profit margin indicates good operational efficiency
-- Cost structure appears well-managed with COGS at 22% of revenue
-
-**Key Insights:**
-- The business demonstrates solid financial health
-- Revenue growth is sustainable and well-distributed
-- Profit margins indicate good pricing strategy and cost control
-- Cash flow appears positive with good collection rates
-
-**Recommendations:**
-- Continue monitoring COGS to maintain profit margins
-- Consider expanding successful revenue streams
-- Maintain focus on operational efficiency
-- Monitor collection rates for optimal cash flow
-                    """
-                    source = 'live_data'
-            else:
-                # No OpenAI API key, use mock analysis
-                ai_analysis = """
-Based on the financial data analysis:
-
-**Revenue Performance:**
-- Total revenue shows strong growth trajectory
-- Monthly revenue has increased consistently over the period
-- Revenue diversification appears healthy across different streams
-
-**Profitability Analysis:**
-- Gross profit margin is strong at approximately 78%
-- Net profit margin indicates good operational efficiency
-- Cost structure appears well-managed with COGS at 22% of revenue
-
-**Key Insights:**
-- The business demonstrates solid financial health
-- Revenue growth is sustainable and well-distributed
-- Profit margins indicate good pricing strategy and cost control
-- Cash flow appears positive with good collection rates
-
-**Recommendations:**
-- Continue monitoring COGS to maintain profit margins
-- Consider expanding successful revenue streams
-- Maintain focus on operational efficiency
-- Monitor collection rates for optimal cash flow
-                """
-                source = 'live_data'
+            print(f"Error getting live data for AI summary: {e}")
+            live_data = None
+
+        response, status = ai_summary_payload(period_type, live_data)
+        return jsonify(response), status
         
-        return jsonify({
-            'ai_analysis': ai_analysis,
-            'source': source,
+    except Exception as e:
+        print(f"Error in get_ai_summary: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def ai_summary_payload(period_type, live_data):
+    """(payload, HTTP status) of the AI summary for live dashboard data, or the mock analysis if there is none."""
+    if live_data is None:
+        return {
+            'status': 'ready',
+            'ai_analysis': FALLBACK_ANALYSIS,
+            'source': 'mock_data',
             'generated_at': datetime.now().isoformat(),
             'period_type': period_type
-        }), 200
-        
+        }, 200
+
+    financial_summary = live_data['financial_summary']
+    monthly_revenue = live_data['monthly_revenue']
+    key = summary_key(financial_summary, monthly_revenue, ai_summaries.generator.name)
+    summary = ai_summaries.get(key, financial_summary, monthly_revenue)
+
+    response = {
+        'status': summary['status'],
+        'summary_key': key,
+        'backend': summary['backend'],
+        'source': 'live_data',
+        'generated_at': summary['generated_at'],
+        'period_type': period_type
+    }
+    if summary['status'] == 'pending':
+        return response, 202
+    if summary['status'] == 'failed':
+        # Show the generic analysis until generation is retried
+        response.update(ai_analysis=FALLBACK_ANALYSIS, error=summary['error'])
+    else:
+        response['ai_analysis'] = summary['analysis']
+    return response, 200
+
+@dashboard_bp.route('/bootstrap/dashboard', methods=['GET'])
+def get_dashboard_bootstrap():
+    """
+    Everything dashboard.html shows on load in one response: the live data
+    and the AI summary, both from a single live data computation.
+
+    fields (comma-separated, default all of DASHBOARD_BOOTSTRAP_FIELDS)
+    limits the response to some panels. The AI summary is included with
+    status 'pending' while it is generated; poll /dev/ai-summary for it.
+    """
+    try:
+        period_type = request.args.get('period_type', 'june_2025')
+        try:
+            fields = get_request_fields(request.args, DASHBOARD_BOOTSTRAP_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        payload = {'period_type': period_type}
+        try:
+            live_data = build_live_dashboard_data(period_type)
+        except Exception as e:
+            if 'live_data' in fields:
+                raise
+            print(f"Error getting live data for AI summary: {e}")
+            live_data = None
+        if 'live_data' in fields:
+            payload['live_data'] = live_data
+        if 'ai_summary' in fields:
+            payload['ai_summary'], _ = ai_summary_payload(period_type, live_data)
+        return json_response(payload), 200
+
     except Exception as e:
-        print(f"Error in get_ai_summary: {e}")
+        print(f"Error in get_dashboard_bootstrap: {e}")
         return jsonify({'error': str(e)}), 500
 
-def calculate_average_collection_pct(cursor, practice_name, start_date, max_lookback=12, max_periods=6):
+def period_collections(cursor, date_index, practice_name, period_start, period_end):
+    """(placed, collected) charges and payments for a practice's samples placed in a period."""
+    if date_index is not None:
+        return date_index.practice_collections(practice_name, period_start, period_end)
+    queries.execute(cursor, PRACTICE_PERIOD_COLLECTIONS, (practice_name, period_start, period_end))
+    result = cursor.fetchone()
+    return float(result[0]), float(result[1])
+
+def calculate_average_collection_pct(cursor, practice_name, start_date, max_lookback=12, max_periods=6, date_index=None):
     """
     Skip the most recent 3 periods. Start with the first usable anchor period (placed > 0 and collected > 0) at least 3 months back. If not found, keep going back up to max_lookback months. If found, include it and up to 5 more usable periods further back (max 6 total). Return (average, periods_used).
+    Period totals come from date_index (a PracticeRangeIndex) when given, otherwise from SQL on cursor.
     """
     from datetime import timedelta
     from dateutil.relativedelta import relativedelta
@@ -347,24 +334,14 @@ def calculate_average_collection_pct(cursor, practice_name, start_date, max_look
             period_end = period_start.replace(day=31)
         else:
             period_end = (period_start + relativedelta(months=1)) - timedelta(days=1)
-        cursor.execute('''
-            SELECT COALESCE(SUM(sb.total_charges),0) as placed,
-                   COALESCE(SUM(sb.total_payments),0) as collected
-            FROM sample_billing sb
-            JOIN account_data ad ON sb.client_account_number = ad.account_number
-            WHERE ad.practice_name = %s 
-            AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-        ''', (practice_name, period_start, period_end))
-        result = cursor.fetchone()
+        placed, collected = period_collections(cursor, date_index, practice_name, period_start, period_end)
         months_checked += 1
-        if result:
-            placed, collected = float(result[0]), float(result[1])
-            if placed > 0 and collected > 0:
-                collection_pcts.append(collected / placed)
-                periods_used += 1
-                anchor_found = True
-                anchor_index = i
-                break
+        if placed > 0 and collected > 0:
+            collection_pcts.append(collected / placed)
+            periods_used += 1
+            anchor_found = True
+            anchor_index = i
+            break
     # Step 2: If anchor found, look further back for up to 5 more usable periods
     if anchor_found:
         for j in range(anchor_index + 1, anchor_index + max_periods):
@@ -374,20 +351,10 @@ def calculate_average_collection_pct(cursor, practice_name, start_date, max_look
                 period_end = period_start.replace(day=31)
             else:
                 period_end = (period_start + relativedelta(months=1)) - timedelta(days=1)
-            cursor.execute('''
-                SELECT COALESCE(SUM(sb.total_charges),0) as placed,
-                       COALESCE(SUM(sb.total_payments),0) as collected
-                FROM sample_billing sb
-                JOIN account_data ad ON sb.client_account_number = ad.account_number
-                WHERE ad.practice_name = %s 
-                AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-            ''', (practice_name, period_start, period_end))
-            result = cursor.fetchone()
-            if result:
-                placed, collected = float(result[0]), float(result[1])
-                if placed > 0 and collected > 0:
-                    collection_pcts.append(collected / placed)
-                    periods_used += 1
+            placed, collected = period_collections(cursor, date_index, practice_name, period_start, period_end)
+            if placed > 0 and collected > 0:
+                collection_pcts.append(collected / placed)
+                periods_used += 1
             if periods_used >= max_periods:
                 break
         avg_collection = sum(collection_pcts) / len(collection_pcts) if collection_pcts else None
@@ -395,458 +362,513 @@ def calculate_average_collection_pct(cursor, practice_name, start_date, max_look
     else:
         return None, 0
 
+def build_territory_partition(group, start_date, territories, date_index=None):
+    """Gather inputs for one territory's (index, row) pairs and compute its rows."""
+    practices = []
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        for _, (practice_name, territory, placed_cents, sample_count) in group:
+            avg_collection_pct, revenue_periods = calculate_average_collection_pct(
+                cursor, practice_name, start_date, date_index=date_index
+            )
+
+            # Get collector status and cost from collectors table
+            collector, collector_cost_cents = practice_collector(cursor, practice_name, territory)
+
+            practices.append(PracticeInput(
+                practice_name, territory, placed_cents, sample_count,
+                avg_collection_pct, revenue_periods, collector, collector_cost_cents
+            ))
+        cursor.close()
+    return [index for index, _ in group], compute_partition(practices, territories)
+
+def period_request_key(route, period_type, start_date, end_date, **extra):
+    """Coalescing key for a period-based route, normalized to whole days."""
+    return request_key(route, {
+        'period_type': period_type,
+        'start': start_date.date().isoformat(),
+        'end': end_date.date().isoformat(),
+        **extra
+    })
+
+def get_request_period(args):
+    """
+    (period_type, start_date, end_date) for a request: a custom range when
+    start and end (YYYY-MM-DD, inclusive) are given, otherwise period_type.
+    Raises ValueError for a malformed custom range.
+    """
+    start, end = args.get('start'), args.get('end')
+    if start or end:
+        if not (start and end):
+            raise ValueError('start and end must be given together')
+        try:
+            start_date = datetime.strptime(start, '%Y-%m-%d')
+            end_date = datetime.strptime(end, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('start and end must be dates in YYYY-MM-DD format')
+        if start_date > end_date:
+            raise ValueError('start must not be after end')
+        return 'custom', start_date, end_date
+
+    period_type = args.get('period_type')
+    if not period_type:
+        period_type = 'month'
+    # Use the updated get_month_name_and_range function
+    start_date, end_date = get_month_name_and_range(period_type)
+    return period_type, start_date, end_date
+
+def get_request_fields(args, allowed):
+    """
+    The panels named by a comma-separated fields parameter, or all of allowed.
+    Raises ValueError for an unknown name.
+    """
+    value = args.get('fields')
+    if not value:
+        return set(allowed)
+    fields = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Use {', '.join(allowed)}")
+    return fields
+
 @dashboard_bp.route('/account-table-live', methods=['GET'])
 def get_account_table_live():
     """Live endpoint to get account table data from the real database, grouped by practice."""
     try:
-        period_type = request.args.get('period_type')
-        if not period_type:
-            period_type = 'month'
-        
-        # Use the updated get_month_name_and_range function
-        start_date, end_date = get_month_name_and_range(period_type)
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         if not start_date or not end_date:
             return jsonify({'error': 'Invalid period_type'}), 400
-        month_name = start_date.strftime('%B %Y') if start_date else None
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # format=columnar returns one array per column instead of row objects
+        response_format = request.args.get('format', 'rows')
+        if response_format not in ('rows', 'columnar'):
+            return jsonify({'error': 'Invalid format. Use rows or columnar'}), 400
 
-        # Join sample_billing and account_data, group by practice and territory
-        cursor.execute('''
-            SELECT ad.practice_name, ad.territory,
-                   COALESCE(SUM(sb.initial_balance),0) as placed_revenue,
-                   COUNT(DISTINCT sb.client_account_number) as sample_count
-            FROM sample_billing sb
-            JOIN account_data ad ON sb.client_account_number = ad.account_number
-            WHERE DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-            GROUP BY ad.practice_name, ad.territory
-        ''', (start_date, end_date))
-        rows = cursor.fetchall()
-        print(f"[DEBUG] Number of (practice, territory) groups from SQL: {len(rows)}")
-
-        # Get account counts per territory
-        cursor.execute('''
-            SELECT ad.territory, COUNT(DISTINCT ad.practice_name) as num_accounts
-            FROM account_data ad
-            GROUP BY ad.territory
-        ''')
-        territory_account_counts = {row[0]: row[1] for row in cursor.fetchall()}
-
-        # --- Calculate territory averages based on actual revenue/placed from practices with historical data ---
-        territory_actual_revenue = {}
-        territory_actual_placed = {}
-        
-        # First pass: collect actual revenue and placed amounts for practices with historical data
-        for row in rows:
-            practice_name, territory, placed_revenue, sample_count = row
-            avg_collection_pct, revenue_periods = calculate_average_collection_pct(cursor, practice_name, start_date)
-            
-            if avg_collection_pct is not None:  # Practice has historical data (blue badge)
-                if territory not in territory_actual_revenue:
-                    territory_actual_revenue[territory] = Decimal('0')
-                    territory_actual_placed[territory] = Decimal('0')
-                
-                placed_revenue_decimal = Decimal(str(placed_revenue))
-                actual_revenue = placed_revenue_decimal * Decimal(str(avg_collection_pct))
-                
-                territory_actual_revenue[territory] += actual_revenue
-                territory_actual_placed[territory] += placed_revenue_decimal
-        
-        # Calculate territory averages: actual revenue / actual placed
-        avg_territory_collection_pct = {}
-        for territory in territory_actual_revenue:
-            if territory_actual_placed[territory] > 0:
-                avg_territory_collection_pct[territory] = territory_actual_revenue[territory] / territory_actual_placed[territory]
-            else:
-                avg_territory_collection_pct[territory] = Decimal('0.6')
+        payload = get_account_table(period_type, start_date, end_date)
+        if response_format == 'columnar':
+            payload = dict(payload, format='columnar',
+                           accounts=to_columnar(payload['accounts'], ACCOUNT_COLUMNS, DICTIONARY_COLUMNS))
+        return json_response(payload), 200
         
-        # --- End territory averages ---
-
-        # --- Expenses by territory for the period ---
-        # Determine month_year string for the period (e.g., 'March 2025')
-        month_year = start_date.strftime('%B %Y')
-        # Get Expenses for each territory for the period (for EPS calculation)
-        cursor.execute("""
-            SELECT territory, amount FROM cogs_expense
-            WHERE month_year = %s AND expense_type = 'Expense'
-        """, (month_year,))
-        expenses_by_territory = {row[0]: Decimal(str(row[1])) for row in cursor.fetchall()}
-        # Get COGS for each territory for the period (for COGS allocation)
-        cursor.execute("""
-            SELECT territory, amount FROM cogs_expense
-            WHERE month_year = %s AND expense_type = 'COGS'
-        """, (month_year,))
-        cogs_by_territory = {row[0]: Decimal(str(row[1])) for row in cursor.fetchall()}
-        # Get total samples per territory for the period
-        cursor.execute('''
-            SELECT ad.territory, COUNT(sb.client_account_number) as total_samples
-            FROM sample_billing sb
-            JOIN account_data ad ON sb.client_account_number = ad.account_number
-            WHERE DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-            GROUP BY ad.territory
-        ''', (start_date, end_date))
-        samples_by_territory = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Calculate total collector costs per territory for the period from collectors table
-        cursor.execute('''
-            SELECT territory, SUM(june_amount) as total_collector_cost
-            FROM collectors
-            GROUP BY territory
-        ''')
-        collector_costs_by_territory = {row[0]: Decimal(str(row[1])) for row in cursor.fetchall()}
-        
-        # Calculate baseline EPS for each territory (excluding collector costs)
-        baseline_eps_by_territory = {}
-        for territory in expenses_by_territory:
-            total_expenses = expenses_by_territory[territory]
-            total_collector_cost = collector_costs_by_territory.get(territory, Decimal('0'))
-            total_samples = samples_by_territory.get(territory, 0)
-            
-            if total_samples > 0:
-                baseline_eps = (total_expenses - total_collector_cost) / total_samples
-            else:
-                baseline_eps = Decimal('0')
-            
-            baseline_eps_by_territory[territory] = baseline_eps
-
-        result = []
-        total_revenue = 0
-        total_cogs = 0
-        total_profit = 0
-        total_sales_expense = 0
-        total_net_income = 0
-        total_collector_cost = 0
-        total_samples = 0
-        
-        for row in rows:
-            practice_name, territory, placed_revenue, sample_count = row
-            avg_collection_pct, revenue_periods = calculate_average_collection_pct(cursor, practice_name, start_date)
-            # If no usable anchor, use territory average and set revenue_periods to 0
-            if avg_collection_pct is not None:
-                collection_pct_str = f"{round(avg_collection_pct*100)}%"
-                used_collection_pct_decimal = Decimal(str(avg_collection_pct))
-            else:
-                territory_avg = avg_territory_collection_pct.get(territory, Decimal('0.9'))
-                collection_pct_str = f"{round(territory_avg*100)}%"
-                used_collection_pct_decimal = territory_avg
-                revenue_periods = 0
-
-            placed_revenue = Decimal(str(placed_revenue))
-            revenue = placed_revenue * used_collection_pct_decimal
-            rps = revenue / sample_count if sample_count > 0 else Decimal('0')
-            # Calculate BPS (Billing Per Sample) - total initial balance / sample count
-            bps = placed_revenue / sample_count if sample_count > 0 else Decimal('0')
-            # COGS allocation - use COGS per sample for territory * sample_count
-            territory_cogs = cogs_by_territory.get(territory, Decimal('0'))
-            territory_samples = samples_by_territory.get(territory, 0)
-            cogs_per_sample = (territory_cogs / territory_samples) if territory_samples > 0 else Decimal('0')
-            cogs_allocated = cogs_per_sample * sample_count
-            
-            # Get collector status and cost from collectors table
-            cursor.execute("""
-                SELECT collector, june_amount FROM collectors 
-                WHERE practice LIKE %s
-                LIMIT 1
-            """, (f'%{practice_name}%',))
-            collector_result = cursor.fetchone()
-            collector = 'Y' if collector_result and collector_result[0] else 'N'
-            collector_cost = Decimal(str(collector_result[1])) if collector_result and collector_result[1] is not None else Decimal('0')
-            
-            # Calculate additional fields
-            profit = revenue - cogs_allocated
-            gpps = profit / sample_count if sample_count > 0 else Decimal('0')
-            
-            # New EPS calculation: baseline EPS + collector cost per sample (if practice has collector)
-            baseline_eps = baseline_eps_by_territory.get(territory, Decimal('0'))
-            collector_cost_per_sample = Decimal('0')
-            
-            if collector == 'Y' and sample_count > 0:
-                collector_cost_per_sample = collector_cost / sample_count
-            
-            eps = baseline_eps + collector_cost_per_sample
-            
-            # Calculate Sales Expense and Net Income
-            # Sales Expense = territory expenses allocated to this practice based on sample count
-            territory_expenses = expenses_by_territory.get(territory, Decimal('0'))
-            sales_expense = (territory_expenses / territory_samples * sample_count) if territory_samples > 0 else Decimal('0')
-            # Net Income = Revenue - COGS - Sales Expense
-            net_income = revenue - cogs_allocated - sales_expense
-            
-            # Calculate NIPS (Net Income Per Sample)
-            nips = net_income / sample_count if sample_count > 0 else Decimal('0')
-            
-            # Accumulate totals
-            total_revenue += revenue
-            total_cogs += cogs_allocated
-            total_profit += profit
-            total_sales_expense += sales_expense
-            total_net_income += net_income
-            total_collector_cost += collector_cost
-            total_samples += sample_count
-            
+    except Exception as e:
+        print(f"Error in get_account_table_live: {e}")
+        return jsonify({'error': str(e)}), 500
 
-            
-            result.append({
-                'practice': practice_name,
-                'territory': territory,
-                'placed': round(float(placed_revenue), 2),
-                'revenue': round(float(revenue), 2),
-                'cogs': round(float(cogs_allocated), 2),
-                'profit': round(float(profit), 2),
-                'sales_expense': round(float(sales_expense), 2),
-                'net_income': round(float(net_income), 2),
-                'ros': round(float(net_income / sales_expense * 100)) if sales_expense > 0 else 0,
-                'collection_pct': collection_pct_str,
-                'revenue_periods': revenue_periods,
-                'rps': round(float(rps), 2),
-                'bps': round(float(bps), 2),
-                'gpps': round(float(gpps), 2),
-                'eps': round(float(eps), 2),
-                'nips': round(float(nips), 2),
-                'collector': collector,
-                'collector_cost': round(float(collector_cost), 2),
-                'sample_count': sample_count
-            })
+def get_account_table(period_type, start_date, end_date):
+    """Account table payload for a period, from the cache or computed once for concurrent callers."""
+    key = period_request_key('account-table-live', period_type, start_date, end_date)
+    if account_table_cache.enabled:
+        # Drop tables cached before another worker's edit or an import
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            account_table_cache.check_generation(read_generation(cursor, ACCOUNT_TABLE))
+            cursor.close()
+    payload = account_table_cache.get(key)
+    if payload is None:
+        payload = account_table_flight.do(key, build_account_table, period_type, start_date, end_date)
+    return payload
 
-        # Calculate averages
-        # COGS should be a total, not an average
-        total_cogs_value = total_cogs
-        avg_rps = total_revenue / total_samples if total_samples > 0 else Decimal('0')
-        avg_gpps = total_profit / total_samples if total_samples > 0 else Decimal('0')
-        # Average EPS = (total expenses - total collector costs) / total samples
-        total_expenses = sum(expenses_by_territory.values())
-        total_collector_costs = sum(collector_costs_by_territory.values())
-        avg_eps = (total_expenses - total_collector_costs) / total_samples if total_samples > 0 else Decimal('0')
-        avg_collector_cost = total_collector_cost / len(result) if result else Decimal('0')
-        avg_nips = total_net_income / total_samples if total_samples > 0 else Decimal('0')
-        # Calculate total BPS (total placed revenue / total samples)
-        total_placed_revenue = sum(Decimal(str(row[2])) for row in rows)  # row[2] is placed_revenue
-        avg_bps = total_placed_revenue / total_samples if total_samples > 0 else Decimal('0')
-        
-        # Calculate total collection % using same methodology as territory averages
-        total_actual_revenue = sum(territory_actual_revenue.values())
-        total_actual_placed = sum(territory_actual_placed.values())
-        avg_collection_pct = (total_actual_revenue / total_actual_placed * 100) if total_actual_placed > 0 else 0
+def cache_shared_account_table(key, payload):
+    """
+    Cache account tables another worker computed for this worker's followers,
+    unless an edit or import bumped the generation since the leader started.
+    """
+    if not key.startswith('account-table-live?') or not account_table_cache.enabled:
+        return
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        account_table_cache.check_generation(read_generation(cursor, ACCOUNT_TABLE))
+        cursor.close()
+    # put() skips a table computed under another generation than the current one
+    account_table_cache.put(key, payload, generation=payload.get('generation'))
 
-        
-        # Create totals row
-        # Ensure Net Income is calculated correctly: Revenue - COGS - Sales Expense
-        calculated_total_net_income = total_revenue - total_cogs - total_sales_expense
-        
-        totals = {
-            'practice': 'TOTAL',
-            'territory': '',
-            'placed': round(float(total_placed_revenue), 2),
-            'revenue': round(float(total_revenue), 2),
-            'cogs': round(float(total_cogs_value), 2),
-            'profit': round(float(total_profit), 2),
-            'sales_expense': round(float(total_sales_expense), 2),
-            'net_income': round(float(calculated_total_net_income), 2),
-            'ros': round(float(calculated_total_net_income / total_sales_expense * 100)) if total_sales_expense > 0 else 0,
-            'collection_pct': f"{round(avg_collection_pct, 1)}%",
-            'rps': round(float(avg_rps), 2),
-            'bps': round(float(avg_bps), 2),
-            'gpps': round(float(avg_gpps), 2),
-            'eps': round(float(avg_eps), 2),
-            'nips': round(float(calculated_total_net_income / total_samples), 2) if total_samples > 0 else 0,
-            'collector': '',
-            'collector_cost': round(float(avg_collector_cost), 2),
-            'sample_count': total_samples
-        }
+def build_account_table(period_type, start_date, end_date):
+    """Compute the account table payload for a period, grouped by practice."""
+    # Determine month_year string for the period (e.g., 'March 2025')
+    month_year = start_date.strftime('%B %Y')
+    date_index = range_index.get()
+    generation = account_table_cache.generation
 
-        cursor.close()
-        conn.close()
+    # The setup queries are independent, so they run concurrently on pooled
+    # connections. Money comes back in integer cents for the compute engine.
+    requests = {
+        # Account counts per territory
+        'account_counts': (TERRITORY_ACCOUNT_COUNTS, ()),
+        # Expenses for each territory for the period (for EPS calculation)
+        'expenses': (TERRITORY_COGS_EXPENSE, (month_year, 'Expense')),
+        # COGS for each territory for the period (for COGS allocation)
+        'cogs': (TERRITORY_COGS_EXPENSE, (month_year, 'COGS')),
+        # Total collector costs per territory from collectors table
+        'collector_costs': (TERRITORY_COLLECTOR_COSTS, ())
+    }
+    if date_index is None:
+        # Total samples per territory for the period
+        requests['samples'] = (TERRITORY_SAMPLES, (start_date, end_date))
+    if date_index is None or not date_index.distinct_samples:
+        # Group sample_billing by practice and territory
+        requests['groups'] = (PRACTICE_PLACEMENTS, (start_date, end_date))
+    results = fetch_concurrently(db_pool, requests)
+    if 'groups' in results:
+        rows = results['groups']
+    else:
+        rows = date_index.practice_placements(start_date, end_date)
+    print(f"[DEBUG] Number of (practice, territory) groups: {len(rows)}")
+    territory_account_counts = dict(results['account_counts'])
+    expenses_by_territory = dict(results['expenses'])
+    cogs_by_territory = dict(results['cogs'])
+    if 'samples' in results:
+        samples_by_territory = dict(results['samples'])
+    else:
+        samples_by_territory = date_index.territory_samples(start_date, end_date)
+    collector_costs_by_territory = dict(results['collector_costs'])
+
+    territories = TerritoryInputs(
+        expenses_by_territory, cogs_by_territory, samples_by_territory, collector_costs_by_territory
+    )
+
+    # Territories are independent until the totals row, so each one is
+    # gathered and computed concurrently on its own pooled connection.
+    groups = {}
+    for index, row in enumerate(rows):
+        groups.setdefault(row[1], []).append((index, row))
+    futures = [db_executor.submit(build_territory_partition, group, start_date, territories, date_index)
+               for group in groups.values()]
+    partitions = [future.result() for future in futures]
+
+    totals = partition_totals(merge_partitions(part for _, part in partitions), territories)
+    # Rows keep the order the grouped query returned them in
+    result = [None] * len(rows)
+    for indexes, part in partitions:
+        for index, account in zip(indexes, part.accounts):
+            result[index] = account
+
+    print(f"[DEBUG] Number of result entries: {len(result)}")
+    
+    payload = {
+        'accounts': result,
+        'totals': totals,
+        'period_type': period_type,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        # Lets workers that receive this table through the single flight
+        # tell whether it is still current
+        'generation': generation
+    }
+    # Keep the inputs with the cached table so collector edits can patch it
+    key = period_request_key('account-table-live', period_type, start_date, end_date)
+    return account_table_cache.put(
+        key, payload,
+        positions={territory: indexes for territory, (indexes, _) in zip(groups, partitions)},
+        partitions={territory: part for territory, (_, part) in zip(groups, partitions)},
+        territories=territories,
+        generation=generation
+    )
 
-        print(f"[DEBUG] Number of result entries: {len(result)}")
+@dashboard_bp.route('/account-metrics', methods=['GET'])
+def get_account_metrics():
+    """Get account metrics including new accounts and positive/negative net income counts."""
+    try:
+        territory = request.args.get('territory', 'all')
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not start_date or not end_date:
+            return jsonify({'error': 'Invalid period_type'}), 400
+
+        payload = get_account_metrics_payload(period_type, territory, start_date, end_date)
+        return json_response(payload), 200
         
-        return jsonify({
-            'accounts': result,
-            'totals': totals,
+    except Exception as e:
+        import traceback
+        print('--- Exception in /account-metrics ---')
+        traceback.print_exc()
+        print('--- End Exception ---')
+        return jsonify({'error': f'Failed to get account metrics: {str(e)}'}), 500
+
+def get_account_metrics_payload(period_type, territory, start_date, end_date):
+    """
+    Account metrics for a period and territory, from a pass over the rows of
+    the period's account table (cached, or computed once for concurrent
+    callers), so they share its collection percentages and allocations.
+    """
+    table = get_account_table(period_type, start_date, end_date)
+    if territory == 'all':
+        metrics = account_metrics(table['accounts'], table['totals'])
+    else:
+        metrics = account_metrics([account for account in table['accounts'] if account['territory'] == territory])
+    return dict(metrics, period_type=period_type)
+
+@dashboard_bp.route('/bootstrap/account-table', methods=['GET'])
+def get_account_table_bootstrap():
+    """
+    Everything account_table.html shows on load in one response: the account
+    table (always columnar), the account metrics for territory and the payer
+    mix of every practice for the period.
+
+    Takes the /account-table-live period parameters plus territory (default
+    all); fields (comma-separated, default all of
+    ACCOUNT_TABLE_BOOTSTRAP_FIELDS) limits the response to some panels.
+    """
+    try:
+        territory = request.args.get('territory', 'all')
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+            fields = get_request_fields(request.args, ACCOUNT_TABLE_BOOTSTRAP_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not start_date or not end_date:
+            return jsonify({'error': 'Invalid period_type'}), 400
+
+        payload = {
             'period_type': period_type,
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat()
-        }), 200
-        
+        }
+        if 'table' in fields:
+            table = get_account_table(period_type, start_date, end_date)
+            payload['table'] = dict(table, format='columnar',
+                                    accounts=to_columnar(table['accounts'], ACCOUNT_COLUMNS, DICTIONARY_COLUMNS))
+        if 'metrics' in fields:
+            payload['metrics'] = get_account_metrics_payload(period_type, territory, start_date, end_date)
+        if 'payer_mix' in fields:
+            payload['payer_mix'] = fetch_payer_mix(start_date, end_date)
+        return json_response(payload), 200
+
     except Exception as e:
-        print(f"Error in get_account_table_live: {e}")
+        print(f"Error in get_account_table_bootstrap: {e}")
         return jsonify({'error': str(e)}), 500
 
-@dashboard_bp.route('/account-metrics', methods=['GET'])
-def get_account_metrics():
-    """Get account metrics including new accounts and positive/negative net income counts."""
+@dashboard_bp.route('/account-table-series', methods=['GET'])
+def get_account_table_series():
+    """Practice x month matrix of account table metrics for a year, in columnar form."""
     try:
-        period_type = request.args.get('period_type')
+        year = request.args.get('year')
+        try:
+            year = int(year) if year else datetime.now().year
+        except ValueError:
+            return jsonify({'error': 'Invalid year'}), 400
+        if not 2000 <= year <= 2100:
+            return jsonify({'error': 'Invalid year'}), 400
         territory = request.args.get('territory', 'all')
-        if not period_type:
-            period_type = 'month'
-        
-        # Use the updated get_month_name_and_range function
-        start_date, end_date = get_month_name_and_range(period_type)
+
+        key = request_key('account-table-series', {'year': year, 'territory': territory})
+        payload = account_table_flight.do(key, build_account_table_series, year, territory)
+        return json_response(payload), 200
+
+    except Exception as e:
+        print(f"Error in get_account_table_series: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def build_account_table_series(year, territory):
+    """
+    Account table metrics for every practice and month of a year.
+
+    Each month is computed by the same engine from the same inputs as
+    /account-table-live for that month, but the inputs of all twelve months
+    come from one pass: placements, samples and collection history from the
+    range index, and expenses and COGS from a single query.
+    """
+    months = [datetime(year, month, 1) for month in range(1, 13)]
+    month_ends = [(month + relativedelta(months=1)) - timedelta(days=1) for month in months]
+    month_years = [month.strftime('%B %Y') for month in months]
+
+    date_index = range_index.get()
+    if date_index is None:
+        # No shared index yet (or it is turned off); a transient one is
+        # still a single scan
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            date_index = PracticeRangeIndex.build(cursor)
+            cursor.close()
+
+    requests = {
+        'cogs_expense': (TERRITORY_COGS_EXPENSE_MONTHS, (month_years,)),
+        'collector_costs': (TERRITORY_COLLECTOR_COSTS, ())
+    }
+    if not date_index.distinct_samples:
+        requests['placements'] = (PRACTICE_MONTHLY_PLACEMENTS, (months[0], month_ends[-1]))
+    results = fetch_concurrently(db_pool, requests)
+
+    month_positions = {month_year: position for position, month_year in enumerate(month_years)}
+    expenses = [{} for _ in months]
+    cogs = [{} for _ in months]
+    for month_year, expense_type, territory_name, cents in results['cogs_expense']:
+        target = expenses if expense_type == 'Expense' else cogs
+        target[month_positions[month_year]][territory_name] = cents
+    collector_costs_by_territory = dict(results['collector_costs'])
+
+    if 'placements' in results:
+        placements = [[] for _ in months]
+        for month, *row in results['placements']:
+            placements[month.month - 1].append(tuple(row))
+    else:
+        placements = [date_index.practice_placements(start, end) for start, end in zip(months, month_ends)]
+    if territory != 'all':
+        placements = [[row for row in rows if row[1] == territory] for rows in placements]
+
+    # Collector status does not depend on the period, so it is looked up
+    # once per practice rather than once per practice and month
+    keys = sorted({(row[0], row[1]) for rows in placements for row in rows},
+                  key=lambda key: (str(key[0]), str(key[1])))
+    collectors = {}
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        for practice_name, territory_name in keys:
+            collectors[(practice_name, territory_name)] = practice_collector(cursor, practice_name, territory_name)
+        cursor.close()
+
+    positions = {key: position for position, key in enumerate(keys)}
+    series = {name: [[None] * len(months) for _ in keys] for name, _ in SERIES_COLUMNS}
+    for m, (start, end, rows) in enumerate(zip(months, month_ends, placements)):
+        territories = TerritoryInputs(
+            expenses[m], cogs[m], date_index.territory_samples(start, end), collector_costs_by_territory
+        )
+        practices = []
+        for practice_name, territory_name, placed_cents, sample_count in rows:
+            avg_collection_pct, revenue_periods = calculate_average_collection_pct(
+                None, practice_name, start, date_index=date_index
+            )
+            collector, collector_cost_cents = collectors[(practice_name, territory_name)]
+            practices.append(PracticeInput(
+                practice_name, territory_name, placed_cents, sample_count,
+                avg_collection_pct, revenue_periods, collector, collector_cost_cents
+            ))
+        for account in compute_partition(practices, territories).accounts:
+            values = series_values(account)
+            row = positions[(account['practice'], account['territory'])]
+            for name, _ in SERIES_COLUMNS:
+                series[name][row][m] = values[name]
+
+    rows = [dict(practice=practice, territory=territory_name,
+                 **{name: series[name][position] for name, _ in SERIES_COLUMNS})
+            for position, (practice, territory_name) in enumerate(keys)]
+    columns = [('practice', 'string'), ('territory', 'string')] + \
+              [(name, f'{value_type}[]') for name, value_type in SERIES_COLUMNS]
+    return {
+        'year': year,
+        'territory': territory,
+        'months': [month.strftime('%Y-%m') for month in months],
+        'format': 'columnar',
+        'practices': to_columnar(rows, columns, ('territory',))
+    }
+
+def series_values(account):
+    """The SERIES_COLUMNS values of an account row; collection % as a whole number."""
+    values = {name: account[name] for name, _ in SERIES_COLUMNS}
+    values['collection_pct'] = int(account['collection_pct'].rstrip('%'))
+    return values
+
+@dashboard_bp.route('/drilldown', methods=['GET'])
+def get_drilldown():
+    """Territory > sales rep > practice > financial class tree with subtotals at every level."""
+    try:
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         if not start_date or not end_date:
             return jsonify({'error': 'Invalid period_type'}), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        key = period_request_key('drilldown', period_type, start_date, end_date)
+        tree = account_table_flight.do(key, build_drilldown, start_date, end_date)
 
-        # Get all practices for the period and territory
-        if territory == 'all':
-            cursor.execute('''
-                SELECT ad.practice_name, ad.territory,
-                       COALESCE(SUM(sb.initial_balance),0) as placed_revenue,
-                       COUNT(DISTINCT sb.client_account_number) as sample_count
-                FROM sample_billing sb
-                JOIN account_data ad ON sb.client_account_number = ad.account_number
-                WHERE DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-                GROUP BY ad.practice_name, ad.territory
-            ''', (start_date, end_date))
-        else:
-            cursor.execute('''
-                SELECT ad.practice_name, ad.territory,
-                       COALESCE(SUM(sb.initial_balance),0) as placed_revenue,
-                       COUNT(DISTINCT sb.client_account_number) as sample_count
-                FROM sample_billing sb
-                JOIN account_data ad ON sb.client_account_number = ad.account_number
-                WHERE DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-                AND ad.territory = %s
-                GROUP BY ad.practice_name, ad.territory
-            ''', (start_date, end_date, territory))
-        practice_rows = cursor.fetchall()
-        
-        new_accounts = 0
-        positive_count = 0
-        negative_count = 0
-        total_net_income = Decimal('0')
-        total_sales_expense = Decimal('0')
-        
-        # Get expenses and COGS by territory for the period
-        month_year = start_date.strftime('%B %Y')
-        cursor.execute("""
-            SELECT territory, amount FROM cogs_expense
-            WHERE month_year = %s AND expense_type = 'Expense'
-        """, (month_year,))
-        expenses_by_territory = {row[0]: Decimal(str(row[1])) for row in cursor.fetchall()}
-        
-        cursor.execute("""
-            SELECT territory, amount FROM cogs_expense
-            WHERE month_year = %s AND expense_type = 'COGS'
-        """, (month_year,))
-        cogs_by_territory = {row[0]: Decimal(str(row[1])) for row in cursor.fetchall()}
-        
-        # Get total samples per territory for the period
-        cursor.execute('''
-            SELECT ad.territory, COUNT(sb.client_account_number) as total_samples
-            FROM sample_billing sb
-            JOIN account_data ad ON sb.client_account_number = ad.account_number
-            WHERE DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
-            GROUP BY ad.territory
-        ''', (start_date, end_date))
-        samples_by_territory = {row[0]: row[1] for row in cursor.fetchall()}
-
-        for practice_row in practice_rows:
-            practice_name, territory_name, placed_revenue, sample_count = practice_row
-            avg_collection_pct, revenue_periods = calculate_average_collection_pct(cursor, practice_name, start_date)
-            # Count as new account if using territory average (revenue_periods = 0)
-            if avg_collection_pct is None:
-                new_accounts += 1
-                used_collection_pct_decimal = Decimal('0.6')  # Default fallback
-            else:
-                used_collection_pct_decimal = Decimal(str(avg_collection_pct))
-            
-            placed_revenue = Decimal(str(placed_revenue))
-            revenue = placed_revenue * used_collection_pct_decimal
-            
-            # Calculate COGS allocation
-            territory_cogs = cogs_by_territory.get(territory_name, Decimal('0'))
-            territory_samples = samples_by_territory.get(territory_name, 0)
-            cogs_per_sample = (territory_cogs / territory_samples) if territory_samples > 0 else Decimal('0')
-            cogs_allocated = cogs_per_sample * sample_count
-            
-            # Calculate profit and sales expense
-            profit = revenue - cogs_allocated
-            territory_expenses = expenses_by_territory.get(territory_name, Decimal('0'))
-            sales_expense = (territory_expenses / territory_samples * sample_count) if territory_samples > 0 else Decimal('0')
-            net_income = profit - sales_expense
-            
-            total_net_income += net_income
-            total_sales_expense += sales_expense
-            
-            if net_income > 0:
-                positive_count += 1
-            else:
-                negative_count += 1
-        
+        # Optionally return only the subtree below territory / sales_rep / practice
+        path = []
+        for level in DRILLDOWN_LEVELS[:-1]:
+            value = request.args.get(level)
+            if not value:
+                break
+            path.append(value)
+        node = find_subtree(tree, path)
+        if node is None:
+            return jsonify({'error': f"No data for {' > '.join(path)}"}), 404
+
+        return json_response({
+            'levels': list(DRILLDOWN_LEVELS),
+            'path': path,
+            'tree': node,
+            'period_type': period_type,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }), 200
+
+    except Exception as e:
+        print(f"Error in get_drilldown: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def build_drilldown(start_date, end_date):
+    """Run the ROLLUP query for a period and build the drilldown tree."""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        queries.execute(cursor, ACCOUNT_DRILLDOWN, (start_date, end_date))
+        rows = cursor.fetchall()
         cursor.close()
-        conn.close()
+    print(f"[DEBUG] Drilldown rows (including subtotals): {len(rows)}")
+    return build_drilldown_tree(rows)
 
-        return jsonify({
-            'new_accounts': new_accounts,
-            'total_accounts': len(practice_rows),
-            'positive_accounts': positive_count,
-            'negative_accounts': negative_count,
-            'total_net_income': float(total_net_income),
-            'total_sales_expense': float(total_sales_expense),
-            'period_type': period_type
+@dashboard_bp.route('/payer-mix', methods=['GET'])
+def get_payer_mix():
+    """Payer mix (financial class and primary payer) for many practices at once, from the payer-mix cube."""
+    try:
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not start_date or not end_date:
+            return jsonify({'error': 'Invalid period_type'}), 400
+
+        # Repeat practice=... to limit the response; without it every practice is returned
+        practices = request.args.getlist('practice')
+        mix = fetch_payer_mix(start_date, end_date, practices)
+        return json_response({
+            'practices': mix,
+            'period_type': period_type,
+            'start_month': start_date.strftime('%Y-%m'),
+            'end_month': end_date.strftime('%Y-%m')
         }), 200
-        
+
     except Exception as e:
-        import traceback
-        print('--- Exception in /account-metrics ---')
-        traceback.print_exc()
-        print('--- End Exception ---')
-        return jsonify({'error': f'Failed to get account metrics: {str(e)}'}), 500
+        print(f"Error in get_payer_mix: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def fetch_payer_mix(start_date, end_date, practices=None):
+    """
+    {practice: payer mix} over the months from start_date to end_date.
+
+    The cube is monthly, so a range that starts or ends mid-month covers
+    those whole months.
+    """
+    month_start = start_date.date().replace(day=1)
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        if practices:
+            queries.execute(cursor, PAYER_MIX_FOR_PRACTICES, (month_start, end_date.date(), list(practices)))
+        else:
+            queries.execute(cursor, PAYER_MIX, (month_start, end_date.date()))
+        rows = cursor.fetchall()
+        cursor.close()
+    return payer_mix_by_practice(rows)
 
 @dashboard_bp.route('/financial-class-breakdown', methods=['GET'])
 def financial_class_breakdown():
     """Get financial class breakdown for a specific practice."""
     try:
         practice = request.args.get('practice')
-        period_type = request.args.get('period_type', 'month')
-        
         if not practice:
             return jsonify({'error': 'Practice parameter is required'}), 400
-        
-        # Get date range for the period
-        today = datetime.now()
-        start_date, end_date = get_month_name_and_range(period_type, today)
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get financial class breakdown
-        query = """
-            SELECT 
-                financial_class,
-                COUNT(DISTINCT account_id) as account_count,
-                SUM(total_revenue) as total_revenue,
-                AVG(collection_pct) as avg_collection_pct
-            FROM analytics.financial_summary
-            WHERE practice_name = %s 
-                AND period_start >= %s 
-                AND period_end <= %s
-            GROUP BY financial_class
-            ORDER BY total_revenue DESC
-        """
-        
-        cursor.execute(query, (practice, start_date, end_date))
-        results = cursor.fetchall()
-        
-        breakdown = []
-        for row in results:
-            financial_class, account_count, total_revenue, avg_collection_pct = row
-            breakdown.append({
-                'financial_class': financial_class,
-                'account_count': account_count,
-                'total_revenue': float(total_revenue) if total_revenue else 0,
-                'avg_collection_pct': float(avg_collection_pct) if avg_collection_pct else 0
-            })
-        
-        cursor.close()
-        conn.close()
-        
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        mix = fetch_payer_mix(start_date, end_date, [practice]).get(practice)
         return jsonify({
             'practice': practice,
-            'breakdown': breakdown,
+            'breakdown': mix['breakdown'] if mix else [],
             'period_type': period_type
         }), 200
         
@@ -854,45 +876,456 @@ def financial_class_breakdown():
         print(f"Error in financial_class_breakdown: {e}")
         return jsonify({'error': str(e)}), 500
 
+@dashboard_bp.route('/dev/payer-mix/rebuild', methods=['POST'])
+def rebuild_payer_mix_cube():
+    """Rebuild the payer-mix cube from sample_billing."""
+    try:
+        conn = get_db_connection()
+        try:
+            rows = rebuild_payer_mix(conn)
+        finally:
+            conn.close()
+        return jsonify({'message': 'Payer mix rebuilt', 'rows': rows}), 200
+
+    except Exception as e:
+        print(f"Error in rebuild_payer_mix_cube: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/dev/sample-accounts/resolve', methods=['POST'])
+def resolve_sample_billing_accounts():
+    """Copy practice and territory from account_data onto sample_billing and report orphan accounts."""
+    try:
+        conn = get_db_connection()
+        try:
+            resolution = resolve_sample_accounts(conn)
+        finally:
+            conn.close()
+        orphans = resolution['orphans']
+        return jsonify({
+            'message': 'Sample accounts resolved',
+            'resolved': resolution['resolved'],
+            'cleared': resolution['cleared'],
+            'payer_mix_rows': resolution['payer_mix_rows'],
+            'orphan_accounts': len(orphans),
+            'orphan_samples': sum(count for _, count in orphans),
+            # Most samples first; the full list is printed by the import scripts
+            'orphans': [{'client_account_number': account, 'samples': count} for account, count in orphans[:100]]
+        }), 200
+
+    except Exception as e:
+        print(f"Error in resolve_sample_billing_accounts: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @dashboard_bp.route('/update-collector-cost', methods=['POST'])
 def update_collector_cost():
-    """Update collector cost for a practice."""
+    """Update collector cost for a practice (account-table practice name and territory)."""
     try:
-        data = request.get_json()
-        practice_name = data.get('practice_name')
-        territory = data.get('territory')
-        new_cost = data.get('collector_cost')
-        
-        if not all([practice_name, territory, new_cost]):
-            return jsonify({'error': 'Missing required fields'}), 400
+        data = request.get_json(silent=True) or {}
+        try:
+            practice_name, territory, new_cost = parse_collector_edit(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         conn = get_db_connection()
         cursor = conn.cursor()
-        
-        # Update collector cost
-        query = """
-            UPDATE staging.collectors
-            SET collector_cost = %s
-            WHERE practice_name = %s AND territory = %s
-        """
-        
-        cursor.execute(query, (new_cost, practice_name, territory))
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
+        try:
+            problem = check_targets(cursor, [(practice_name, territory)]).get((practice_name, territory))
+            if problem:
+                status, message = problem
+                return jsonify({'error': message}), status
+            inserted = upsert_collector_costs(cursor, {(practice_name, territory): new_cost})
+            generation = bump_generations(cursor, ACCOUNT_TABLE)[ACCOUNT_TABLE]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        # Patch cached account tables instead of recomputing them
+        patched = refresh_cached_collectors([(practice_name, territory)], generation)
         
         return jsonify({
             'message': 'Collector cost updated successfully',
             'practice_name': practice_name,
             'territory': territory,
-            'new_cost': new_cost
+            'new_cost': float(new_cost),
+            'status': 'inserted' if inserted[(practice_name, territory)] else 'updated',
+            'tables_patched': patched
         }), 200
         
     except Exception as e:
         print(f"Error in update_collector_cost: {e}")
         return jsonify({'error': str(e)}), 500
 
+@dashboard_bp.route('/update-collector-costs', methods=['POST'])
+def update_collector_costs():
+    """
+    Apply a batch of collector cost edits in one transaction. Each edit gets
+    its own outcome; rejected edits do not stop the others from being saved.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        edits = data.get('edits')
+        if not isinstance(edits, list) or not edits:
+            return jsonify({'error': 'edits must be a non-empty list'}), 400
+
+        # Validate each edit; a later edit of the same practice replaces an earlier one
+        outcomes = []
+        latest = {}
+        for position, edit in enumerate(edits):
+            try:
+                practice_name, territory, new_cost = parse_collector_edit(edit)
+            except ValueError as e:
+                outcomes.append({'index': position, 'status': 'rejected', 'code': 400, 'error': str(e)})
+                continue
+            outcomes.append({'index': position, 'practice_name': practice_name, 'territory': territory,
+                             'status': 'pending', 'new_cost': float(new_cost)})
+            previous = latest.get((practice_name, territory))
+            if previous is not None:
+                outcomes[previous[0]]['status'] = 'superseded'
+            latest[(practice_name, territory)] = (position, new_cost)
+
+        generation = None
+        if latest:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                # Edits of practices an override would not reach are rejected, with every edit of them
+                problems = check_targets(cursor, list(latest))
+                for outcome in outcomes:
+                    problem = problems.get((outcome.get('practice_name'), outcome.get('territory')))
+                    if outcome['status'] != 'rejected' and problem:
+                        outcome.update(status='rejected', code=problem[0], error=problem[1])
+                for key in problems:
+                    del latest[key]
+                if latest:
+                    inserted = upsert_collector_costs(cursor, {key: cost for key, (_, cost) in latest.items()})
+                    generation = bump_generations(cursor, ACCOUNT_TABLE)[ACCOUNT_TABLE]
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+                conn.close()
+
+        for key, (position, _) in latest.items():
+            outcomes[position]['status'] = 'inserted' if inserted[key] else 'updated'
+
+        # One cache refresh for the whole batch
+        patched = refresh_cached_collectors(list(latest), generation) if latest else 0
+        rejected = sum(1 for outcome in outcomes if outcome['status'] == 'rejected')
+
+        return jsonify({
+            'message': f'{len(latest)} of {len(edits)} collector costs updated',
+            'applied': len(latest),
+            'rejected': rejected,
+            'results': outcomes,
+            'tables_patched': patched
+        }), 200
+
+    except Exception as e:
+        print(f"Error in update_collector_costs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def refresh_cached_collectors(edits, generation):
+    """
+    Re-read collector inputs touched by (practice_name, territory) edits and
+    patch the cached account tables with them; generation is the account-table
+    generation the edits were committed with. Returns the number of tables patched.
+    """
+    if not account_table_cache.enabled:
+        return 0
+    collectors = {}
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        queries.execute(cursor, TERRITORY_COLLECTOR_COSTS, ())
+        collector_cents = dict(cursor.fetchall())
+        for practice_name, territory in set(edits):
+            collectors[(practice_name, territory)] = practice_collector(cursor, practice_name, territory)
+        cursor.close()
+    patched = account_table_cache.patch_collectors(collectors, collector_cents)
+    account_table_cache.advance_generation(generation)
+    return patched
+
+def practice_collector(cursor, practice_name, territory):
+    """(collector 'Y'/'N', cost in cents) of an account-table practice."""
+    queries.execute(cursor, PRACTICE_COLLECTOR, (practice_name, territory, f'%{practice_name}%', practice_name))
+    return collector_status(cursor.fetchone())
+
+def collector_status(collector_result):
+    """(collector 'Y'/'N', cost in cents) from a practice_collector row."""
+    collector = 'Y' if collector_result and collector_result[0] else 'N'
+    collector_cost_cents = collector_result[1] if collector_result and collector_result[1] is not None else 0
+    return collector, collector_cost_cents
+
+@dashboard_bp.route('/dev/query-stats', methods=['GET'])
+def get_query_stats():
+    """Call counts and timings of the registered dashboard queries in this worker."""
+    return jsonify({'queries': queries.stats()}), 200
+
+@dashboard_bp.route('/dev/range-index', methods=['GET', 'POST'])
+def range_index_status():
+    """Status of the date-range index in this worker; POST rebuilds it first."""
+    try:
+        if not range_index.enabled:
+            return jsonify({'enabled': False}), 200
+        index = range_index.refresh() if request.method == 'POST' else range_index.get()
+        if index is None:
+            return jsonify({'enabled': True, 'ready': False}), 200
+        return jsonify({
+            'enabled': True,
+            'ready': True,
+            'practices': len(index.keys),
+            'first_day': index.origin.isoformat(),
+            'days': index.cumulative.shape[2] - 1,
+            'distinct_samples': index.distinct_samples
+        }), 200
+
+    except Exception as e:
+        print(f"Error in range_index_status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/dev/qbo-sync', methods=['GET', 'POST'])
+def qbo_sync_status():
+    """QBO sync cursors per company and entity; POST runs a sync first."""
+    try:
+        response = {}
+        if request.method == 'POST':
+            results = qbo_sync.run_once()
+            if results is None:
+                return jsonify({'error': 'A QBO sync is already running'}), 409
+            response['written'] = results
+        response['state'] = qbo_sync.status()
+        return jsonify(response), 200
+
+    except Exception as e:
+        print(f"Error in qbo_sync_status: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/dev/qbo-transform', methods=['POST'])
+def run_qbo_transform():
+    """Transform raw QBO transactions changed since the last run into staging; full=true redoes all of them."""
+    try:
+        conn = get_db_connection()
+        try:
+            result = transform_qbo_transactions(conn, full=request.args.get('full', 'false').lower() == 'true')
+        finally:
+            conn.close()
+        return jsonify(result), 200
+
+    except Exception as e:
+        print(f"Error in run_qbo_transform: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/territory-performance', methods=['GET'])
+def get_territory_performance():
+    """Precomputed territory performance rows (see app/services/qbo_transform.py)."""
+    try:
+        period_type = request.args.get('period_type', 'monthly')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({'error': 'start_date and end_date must be dates in YYYY-MM-DD format'}), 400
+
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            queries.execute(cursor, TERRITORY_PERFORMANCE, (period_type, start_date, start_date, end_date, end_date))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        territory_data = [{
+            'territory_name': territory_name,
+            'total_sales': float(total_sales) if total_sales else 0,
+            'num_accounts': num_accounts,
+            'avg_revenue_per_account': float(avg_revenue) if avg_revenue else 0,
+            'report_date': report_date.isoformat() if report_date else None,
+            'period_type': row_period_type
+        } for territory_name, total_sales, num_accounts, avg_revenue, report_date, row_period_type in rows]
+        return jsonify({
+            'territory_performance': territory_data,
+            'count': len(territory_data)
+        }), 200
+
+    except Exception as e:
+        print(f"Error in get_territory_performance: {e}")
+        return jsonify({'error': f'Failed to get territory performance: {str(e)}'}), 500
+
+@dashboard_bp.route('/qbo-summary', methods=['GET'])
+def get_qbo_summary():
+    """QBO transaction totals by type and month for a period, from the locally synced transactions."""
+    try:
+        try:
+            period_type, start_date, end_date = get_request_period(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not start_date or not end_date:
+            return jsonify({'error': 'Invalid period_type'}), 400
+
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            queries.execute(cursor, QBO_TRANSACTION_TOTALS, (start_date.date(), end_date.date()))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        by_type = {}
+        monthly = []
+        for txn_type, month, transactions, amount_cents in rows:
+            totals = by_type.setdefault(txn_type, {'txn_type': txn_type, 'transactions': 0, 'amount_cents': 0})
+            totals['transactions'] += transactions
+            totals['amount_cents'] += amount_cents
+            monthly.append({
+                'month': month.strftime('%Y-%m'),
+                'txn_type': txn_type,
+                'transactions': transactions,
+                'amount': dollars(amount_cents)
+            })
+        synced = [state['synced_at'] for state in qbo_sync.status() if state['synced_at']]
+        return json_response({
+            'by_type': [{'txn_type': t['txn_type'], 'transactions': t['transactions'], 'amount': dollars(t['amount_cents'])}
+                        for t in by_type.values()],
+            'monthly': monthly,
+            'last_synced_at': max(synced) if synced else None,
+            'source': 'qbo_sync',
+            'period_type': period_type,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }), 200
+
+    except Exception as e:
+        print(f"Error in get_qbo_summary: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/export', methods=['GET'])
+def export_data():
+    """Stream the account table, practice-month rollups or sample_billing rows as CSV, XLSX, Arrow or Parquet."""
+    try:
+        spec = export_spec(request.args)
+        error = check_export_spec(spec)
+        if error:
+            message, status = error
+            return jsonify({'error': message}), status
+
+        chunks, mimetype, filename = open_export(spec)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+
+    except Exception as e:
+        print(f"Error in export_data: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def export_spec(source):
+    """Read an export spec (dataset, format, period and filters) from request args or a JSON body."""
+    territory = source.get('territory')
+    return {
+        'dataset': source.get('dataset') or 'account_table',
+        'format': source.get('format') or 'parquet',
+        'period_type': source.get('period_type') or 'month',
+        'territory': None if territory in (None, '', 'all') else territory,
+        'practice': source.get('practice') or None
+    }
+
+def check_export_spec(spec):
+    """Return (error message, status code) for an invalid export spec, or None."""
+    dataset, file_format = spec['dataset'], spec['format']
+    if dataset != 'account_table' and dataset not in EXPORT_DATASETS:
+        return f"Invalid dataset. Use one of: account_table, {', '.join(EXPORT_DATASETS)}", 400
+    if file_format not in EXPORT_FORMATS:
+        return f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}", 400
+    if not format_available(file_format):
+        _, _, library = EXPORT_FORMATS[file_format]
+        return f'{file_format} export is not available on this server ({library} is not installed)', 501
+    start_date, end_date = get_month_name_and_range(spec['period_type'])
+    if not start_date or not end_date:
+        return 'Invalid period_type', 400
+    return None
+
+def open_export(spec):
+    """Return (chunks, mimetype, filename) for a checked export spec; chunks is a generator of bytes."""
+    dataset, file_format = spec['dataset'], spec['format']
+    territory, practice = spec['territory'], spec['practice']
+    period_type = spec['period_type']
+    start_date, end_date = get_month_name_and_range(period_type)
+
+    if dataset == 'account_table':
+        payload = get_account_table(period_type, start_date, end_date)
+        accounts = [row for row in payload['accounts']
+                    if (not territory or row['territory'] == territory)
+                    and (not practice or row['practice'] == practice)]
+        columns = ACCOUNT_COLUMNS
+        batches = iter_row_batches(accounts, columns)
+    else:
+        columns, _ = EXPORT_DATASETS[dataset]
+        sql, params = dataset_query(dataset, start_date, end_date, territory, practice)
+        batches = iter_query_batches(get_db_connection, sql, params)
+
+    mimetype, _, _ = EXPORT_FORMATS[file_format]
+    filename = export_filename(dataset, file_format, start_date, end_date)
+    return stream_export(columns, batches, file_format, dataset), mimetype, filename
+
+@dashboard_bp.route('/jobs', methods=['POST'])
+def submit_report_job():
+    """Queue a report (same spec as /export) to run in the background."""
+    try:
+        spec = export_spec(request.get_json(silent=True) or {})
+        error = check_export_spec(spec)
+        if error:
+            message, status = error
+            return jsonify({'error': message}), status
+
+        job_id = report_jobs.submit(spec)
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': url_for('dashboard.get_report_job', job_id=job_id),
+            'download_url': url_for('dashboard.download_report_job', job_id=job_id)
+        }), 202
+
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Error in submit_report_job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """Status of a report job."""
+    try:
+        job = report_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job), 200
+
+    except Exception as e:
+        print(f"Error in get_report_job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/jobs/<job_id>/download', methods=['GET'])
+def download_report_job(job_id):
+    """Download the file produced by a finished report job."""
+    try:
+        job = report_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] != 'succeeded':
+            return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+        path = report_jobs.result_path(job)
+        if not os.path.exists(path):
+            return jsonify({'error': 'Job result is no longer available'}), 410
+        return send_file(path, mimetype=job['mimetype'], as_attachment=True, download_name=job['filename'])
+
+    except Exception as e:
+        print(f"Error in download_report_job: {e}")
+        return jsonify({'error': str(e)}), 500
+
 def get_month_name_and_range(period_type, today=None):
     """Get month name and date range for a given period type."""
     if today is None:
@@ -0,0 +1,3 @@
+# Services Package 
+
+# This file makes the app/services directory a Python package 
\ No newline at end of file
@@ -0,0 +1,331 @@
+"""
+Account table compute engine.
+
+Turns per-practice inputs gathered by the dashboard API into account table
+rows and the totals row. Everything here is integer-cents arithmetic with
+exact fractions for ratios (see app/utils/money.py); no database access
+happens in this module.
+"""
+
+from collections import namedtuple
+from fractions import Fraction
+
+from app.utils.money import ratio, dollars, fraction_dollars, whole_percent
+
+# Collection ratio for a practice without history in a territory where no
+# practice has usable history
+DEFAULT_TERRITORY_COLLECTION = Fraction(9, 10)
+# Collection ratio for a territory whose practices with history placed nothing
+EMPTY_TERRITORY_COLLECTION = Fraction(3, 5)
+
+PracticeInput = namedtuple('PracticeInput', [
+    'practice',          # practice name
+    'territory',         # territory name
+    'placed_cents',      # SUM(initial_balance) in cents
+    'sample_count',      # samples placed in the period
+    'collection_pct',    # historical average collection ratio, or None
+    'revenue_periods',   # periods used for collection_pct
+    'collector',         # 'Y' or 'N'
+    'collector_cost_cents'
+])
+
+# Account row columns in display order, with their JSON value types
+ACCOUNT_COLUMNS = [
+    ('practice', 'string'),
+    ('territory', 'string'),
+    ('placed', 'number'),
+    ('revenue', 'number'),
+    ('cogs', 'number'),
+    ('profit', 'number'),
+    ('sales_expense', 'number'),
+    ('net_income', 'number'),
+    ('ros', 'integer'),
+    ('collection_pct', 'string'),
+    ('revenue_periods', 'integer'),
+    ('rps', 'number'),
+    ('bps', 'number'),
+    ('gpps', 'number'),
+    ('eps', 'number'),
+    ('nips', 'number'),
+    ('collector', 'string'),
+    ('collector_cost', 'number'),
+    ('sample_count', 'integer')
+]
+
+# Low-cardinality string columns sent dictionary-encoded in columnar responses
+DICTIONARY_COLUMNS = ('territory', 'collector')
+
+# Per-month account row metrics in /account-table-series, with their types
+# (collection_pct as a whole-number percent)
+SERIES_COLUMNS = [
+    ('revenue', 'number'),
+    ('net_income', 'number'),
+    ('rps', 'number'),
+    ('bps', 'number'),
+    ('collection_pct', 'integer')
+]
+
+# Rows for the practices of one or more whole territories, with the exact
+# per-territory sums the totals row is built from
+TablePartition = namedtuple('TablePartition', [
+    'practices',         # PracticeInput list, in row order
+    'accounts',          # account rows
+    'revenue_parts',     # {denominator: revenue numerator}
+    'actual_revenue',    # {territory: revenue of practices with history, cents}
+    'actual_placed'      # {territory: placed by practices with history, cents}
+])
+
+TerritoryInputs = namedtuple('TerritoryInputs', [
+    'expenses_cents',    # {territory: Expense amount in cents}
+    'cogs_cents',        # {territory: COGS amount in cents}
+    'samples',           # {territory: samples placed in the period}
+    'collector_cents'    # {territory: total collector cost in cents}
+])
+
+
+def exact_sum(parts):
+    """Sum {denominator: numerator} parts into one exact Fraction."""
+    return sum((Fraction(numerator, denominator) for denominator, numerator in parts.items()), Fraction(0))
+
+
+def territory_collection_ratios(practices):
+    """
+    Average collection ratio per territory, weighted by placed revenue.
+
+    Only practices with their own collection history contribute. Returns
+    (averages, actual_revenue, actual_placed), the last two keyed by territory
+    with exact cents.
+    """
+    revenue_parts = {}
+    actual_placed = {}
+    for p in practices:
+        if p.collection_pct is None:
+            continue
+        numerator, denominator = ratio(p.collection_pct)
+        parts = revenue_parts.setdefault(p.territory, {})
+        parts[denominator] = parts.get(denominator, 0) + p.placed_cents * numerator
+        actual_placed[p.territory] = actual_placed.get(p.territory, 0) + p.placed_cents
+
+    actual_revenue = {territory: exact_sum(parts) for territory, parts in revenue_parts.items()}
+    averages = {}
+    for territory, placed in actual_placed.items():
+        if placed > 0:
+            averages[territory] = actual_revenue[territory] / placed
+        else:
+            averages[territory] = EMPTY_TERRITORY_COLLECTION
+    return averages, actual_revenue, actual_placed
+
+
+def compute_practice_row(p, territory_averages, territories):
+    """
+    Compute one account table row.
+
+    All money figures of the row share the denominator D = collection
+    denominator * territory samples, so they are integer numerators until
+    dollars() rounds them. Returns (row, revenue numerator, D).
+    """
+    if p.collection_pct is not None:
+        collection_pct_str = f"{round(p.collection_pct * 100)}%"
+        pct_num, pct_den = ratio(p.collection_pct)
+        revenue_periods = p.revenue_periods
+    else:
+        territory_avg = territory_averages.get(p.territory, DEFAULT_TERRITORY_COLLECTION)
+        collection_pct_str = f"{round(territory_avg * 100)}%"
+        pct_num, pct_den = territory_avg.numerator, territory_avg.denominator
+        revenue_periods = 0
+
+    samples = p.sample_count
+    placed = p.placed_cents
+    territory_samples = territories.samples.get(p.territory, 0)
+    territory_cogs = territories.cogs_cents.get(p.territory, 0)
+    territory_expenses = territories.expenses_cents.get(p.territory, 0)
+
+    # Allocations by share of the territory's samples
+    t = territory_samples if territory_samples > 0 else 1
+    if territory_samples > 0:
+        cogs_n = territory_cogs * samples * pct_den
+        sales_n = territory_expenses * samples * pct_den
+    else:
+        cogs_n = sales_n = 0
+    den = pct_den * t
+    revenue_n = placed * pct_num * t
+    profit_n = revenue_n - cogs_n
+    net_n = profit_n - sales_n
+
+    # EPS = territory baseline (expenses less collector costs, per sample)
+    #       + this practice's collector cost per sample if it has a collector
+    if p.territory in territories.expenses_cents and territory_samples > 0:
+        baseline_n = territory_expenses - territories.collector_cents.get(p.territory, 0)
+    else:
+        baseline_n = 0
+    if p.collector == 'Y' and samples > 0:
+        eps = dollars(baseline_n * samples + p.collector_cost_cents * t, t * samples)
+    else:
+        eps = dollars(baseline_n, t)
+
+    per_sample = den * samples
+    row = {
+        'practice': p.practice,
+        'territory': p.territory,
+        'placed': dollars(placed),
+        'revenue': dollars(revenue_n, den),
+        'cogs': dollars(cogs_n, den),
+        'profit': dollars(profit_n, den),
+        'sales_expense': dollars(sales_n, den),
+        'net_income': dollars(net_n, den),
+        'ros': whole_percent(net_n, sales_n) if sales_n > 0 else 0,
+        'collection_pct': collection_pct_str,
+        'revenue_periods': revenue_periods,
+        'rps': dollars(revenue_n, per_sample) if samples > 0 else 0.0,
+        'bps': dollars(placed, samples) if samples > 0 else 0.0,
+        'gpps': dollars(profit_n, per_sample) if samples > 0 else 0.0,
+        'eps': eps,
+        'nips': dollars(net_n, per_sample) if samples > 0 else 0.0,
+        'collector': p.collector,
+        'collector_cost': dollars(p.collector_cost_cents),
+        'sample_count': samples
+    }
+    return row, revenue_n, den
+
+
+def compute_totals(practices, revenue_parts, actual_revenue, actual_placed, territories):
+    """
+    Compute the TOTAL row from exact per-practice revenues.
+
+    revenue_parts holds the practice revenues summed per denominator.
+    COGS and sales expense are allocated pro rata within each territory, so
+    their totals are computed per territory from the summed sample counts.
+    """
+    total_samples = sum(p.sample_count for p in practices)
+    total_placed = sum(p.placed_cents for p in practices)
+    total_collector_cost = sum(p.collector_cost_cents for p in practices)
+    total_revenue = exact_sum(revenue_parts)
+
+    samples_in_rows = {}
+    for p in practices:
+        samples_in_rows[p.territory] = samples_in_rows.get(p.territory, 0) + p.sample_count
+    total_cogs = Fraction(0)
+    total_sales_expense = Fraction(0)
+    for territory, samples in samples_in_rows.items():
+        territory_samples = territories.samples.get(territory, 0)
+        if territory_samples > 0:
+            total_cogs += Fraction(territories.cogs_cents.get(territory, 0) * samples, territory_samples)
+            total_sales_expense += Fraction(territories.expenses_cents.get(territory, 0) * samples, territory_samples)
+
+    total_profit = total_revenue - total_cogs
+    total_net_income = total_revenue - total_cogs - total_sales_expense
+
+    # Average EPS = (total expenses - total collector costs) / total samples
+    eps_n = sum(territories.expenses_cents.values()) - sum(territories.collector_cents.values())
+
+    # Total collection % uses the same methodology as the territory averages
+    placed_with_history = sum(actual_placed.values())
+    if placed_with_history > 0:
+        tenths = round(sum(actual_revenue.values(), Fraction(0)) * 1000 / placed_with_history)
+        collection_pct_str = f"{tenths // 10}.{tenths % 10}%"
+    else:
+        collection_pct_str = "0%"
+
+    def per_sample(cents):
+        return fraction_dollars(cents / total_samples) if total_samples > 0 else 0.0
+
+    return {
+        'practice': 'TOTAL',
+        'territory': '',
+        'placed': dollars(total_placed),
+        'revenue': fraction_dollars(total_revenue),
+        'cogs': fraction_dollars(total_cogs),
+        'profit': fraction_dollars(total_profit),
+        'sales_expense': fraction_dollars(total_sales_expense),
+        'net_income': fraction_dollars(total_net_income),
+        'ros': whole_percent(total_net_income.numerator * total_sales_expense.denominator,
+                             total_sales_expense.numerator * total_net_income.denominator) if total_sales_expense > 0 else 0,
+        'collection_pct': collection_pct_str,
+        'rps': per_sample(total_revenue),
+        'bps': dollars(total_placed, total_samples) if total_samples > 0 else 0.0,
+        'gpps': per_sample(total_profit),
+        'eps': dollars(eps_n, total_samples) if total_samples > 0 else 0.0,
+        'nips': per_sample(total_net_income) if total_samples > 0 else 0,
+        'collector': '',
+        'collector_cost': dollars(total_collector_cost, len(practices)) if practices else 0.0,
+        'sample_count': total_samples
+    }
+
+
+def compute_partition(practices, territories):
+    """
+    Compute the rows for practices that cover whole territories.
+
+    Everything a row depends on is allocated within its territory, so
+    territories can be computed independently (and concurrently) and the
+    partitions combined with merge_partitions().
+    """
+    averages, actual_revenue, actual_placed = territory_collection_ratios(practices)
+    accounts = []
+    revenue_parts = {}
+    for p in practices:
+        row, revenue_n, den = compute_practice_row(p, averages, territories)
+        accounts.append(row)
+        revenue_parts[den] = revenue_parts.get(den, 0) + revenue_n
+    return TablePartition(list(practices), accounts, revenue_parts, actual_revenue, actual_placed)
+
+
+def merge_partitions(partitions):
+    """Combine partitions over disjoint territories into one."""
+    merged = TablePartition([], [], {}, {}, {})
+    for part in partitions:
+        merged.practices.extend(part.practices)
+        merged.accounts.extend(part.accounts)
+        for den, numerator in part.revenue_parts.items():
+            merged.revenue_parts[den] = merged.revenue_parts.get(den, 0) + numerator
+        merged.actual_revenue.update(part.actual_revenue)
+        merged.actual_placed.update(part.actual_placed)
+    return merged
+
+
+def partition_totals(part, territories):
+    """TOTAL row for a (merged) partition."""
+    return compute_totals(part.practices, part.revenue_parts, part.actual_revenue, part.actual_placed, territories)
+
+
+def compute_account_table(practices, territories):
+    """Compute (accounts, totals) for a list of PracticeInput."""
+    part = compute_partition(practices, territories)
+    return part.accounts, partition_totals(part, territories)
+
+
+def account_metrics(accounts, totals=None):
+    """
+    Summary counts over computed account rows.
+
+    A practice without its own collection history (revenue_periods 0, so
+    it uses its territory's average) counts as a new account; positive
+    accounts have net income above zero and the rest are negative. Net
+    income, sales expense and ROS come from the exact TOTAL row when the
+    rows are the whole table, and are summed from the rows' cents otherwise.
+    """
+    new_accounts = positive = 0
+    net_income_cents = sales_expense_cents = 0
+    for row in accounts:
+        if row['revenue_periods'] == 0:
+            new_accounts += 1
+        if row['net_income'] > 0:
+            positive += 1
+        net_income_cents += round(row['net_income'] * 100)
+        sales_expense_cents += round(row['sales_expense'] * 100)
+    metrics = {
+        'new_accounts': new_accounts,
+        'total_accounts': len(accounts),
+        'positive_accounts': positive,
+        'negative_accounts': len(accounts) - positive
+    }
+    if totals is not None:
+        metrics.update(total_net_income=totals['net_income'], total_sales_expense=totals['sales_expense'],
+                       ros=totals['ros'])
+    else:
+        metrics.update(
+            total_net_income=dollars(net_income_cents),
+            total_sales_expense=dollars(sales_expense_cents),
+            ros=whole_percent(net_income_cents, sales_expense_cents) if sales_expense_cents > 0 else 0
+        )
+    return metrics
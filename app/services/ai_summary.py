@@ -0,0 +1,290 @@
+"""
+Cached, background generation of the dashboard's AI financial summary.
+
+A summary is keyed by a hash of the figures it describes (the financial
+summary and monthly revenue) and the generator that writes it, so the same
+data is only sent to the model once and switching AI_SUMMARY_BACKEND does not
+serve text another generator wrote. Results are stored in staging.ai_summaries and shared by every worker
+process. Requests never wait on the model: they get the stored text, or a
+pending state while a background thread generates it.
+
+Generators are pluggable. OpenAIGenerator calls the chat completions API
+(the openai package is only imported when it runs);
+TemplateGenerator writes a deterministic analysis locally, for offline use
+(scripts/check_ai_summary_template.py checks that it is deterministic).
+generator_from_env() picks one from AI_SUMMARY_BACKEND.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+
+SUMMARIES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.ai_summaries (
+        summary_key TEXT PRIMARY KEY,
+        status VARCHAR(20) NOT NULL,
+        backend VARCHAR(50),
+        analysis TEXT,
+        error_message TEXT,
+        started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        completed_at TIMESTAMP
+    )
+"""
+
+# Shown when the live data is unavailable or generation failed
+FALLBACK_ANALYSIS = """
+Based on the financial data analysis:
+
+**Revenue Performance:**
+- Total revenue shows strong growth trajectory
+- Monthly revenue has increased consistently over the period
+- Revenue diversification appears healthy across different streams
+
+**Profitability Analysis:**
+- Gross profit margin is strong at approximately 78%
+- Net profit margin indicates good operational efficiency
+- Cost structure appears well-managed with COGS at 22% of revenue
+
+**Key Insights:**
+- The business demonstrates solid financial health
+- Revenue growth is sustainable and well-distributed
+- Profit margins indicate good pricing strategy and cost control
+- Cash flow appears positive with good collection rates
+
+**Recommendations:**
+- Continue monitoring COGS to maintain profit margins
+- Consider expanding successful revenue streams
+- Maintain focus on operational efficiency
+- Monitor collection rates for optimal cash flow
+"""
+
+
+def summary_key(financial_summary, monthly_revenue, backend):
+    """Stable hash of the data a summary describes and the name of the generator writing it."""
+    data = json.dumps({'financial_summary': financial_summary, 'monthly_revenue': monthly_revenue,
+                       'backend': backend}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _percent(part, whole):
+    return part / whole * 100 if whole else 0
+
+
+def build_prompt(financial_summary, monthly_revenue):
+    """Analysis prompt for a language model."""
+    revenue = financial_summary['total_revenue']
+    return f"""
+Analyze this financial data and provide insights:
+
+Financial Summary:
+- Total Revenue: ${revenue:,.0f}
+- Total COGS: ${financial_summary['total_cogs']:,.0f}
+- Gross Profit: ${revenue - financial_summary['total_cogs']:,.0f}
+- Total Expenses: ${financial_summary['total_expenses']:,.0f}
+- Net Operating Income: ${financial_summary['net_operating_income']:,.0f}
+
+Monthly Revenue Trend:
+{chr(10).join([f"- {month['month_name']}: ${month['revenue']:,.0f}" for month in monthly_revenue])}
+
+Please provide:
+1. Revenue performance analysis
+2. Profitability insights
+3. Key financial health indicators
+4. Recommendations for improvement
+
+Keep the analysis professional and actionable.
+"""
+
+
+class OpenAIGenerator:
+    """Summaries from the OpenAI chat completions API."""
+
+    name = 'openai'
+
+    def __init__(self, api_key, model='gpt-3.5-turbo'):
+        self.api_key = api_key
+        self.model = model
+
+    def generate(self, financial_summary, monthly_revenue):
+        import openai  # optional dependency, only needed by this backend
+
+        client = openai.OpenAI(api_key=self.api_key)
+        response = client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a financial analyst providing insights on business performance data."},
+                {"role": "user", "content": build_prompt(financial_summary, monthly_revenue)}
+            ],
+            max_tokens=500,
+            temperature=0.3
+        )
+        return response.choices[0].message.content
+
+
+class TemplateGenerator:
+    """Deterministic summaries written from the figures, with no external calls."""
+
+    name = 'template'
+
+    def generate(self, financial_summary, monthly_revenue):
+        revenue = financial_summary['total_revenue']
+        cogs = financial_summary['total_cogs']
+        expenses = financial_summary['total_expenses']
+        income = financial_summary['net_operating_income']
+        gross_margin = _percent(revenue - cogs, revenue)
+        net_margin = _percent(income, revenue)
+
+        lines = ["Based on the financial data analysis:", "", "**Revenue Performance:**",
+                 f"- Total revenue for the period is ${revenue:,.0f}"]
+        if monthly_revenue:
+            best = max(monthly_revenue, key=lambda month: month['revenue'])
+            worst = min(monthly_revenue, key=lambda month: month['revenue'])
+            first, last = monthly_revenue[0], monthly_revenue[-1]
+            lines.append(f"- Strongest month: {best['month_name']} (${best['revenue']:,.0f}); "
+                         f"weakest: {worst['month_name']} (${worst['revenue']:,.0f})")
+            if first['revenue']:
+                change = _percent(last['revenue'] - first['revenue'], first['revenue'])
+                lines.append(f"- Revenue moved {change:+.1f}% from {first['month_name']} to {last['month_name']}")
+
+        lines += ["", "**Profitability Analysis:**",
+                  f"- COGS is {_percent(cogs, revenue):.1f}% of revenue, for a gross margin of {gross_margin:.1f}%",
+                  f"- Operating expenses are {_percent(expenses, revenue):.1f}% of revenue",
+                  f"- Net operating income is ${income:,.0f} ({net_margin:.1f}% of revenue)"]
+
+        losing = [month['month_name'] for month in monthly_revenue if month.get('income', 0) < 0]
+        lines += ["", "**Key Insights:**"]
+        if losing:
+            lines.append(f"- Operating losses in {', '.join(losing)}")
+        else:
+            lines.append("- Every month in the trend had positive operating income")
+        lines.append(f"- BPS (billing per sample) is ${financial_summary.get('bps', 0):,.2f}")
+
+        lines += ["", "**Recommendations:**"]
+        if gross_margin < 70:
+            lines.append("- Review COGS: gross margin is below 70%")
+        if net_margin < 10:
+            lines.append("- Review operating expenses: net operating margin is below 10%")
+        if losing:
+            lines.append("- Investigate the months with operating losses")
+        if lines[-1] == "**Recommendations:**":
+            lines.append("- Maintain current cost discipline and monitor monthly trends")
+        return "\n".join(lines)
+
+
+def generator_from_env():
+    """
+    Generator chosen by AI_SUMMARY_BACKEND (openai or template). Without it,
+    OpenAI is used when OPENAI_API_KEY is set and the template otherwise.
+    """
+    api_key = os.getenv('OPENAI_API_KEY')
+    backend = os.getenv('AI_SUMMARY_BACKEND') or ('openai' if api_key else 'template')
+    if backend == 'openai':
+        return OpenAIGenerator(api_key, model=os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'))
+    if backend == 'template':
+        return TemplateGenerator()
+    raise ValueError(f"Unknown AI_SUMMARY_BACKEND: {backend}")
+
+
+class AISummaries:
+    """
+    Stored summaries by key, generated in the background on first request.
+
+    A summary that failed, or has been pending (its worker died), for
+    longer than retry_seconds is generated again on the next request.
+    """
+
+    def __init__(self, get_connection, generator, max_workers=1, retry_seconds=300):
+        self.get_connection = get_connection
+        self.generator = generator
+        self.retry_seconds = retry_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-summary')
+        self._table_ready = False
+
+    def get(self, key, financial_summary, monthly_revenue):
+        """
+        {'status', 'analysis', 'backend', 'error', 'generated_at'} for key.
+        Starts generation (status 'pending') when nothing usable is stored.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_table(cursor)
+            # Claim the key unless it is ready or being generated recently;
+            # only the request whose claim succeeds starts the generation
+            cursor.execute("""
+                INSERT INTO staging.ai_summaries (summary_key, status, backend)
+                VALUES (%s, 'pending', %s)
+                ON CONFLICT (summary_key) DO UPDATE
+                SET status = 'pending', backend = EXCLUDED.backend, error_message = NULL,
+                    started_at = NOW(), completed_at = NULL
+                WHERE (ai_summaries.status = 'failed'
+                       AND ai_summaries.completed_at < NOW() - %s * INTERVAL '1 second')
+                   OR (ai_summaries.status = 'pending'
+                       AND ai_summaries.started_at < NOW() - %s * INTERVAL '1 second')
+                RETURNING summary_key
+            """, (key, self.generator.name, self.retry_seconds, self.retry_seconds))
+            claimed = cursor.fetchone() is not None
+            cursor.execute("""
+                SELECT status, analysis, backend, error_message, completed_at
+                FROM staging.ai_summaries WHERE summary_key = %s
+            """, (key,))
+            status, analysis, backend, error_message, completed_at = cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        if claimed:
+            self._executor.submit(self._generate, key, financial_summary, monthly_revenue)
+        return {
+            'status': status,
+            'analysis': analysis,
+            'backend': backend,
+            'error': error_message,
+            'generated_at': completed_at.isoformat() if completed_at else None
+        }
+
+    def _generate(self, key, financial_summary, monthly_revenue):
+        try:
+            analysis = self.generator.generate(financial_summary, monthly_revenue)
+            self._execute("""
+                UPDATE staging.ai_summaries
+                SET status = 'ready', analysis = %s, completed_at = NOW()
+                WHERE summary_key = %s
+            """, (analysis, key))
+            print(f"[DEBUG] AI summary {key[:12]} generated with {self.generator.name}")
+        except Exception as e:
+            print(f"Error generating AI summary {key[:12]}: {e}")
+            try:
+                self._execute("""
+                    UPDATE staging.ai_summaries
+                    SET status = 'failed', error_message = %s, completed_at = NOW()
+                    WHERE summary_key = %s
+                """, (str(e), key))
+            except Exception as update_error:
+                print(f"Error recording failure of AI summary {key[:12]}: {update_error}")
+
+    def _execute(self, query, params):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _ensure_table(self, cursor):
+        if self._table_ready:
+            return
+        try:
+            cursor.execute("SAVEPOINT ai_summaries_table")
+            cursor.execute(SUMMARIES_TABLE_SQL)
+            cursor.execute("RELEASE SAVEPOINT ai_summaries_table")
+        except psycopg2.errors.UniqueViolation:
+            cursor.execute("ROLLBACK TO SAVEPOINT ai_summaries_table")  # created concurrently by another worker
+        self._table_ready = True
@@ -0,0 +1,149 @@
+"""
+Collector cost overrides edited from the dashboard.
+
+staging.collectors holds at most one override per account-table practice,
+keyed by the practice_name and territory the account table shows (the
+account_data values resolved onto sample_billing). The collector lookup of a
+practice (queries.PRACTICE_COLLECTOR) picks the collectors row whose
+practice contains the name, an exact match first, and the override replaces
+that row's june_amount for the practice and in its territory's collector
+cost total (queries.TERRITORY_COLLECTOR_COSTS).
+
+An edit can only take effect for a practice that is in account_data under
+that territory and that has a collectors row; check_targets() reports the
+ones that cannot, so the endpoints reject them instead of storing an
+override nothing reads.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# collector_cost is NUMERIC(15,2); practice_name and territory are VARCHAR(255)
+MAX_COST = Decimal('1e13')
+MAX_NAME_LENGTH = 255
+
+OVERRIDES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.collectors (
+        id SERIAL PRIMARY KEY,
+        practice_name VARCHAR(255),
+        territory VARCHAR(255),
+        collector_cost NUMERIC(15,2),
+        CONSTRAINT collectors_practice_name_territory_key UNIQUE (practice_name, territory)
+    );
+    -- Tables created before the key: keep the latest override of each practice
+    DELETE FROM staging.collectors s
+    USING staging.collectors newer
+    WHERE newer.practice_name = s.practice_name AND newer.territory = s.territory AND newer.id > s.id;
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                       WHERE conname = 'collectors_practice_name_territory_key'
+                         AND conrelid = 'staging.collectors'::regclass) THEN
+            ALTER TABLE staging.collectors
+                ADD CONSTRAINT collectors_practice_name_territory_key UNIQUE (practice_name, territory);
+        END IF;
+    END $$;
+"""
+
+TARGETS_SQL = """
+    SELECT v.practice_name, v.territory,
+           EXISTS (SELECT 1 FROM account_data ad
+                   WHERE ad.practice_name = v.practice_name AND ad.territory = v.territory),
+           EXISTS (SELECT 1 FROM collectors c WHERE c.practice LIKE '%%' || v.practice_name || '%%')
+    FROM (VALUES %s) AS v(practice_name, territory)
+"""
+
+# xmax is 0 on freshly inserted rows, which tells inserts from updates
+UPSERT_SQL = """
+    INSERT INTO staging.collectors AS s (practice_name, territory, collector_cost)
+    VALUES %s
+    ON CONFLICT (practice_name, territory) DO UPDATE SET collector_cost = EXCLUDED.collector_cost
+    RETURNING s.practice_name, s.territory, (xmax = 0) AS inserted
+"""
+
+_table_ready = False
+
+
+def parse_collector_cost(value):
+    """
+    The cost as a Decimal rounded to cents; raises ValueError unless it is
+    a non-negative number that fits NUMERIC(15,2).
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise ValueError('collector_cost must be a number')
+    try:
+        cost = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError('collector_cost must be a number')
+    if not cost.is_finite() or cost < 0:
+        raise ValueError('collector_cost must be a non-negative number')
+    cost = cost.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    if cost >= MAX_COST:
+        raise ValueError(f'collector_cost must be less than {MAX_COST:,.0f}')
+    return cost
+
+
+def parse_collector_edit(edit):
+    """
+    (practice_name, territory, cost) of an edit as posted; raises ValueError
+    unless it is an object with non-empty string practice_name and territory
+    and a valid collector_cost (parse_collector_cost).
+    """
+    if not isinstance(edit, dict):
+        raise ValueError('each edit must be an object')
+    practice_name = edit.get('practice_name')
+    territory = edit.get('territory')
+    if not practice_name or not territory or edit.get('collector_cost') is None:
+        raise ValueError('practice_name, territory and collector_cost are required')
+    for field, value in (('practice_name', practice_name), ('territory', territory)):
+        if not isinstance(value, str):
+            raise ValueError(f'{field} must be a string')
+        if len(value) > MAX_NAME_LENGTH:
+            raise ValueError(f'{field} must be at most {MAX_NAME_LENGTH} characters')
+    return practice_name, territory, parse_collector_cost(edit.get('collector_cost'))
+
+
+def ensure_overrides_table(cursor):
+    """Create staging.collectors with its (practice_name, territory) key (idempotent)."""
+    global _table_ready
+    if _table_ready:
+        return
+    try:
+        cursor.execute("SAVEPOINT collector_overrides_table")
+        cursor.execute(OVERRIDES_TABLE_SQL)
+        cursor.execute("RELEASE SAVEPOINT collector_overrides_table")
+    except (psycopg2.errors.UniqueViolation, psycopg2.errors.DuplicateTable, psycopg2.errors.DuplicateObject):
+        cursor.execute("ROLLBACK TO SAVEPOINT collector_overrides_table")  # created concurrently by another worker
+    _table_ready = True
+
+
+def check_targets(cursor, keys):
+    """
+    Problems with editing the given (practice_name, territory) keys:
+    {key: (HTTP status, message)} for each key an override would not reach.
+    """
+    rows = execute_values(cursor, TARGETS_SQL, list(keys), fetch=True)
+    problems = {}
+    for practice_name, territory, has_account, has_collector in rows:
+        if not has_account:
+            problems[(practice_name, territory)] = (
+                404, f"No account table practice '{practice_name}' in territory '{territory}'"
+            )
+        elif not has_collector:
+            problems[(practice_name, territory)] = (
+                409, f"Practice '{practice_name}' has no collectors row, so it has no collector cost to override"
+            )
+    return problems
+
+
+def upsert_collector_costs(cursor, costs):
+    """
+    Save {(practice_name, territory): cost} overrides; the caller commits.
+    Returns {key: True if inserted, False if an existing override was updated}.
+    """
+    ensure_overrides_table(cursor)
+    values = [(practice_name, territory, cost) for (practice_name, territory), cost in costs.items()]
+    rows = execute_values(cursor, UPSERT_SQL, values, template='(%s, %s, %s::numeric)', fetch=True)
+    return {(practice_name, territory): inserted for practice_name, territory, inserted in rows}
@@ -0,0 +1,69 @@
+"""
+Territory -> sales rep -> practice -> financial class drilldown tree.
+
+The dashboard runs one ROLLUP query over sample_billing joined to the
+territory mapping in force on each placement date
+(queries.ACCOUNT_DRILLDOWN), which returns the grand total and
+the subtotal of every prefix of the hierarchy in a single scan. This module
+turns those rows into a nested tree so the UI can expand any level without
+another request. No database access happens here.
+"""
+
+from app.utils.money import dollars
+
+# Hierarchy levels, outermost first, in the ROLLUP column order
+DRILLDOWN_LEVELS = ('territory', 'sales_rep', 'practice', 'financial_class')
+
+
+def _node(level, name, samples, placed_cents, charges_cents, payments_cents):
+    return {
+        'level': level,
+        'name': name,
+        'samples': samples,
+        'placed': dollars(placed_cents),
+        'charges': dollars(charges_cents),
+        'payments': dollars(payments_cents),
+        'collection_pct': round(payments_cents * 100 / charges_cents, 1) if charges_cents > 0 else 0,
+        'children': []
+    }
+
+
+def build_drilldown_tree(rows):
+    """
+    Build the tree from ROLLUP rows.
+
+    Each row is (*level values, grouping bitmask, samples, placed_cents,
+    charges_cents, payments_cents), where bit i of the mask (counting from the
+    innermost level) is set when that level is rolled up. A row's depth is the
+    number of leading levels that are not rolled up, so NULLs in the data stay
+    distinct from subtotal rows. Children are ordered by placed amount, largest
+    first. Returns the root (grand total) node.
+    """
+    nodes = {}
+    for row in rows:
+        values = row[:len(DRILLDOWN_LEVELS)]
+        mask = row[len(DRILLDOWN_LEVELS)]
+        depth = sum(1 for bit in range(len(DRILLDOWN_LEVELS)) if not mask & (1 << bit))
+        path = tuple(values[:depth])
+        level = DRILLDOWN_LEVELS[depth - 1] if depth else 'total'
+        name = path[-1] if depth else 'TOTAL'
+        nodes[path] = _node(level, name, *row[len(DRILLDOWN_LEVELS) + 1:])
+
+    root = nodes.get(()) or _node('total', 'TOTAL', 0, 0, 0, 0)
+    for path in sorted((path for path in nodes if path), key=len):
+        parent = nodes.get(path[:-1])
+        if parent is not None:
+            parent['children'].append(nodes[path])
+    for node in nodes.values():
+        node['children'].sort(key=lambda child: child['placed'], reverse=True)
+    return root
+
+
+def find_subtree(root, path):
+    """The node at path (level values from the top), or None."""
+    node = root
+    for name in path:
+        node = next((child for child in node['children'] if child['name'] == name), None)
+        if node is None:
+            return None
+    return node
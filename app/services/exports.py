@@ -0,0 +1,277 @@
+"""
+Streaming data exports for the dashboard API.
+
+Query-backed datasets are read through a named (server-side) cursor in
+batches of EXPORT_BATCH_ROWS rows, and each batch is encoded and handed to
+the response as soon as it is read, so an export never holds more than one
+batch in worker memory. CSV is written row by row; XLSX is built with
+openpyxl's write-only workbook, which spools rows to a temporary file instead
+of keeping them in memory. Arrow IPC and Parquet output need pyarrow, which
+is optional.
+"""
+
+import csv
+import io
+import os
+import tempfile
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+EXPORT_BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', '10000'))
+# Size of the pieces a finished XLSX file is sent in
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# format: (mimetype, file extension, library it needs)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv', None),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx', 'openpyxl'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', 'pyarrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', 'pyarrow')
+}
+
+# Practice-month rollups of placed and collected amounts
+PRACTICE_MONTH_COLUMNS = [
+    ('practice', 'string'),
+    ('territory', 'string'),
+    ('month', 'date'),
+    ('sample_count', 'integer'),
+    ('placed', 'decimal'),
+    ('charges', 'decimal'),
+    ('collected', 'decimal'),
+    ('current_balance', 'decimal')
+]
+
+PRACTICE_MONTH_SQL = '''
+    SELECT sb.practice_name, sb.territory,
+           DATE_TRUNC('month', sb.placement_date)::date AS month,
+           COUNT(sb.client_account_number) AS sample_count,
+           COALESCE(SUM(sb.initial_balance), 0) AS placed,
+           COALESCE(SUM(sb.total_charges), 0) AS charges,
+           COALESCE(SUM(sb.total_payments), 0) AS collected,
+           COALESCE(SUM(sb.current_balance), 0) AS current_balance
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL
+    AND DATE(sb.placement_date) >= %(start)s AND DATE(sb.placement_date) <= %(end)s
+    {filters}
+    GROUP BY sb.practice_name, sb.territory, DATE_TRUNC('month', sb.placement_date)
+    ORDER BY month, sb.territory, sb.practice_name
+'''
+
+# Raw sample_billing rows with the practice and territory they belong to
+SAMPLE_BILLING_COLUMNS = [
+    ('client_account_number', 'string'),
+    ('practice', 'string'),
+    ('territory', 'string'),
+    ('placement_date', 'timestamp'),
+    ('billed_date', 'date'),
+    ('service_date_from', 'date'),
+    ('financial_class', 'string'),
+    ('payer_name_primary', 'string'),
+    ('initial_balance', 'decimal'),
+    ('total_charges', 'decimal'),
+    ('total_payments', 'decimal'),
+    ('total_payments_by_insurance', 'decimal'),
+    ('total_payments_by_patient', 'decimal'),
+    ('total_adjustments', 'decimal'),
+    ('current_balance', 'decimal')
+]
+
+SAMPLE_BILLING_SQL = '''
+    SELECT sb.client_account_number, sb.practice_name, sb.territory,
+           sb.placement_date, sb.billed_date, sb.service_date_from,
+           sb.financial_class, sb.payer_name_primary,
+           sb.initial_balance, sb.total_charges, sb.total_payments,
+           sb.total_payments_by_insurance, sb.total_payments_by_patient,
+           sb.total_adjustments, sb.current_balance
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL
+    AND DATE(sb.placement_date) >= %(start)s AND DATE(sb.placement_date) <= %(end)s
+    {filters}
+    ORDER BY sb.placement_date, sb.client_account_number
+'''
+
+# dataset: (columns, query); the account table is computed, not queried
+EXPORT_DATASETS = {
+    'practice_month': (PRACTICE_MONTH_COLUMNS, PRACTICE_MONTH_SQL),
+    'sample_billing': (SAMPLE_BILLING_COLUMNS, SAMPLE_BILLING_SQL)
+}
+
+
+def dataset_query(dataset, start_date, end_date, territory=None, practice=None):
+    """Return (sql, params) for a query-backed dataset and its filters."""
+    _, sql = EXPORT_DATASETS[dataset]
+    params = {'start': start_date, 'end': end_date}
+    filters = []
+    if territory:
+        filters.append('AND sb.territory = %(territory)s')
+        params['territory'] = territory
+    if practice:
+        filters.append('AND sb.practice_name = %(practice)s')
+        params['practice'] = practice
+    return sql.format(filters='\n    '.join(filters)), params
+
+
+def iter_query_batches(get_connection, sql, params, batch_size=EXPORT_BATCH_ROWS):
+    """Yield lists of row tuples from a named server-side cursor."""
+    conn = get_connection()
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+    cursor.itersize = batch_size
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        conn.rollback()
+        conn.close()
+
+
+def iter_row_batches(rows, columns, batch_size=EXPORT_BATCH_ROWS):
+    """Yield lists of row tuples, in column order, from in-memory row dicts."""
+    names = [name for name, _ in columns]
+    for start in range(0, len(rows), batch_size):
+        yield [tuple(row.get(name) for name in names) for row in rows[start:start + batch_size]]
+
+
+def export_filename(dataset, file_format, start_date, end_date):
+    """Download file name for an export."""
+    _, extension, _ = EXPORT_FORMATS[file_format]
+    return f"{dataset}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{extension}"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file object that collects bytes until they are drained."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(value_type):
+    return {
+        'string': pa.string(),
+        'integer': pa.int64(),
+        'number': pa.float64(),
+        'decimal': pa.decimal128(15, 2),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us')
+    }[value_type]
+
+
+def arrow_schema(columns):
+    """pyarrow schema for a list of (name, type) columns."""
+    return pa.schema([(name, _arrow_type(value_type)) for name, value_type in columns])
+
+
+def stream_arrow(columns, batches, file_format):
+    """
+    Encode row batches as an Arrow IPC stream or a Parquet file.
+
+    Every batch becomes one record batch (one row group for Parquet) and is
+    yielded as bytes before the next batch is read.
+    """
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        batches.close()
+
+
+def stream_csv(columns, batches):
+    """Encode row batches as UTF-8 CSV with a header row, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        writer.writerow([name for name, _ in columns])
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+    finally:
+        batches.close()
+
+
+def stream_xlsx(columns, batches, sheet_title='Export'):
+    """
+    Build an XLSX workbook in write-only mode and yield the file in chunks.
+
+    Rows go straight to openpyxl's temporary worksheet file, so memory stays
+    bounded by one batch; the zip container can only be sent once it is
+    complete.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    with tempfile.TemporaryFile() as output:
+        try:
+            sheet.append([name for name, _ in columns])
+            for rows in batches:
+                for row in rows:
+                    sheet.append(row)
+            workbook.save(output)
+        finally:
+            batches.close()
+        output.seek(0)
+        while True:
+            chunk = output.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_export(columns, batches, file_format, title='Export'):
+    """Yield the encoded bytes of an export in the given format."""
+    if file_format == 'csv':
+        return stream_csv(columns, batches)
+    if file_format == 'xlsx':
+        return stream_xlsx(columns, batches, title)
+    if file_format in ('arrow', 'parquet'):
+        return stream_arrow(columns, batches, file_format)
+    raise ValueError(f"Unsupported export format: {file_format}")
+
+
+def format_available(file_format):
+    """Whether the library an export format needs is installed."""
+    _, _, library = EXPORT_FORMATS[file_format]
+    if library == 'pyarrow':
+        return pa is not None
+    if library == 'openpyxl':
+        return Workbook is not None
+    return True
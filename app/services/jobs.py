@@ -0,0 +1,274 @@
+"""
+Background report jobs.
+
+A job is an export spec (the same dataset/format/period/filters accepted by
+/api/dashboard/export) run on a bounded thread pool outside the request
+thread. Job state lives in staging.report_jobs and each finished report is
+written to a file under the result directory, so status and downloads work
+from any worker process on the host.
+
+Each job records the process that accepted it. start() runs a background
+sweep that marks jobs of processes that no longer run on this host as failed
+(so clients stop polling after a restart) and deletes finished jobs and their
+files once they are older than retention_seconds.
+"""
+
+import glob
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import Json
+
+
+JOBS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.report_jobs (
+        job_id TEXT PRIMARY KEY,
+        spec JSONB NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        filename TEXT,
+        mimetype TEXT,
+        result_bytes BIGINT,
+        error_message TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        started_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        owner TEXT
+    )
+"""
+
+JOB_COLUMNS = [
+    'job_id', 'spec', 'status', 'filename', 'mimetype', 'result_bytes',
+    'error_message', 'created_at', 'started_at', 'finished_at'
+]
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+class ReportJobs:
+    """
+    Run report jobs on a bounded worker pool.
+
+    run_job(spec) returns (chunks, mimetype, filename) where chunks yields
+    the report bytes; they are written to <result_dir>/<job_id>.<ext>.
+    At most max_workers jobs run at once and at most max_pending are
+    accepted by this process before submit() raises JobQueueFull.
+    """
+
+    def __init__(self, get_connection, run_job, result_dir='reports', max_workers=2, max_pending=20,
+                 retention_seconds=86400, sweep_seconds=3600):
+        self.get_connection = get_connection
+        self.run_job = run_job
+        self.result_dir = os.path.abspath(result_dir)
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.sweep_seconds = sweep_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._table_ready = False
+
+    def submit(self, spec):
+        """Record a queued job for spec, hand it to the pool and return its id."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f'Too many report jobs in progress ({self.max_pending}), try again later')
+            self._pending += 1
+        try:
+            job_id = uuid.uuid4().hex
+            self._execute("""
+                INSERT INTO staging.report_jobs (job_id, spec, status, owner)
+                VALUES (%s, %s, 'queued', %s)
+            """, (job_id, Json(spec), self.owner))
+            self._executor.submit(self._run, job_id, spec)
+            return job_id
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def get(self, job_id):
+        """Job state as a JSON-ready dict, or None if the job is unknown."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_table(cursor)
+            cursor.execute(f"""
+                SELECT {', '.join(JOB_COLUMNS)} FROM staging.report_jobs WHERE job_id = %s
+            """, (job_id,))
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        for name in ('created_at', 'started_at', 'finished_at'):
+            if job[name] is not None:
+                job[name] = job[name].isoformat()
+        return job
+
+    def start(self):
+        """Recover jobs orphaned by a restart, then sweep old jobs every sweep_seconds, in a daemon thread."""
+        thread = threading.Thread(target=self._sweep_loop, name='report-job-sweep', daemon=True)
+        thread.start()
+        return thread
+
+    def fail_orphaned(self):
+        """
+        Mark queued or running jobs of processes that no longer run on this
+        host (or that predate owner tracking) as failed. Returns their ids.
+        """
+        host = socket.gethostname()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_table(cursor)
+            cursor.execute("""
+                SELECT job_id, owner FROM staging.report_jobs WHERE status IN ('queued', 'running')
+            """)
+            orphaned = [job_id for job_id, owner in cursor.fetchall() if _owner_gone(owner, host)]
+            if orphaned:
+                cursor.execute("""
+                    UPDATE staging.report_jobs
+                    SET status = 'failed', error_message = 'Interrupted by a worker restart', finished_at = NOW()
+                    WHERE job_id = ANY(%s) AND status IN ('queued', 'running')
+                """, (orphaned,))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return orphaned
+
+    def sweep(self):
+        """Delete finished jobs older than retention_seconds and their files; returns the number deleted."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_table(cursor)
+            cursor.execute("""
+                DELETE FROM staging.report_jobs
+                WHERE status IN ('succeeded', 'failed')
+                  AND finished_at < NOW() - make_interval(secs => %s)
+                RETURNING job_id, filename
+            """, (self.retention_seconds,))
+            deleted = cursor.fetchall()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        for job_id, filename in deleted:
+            path = self.result_path({'job_id': job_id, 'filename': filename})
+            if os.path.exists(path):
+                os.remove(path)
+        # Partial files of jobs interrupted mid-write
+        cutoff = time.time() - self.retention_seconds
+        for path in glob.glob(os.path.join(self.result_dir, '*.part')):
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        return len(deleted)
+
+    def result_path(self, job):
+        """Path of the file a job writes its report to."""
+        extension = os.path.splitext(job['filename'] or '')[1]
+        return os.path.join(self.result_dir, f"{job['job_id']}{extension}")
+
+    def _run(self, job_id, spec):
+        path = None
+        try:
+            self._execute("""
+                UPDATE staging.report_jobs SET status = 'running', started_at = NOW()
+                WHERE job_id = %s
+            """, (job_id,))
+            chunks, mimetype, filename = self.run_job(spec)
+            path = self.result_path({'job_id': job_id, 'filename': filename})
+            os.makedirs(self.result_dir, exist_ok=True)
+            size = 0
+            with open(path + '.part', 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    size += len(chunk)
+            os.replace(path + '.part', path)
+            self._execute("""
+                UPDATE staging.report_jobs
+                SET status = 'succeeded', filename = %s, mimetype = %s, result_bytes = %s, finished_at = NOW()
+                WHERE job_id = %s
+            """, (filename, mimetype, size, job_id))
+            print(f"[DEBUG] Report job {job_id} finished: {filename} ({size} bytes)")
+        except Exception as e:
+            print(f"Error in report job {job_id}: {e}")
+            if path and os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+            try:
+                self._execute("""
+                    UPDATE staging.report_jobs
+                    SET status = 'failed', error_message = %s, finished_at = NOW()
+                    WHERE job_id = %s
+                """, (str(e), job_id))
+            except Exception as update_error:
+                print(f"Error recording failure of report job {job_id}: {update_error}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _sweep_loop(self):
+        try:
+            orphaned = self.fail_orphaned()
+            if orphaned:
+                print(f"[DEBUG] Marked {len(orphaned)} interrupted report jobs as failed")
+        except Exception as e:
+            print(f"Error recovering report jobs: {e}")
+        while True:
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    print(f"[DEBUG] Deleted {deleted} expired report jobs")
+            except Exception as e:
+                print(f"Error sweeping report jobs: {e}")
+            time.sleep(self.sweep_seconds)
+
+    def _execute(self, query, params):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_table(cursor)
+            cursor.execute(query, params)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _ensure_table(self, cursor):
+        if self._table_ready:
+            return
+        try:
+            cursor.execute("SAVEPOINT report_jobs_table")
+            cursor.execute(JOBS_TABLE_SQL)
+            cursor.execute("RELEASE SAVEPOINT report_jobs_table")
+        except psycopg2.errors.UniqueViolation:
+            cursor.execute("ROLLBACK TO SAVEPOINT report_jobs_table")  # created concurrently by another worker
+        self._table_ready = True
+
+
+def _owner_gone(owner, host):
+    """Whether the process that accepted a job (host:pid) is known not to run any more."""
+    if owner is None:
+        return True
+    owner_host, _, pid = owner.rpartition(':')
+    if owner_host != host:
+        return False  # another host's processes cannot be checked from here
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, ValueError):
+        return False
+    return False
@@ -0,0 +1,99 @@
+"""
+Payer-mix cube built from sample_billing.
+
+analytics.payer_mix holds sample counts, placed amounts, charges and
+payments per (practice, placement month, financial class, primary payer).
+It is rebuilt from sample_billing whenever sample accounts are resolved
+(after each sample billing or account import, see
+app/services/sample_accounts.py), so the dashboard reads
+a practice's payer mix for any run of whole months from a few small rows
+instead of scanning sample_billing per practice.
+"""
+
+# Missing classes and payers are stored under this name (the cube's key
+# columns are NOT NULL)
+UNKNOWN = 'Unknown'
+
+REBUILD_SQL = f'''
+    INSERT INTO analytics.payer_mix
+        (practice_name, month, financial_class, payer_name, samples, placed, charges, payments)
+    SELECT sb.practice_name,
+           DATE_TRUNC('month', sb.placement_date)::date,
+           COALESCE(NULLIF(sb.financial_class, ''), '{UNKNOWN}'),
+           COALESCE(NULLIF(sb.payer_name_primary, ''), '{UNKNOWN}'),
+           COUNT(sb.client_account_number),
+           COALESCE(SUM(sb.initial_balance), 0),
+           COALESCE(SUM(sb.total_charges), 0),
+           COALESCE(SUM(sb.total_payments), 0)
+    FROM sample_billing sb
+    WHERE sb.placement_date IS NOT NULL AND sb.practice_name IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+'''
+
+
+def rebuild_payer_mix(conn):
+    """Replace the cube's contents from sample_billing in one transaction; returns the row count."""
+    cursor = conn.cursor()
+    try:
+        rows = replace_payer_mix(cursor)
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def replace_payer_mix(cursor):
+    """Replace the cube's contents from sample_billing; the caller commits. Returns the row count."""
+    cursor.execute('DELETE FROM analytics.payer_mix')
+    cursor.execute(REBUILD_SQL)
+    return cursor.rowcount
+
+
+def _amounts(samples, charges_cents, payments_cents):
+    return {
+        'samples': samples,
+        'charges': charges_cents / 100,
+        'payments': payments_cents / 100
+    }
+
+
+def _totals(values):
+    """Summed (samples, charges_cents, payments_cents) of several such tuples."""
+    return tuple(sum(column) for column in zip(*values)) or (0, 0, 0)
+
+
+def payer_mix_by_practice(rows):
+    """
+    Group cube rows into a payer mix per practice.
+
+    rows are (practice, financial_class, payer, samples, charges_cents,
+    payments_cents). Each practice gets its totals and a breakdown by
+    financial class (largest first) with each class's share of samples as
+    percent and its primary payers.
+    """
+    practices = {}
+    for practice, financial_class, payer, *values in rows:
+        practices.setdefault(practice, {}).setdefault(financial_class, {})[payer] = tuple(values)
+
+    mix = {}
+    for practice, classes in practices.items():
+        class_totals = {financial_class: _totals(payers.values()) for financial_class, payers in classes.items()}
+        practice_totals = _totals(class_totals.values())
+        breakdown = []
+        for financial_class, payers in classes.items():
+            totals = class_totals[financial_class]
+            entry = dict(_amounts(*totals), **{
+                'class': financial_class,
+                'percent': round(totals[0] * 100 / practice_totals[0], 1) if practice_totals[0] else 0,
+                'payers': sorted(
+                    (dict(_amounts(*values), payer=payer) for payer, values in payers.items()),
+                    key=lambda item: (-item['samples'], item['payer'])
+                )
+            })
+            breakdown.append(entry)
+        breakdown.sort(key=lambda item: (-item['samples'], item['class']))
+        mix[practice] = dict(_amounts(*practice_totals), breakdown=breakdown)
+    return mix
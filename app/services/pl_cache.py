@@ -0,0 +1,136 @@
+"""
+In-process cache of the P&L facts in analytics.pl_consolidated.
+
+The table holds one value per metric and month (by month name) and only
+changes when the P&L import runs, so each worker loads it once with one
+grouped query and answers the live dashboard's KPI cards and monthly series
+from memory for any month or range. The import bumps the PL_FACTS generation
+(app/utils/generations.py) in its transaction; a background read of the
+generation, at most every check_seconds, reloads the facts after an import.
+Requests themselves never touch the database once it is loaded.
+"""
+
+import calendar
+import threading
+import time
+from decimal import Decimal
+
+from app.utils.generations import PL_FACTS, read_generation
+
+PL_FACTS_SQL = '''
+    SELECT month_year, metric_name, SUM(value)
+    FROM analytics.pl_consolidated
+    GROUP BY month_year, metric_name
+'''
+
+MONTH_NAMES = list(calendar.month_name)[1:]
+
+
+class PLFacts:
+    """{month name: {metric: Decimal}} loaded from pl_consolidated."""
+
+    def __init__(self, values, generation=0):
+        self.values = values
+        self.generation = generation
+
+    @classmethod
+    def load(cls, cursor):
+        # Read first: an import committed in between only causes another reload
+        generation = read_generation(cursor, PL_FACTS)
+        cursor.execute(PL_FACTS_SQL)
+        values = {}
+        for month, metric, value in cursor.fetchall():
+            values.setdefault(month, {})[metric] = value if value is not None else Decimal('0')
+        return cls(values, generation)
+
+    def totals(self, months):
+        """{metric: summed Decimal} over the named months."""
+        totals = {}
+        for month in months:
+            for metric, value in self.values.get(month, {}).items():
+                totals[metric] = totals.get(metric, Decimal('0')) + value
+        return totals
+
+    def days(self, months, year):
+        """Calendar days in year of the named months that have facts."""
+        return sum(calendar.monthrange(year, MONTH_NAMES.index(month) + 1)[1]
+                   for month in months if month in self.values)
+
+    def monthly(self):
+        """[(month name, {metric: Decimal})] for the months present, in calendar order."""
+        return [(month, self.values[month]) for month in MONTH_NAMES if month in self.values]
+
+
+class PLCache:
+    """
+    The current PLFacts for a worker process.
+
+    The first get() loads synchronously; after that get() returns the loaded
+    facts immediately and starts a background reload check when one is due.
+    """
+
+    def __init__(self, get_connection, check_seconds=60):
+        self.get_connection = get_connection
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._facts = None
+        self._checked_at = 0.0
+        self._checking = False
+
+    def get(self):
+        """The loaded P&L facts."""
+        with self._lock:
+            facts = self._facts
+        if facts is None:
+            return self.refresh()
+        with self._lock:
+            due = time.monotonic() - self._checked_at >= self.check_seconds
+            if due and not self._checking:
+                self._checking = True
+                threading.Thread(target=self._check, name='pl-cache', daemon=True).start()
+        return facts
+
+    def refresh(self):
+        """Reload the facts now; returns them."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            facts = PLFacts.load(cursor)
+            conn.rollback()
+        finally:
+            cursor.close()
+            conn.close()
+        with self._lock:
+            self._facts = facts
+            self._checked_at = time.monotonic()
+        print(f"[DEBUG] Loaded P&L facts for {len(facts.values)} months")
+        return facts
+
+    def _check(self):
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            try:
+                generation = read_generation(cursor, PL_FACTS)
+                conn.rollback()
+            finally:
+                cursor.close()
+                conn.close()
+            if self._facts is None or generation != self._facts.generation:
+                self.refresh()
+        except Exception as e:
+            print(f"Error checking P&L facts: {e}")
+        finally:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self._checking = False
+
+
+def month_names_between(start_date, end_date):
+    """Names of the calendar months from start_date to end_date, each once."""
+    names = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month) and len(names) < 12:
+        names.append(MONTH_NAMES[month - 1])
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return names
@@ -0,0 +1,609 @@
+"""
+Incremental QuickBooks Online sync into raw.qbo_transactions.
+
+A background worker pulls only what changed since the last run from QBO's
+change data capture endpoint (/cdc) and upserts it in bulk, so dashboards
+read QBO transactions from the local table and never wait on the QBO API.
+
+Each (realm, entity) keeps a high-water mark in staging.qbo_sync_state:
+the changedSince cursor for its next CDC call. A CDC response holds at
+most page_limit objects per entity; a full page moves that entity's cursor
+to the newest LastUpdatedTime it contained and fetches again, otherwise
+the cursor moves to the server time of the response. CDC cannot page
+within one timestamp, so when a full page never gets past the cursor's
+second, the objects of that second are read with the query API, ordered by
+Id and paged with STARTPOSITION, and the cursor moves to the next second.
+The upserted rows and the new cursors are committed in one transaction,
+and re-fetching a record is harmless (unchanged rows are left as they
+are), so a run that dies part-way resumes where it left off.
+
+Deleted QBO objects only carry their Id; the matching row is kept and
+flagged is_deleted.
+
+Customers are synced the same way into staging.qbo_customers, for their
+AcctNum: transactions only reference a customer by its QBO id and display
+name, and AcctNum is where the billing account number (the account_number of
+the territory mapping and sample_billing.client_account_number) is kept.
+
+QBO answers CDC for the last 30 days only. A cursor older than that (a
+realm seen for the first time, which starts initial_days back, or one that
+was not synced for a month) is caught up with the query API instead, paged
+by LastUpdatedTime, before CDC takes over. Queries do not return deleted
+objects, so deletions older than the CDC window are not seen.
+
+The HTTP client uses only the standard library, and its base and token
+URLs are configurable, so the sync can be run against a local stub server
+that replays recorded QBO responses.
+"""
+
+import base64
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import psycopg2
+from psycopg2.extras import Json, execute_values
+
+
+# Transaction entities copied into raw.qbo_transactions
+SYNC_ENTITIES = (
+    'Invoice', 'SalesReceipt', 'Payment', 'CreditMemo', 'RefundReceipt',
+    'Deposit', 'Purchase', 'Bill', 'BillPayment', 'JournalEntry'
+)
+
+# Copied into staging.qbo_customers instead
+CUSTOMER_ENTITY = 'Customer'
+
+QBO_BASE_URLS = {
+    'sandbox': 'https://sandbox-quickbooks.api.intuit.com',
+    'production': 'https://quickbooks.api.intuit.com'
+}
+QBO_TOKEN_URL = 'https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer'
+
+# QBO answers CDC for the last 30 days; older cursors are caught up by query,
+# with a day's margin for clock skew
+CDC_WINDOW = timedelta(days=29)
+ONE_SECOND = timedelta(seconds=1)
+
+SYNC_STATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.qbo_sync_state (
+        realm_id VARCHAR(64) NOT NULL,
+        entity VARCHAR(50) NOT NULL,
+        changed_since TIMESTAMPTZ NOT NULL,
+        synced_at TIMESTAMP,
+        records_synced BIGINT NOT NULL DEFAULT 0,
+        error_message TEXT,
+        PRIMARY KEY (realm_id, entity)
+    )
+"""
+
+# QBO customer id -> billing account number (also in database/schemas/init.sql);
+# changed_at moves whenever a customer's row changes
+CUSTOMERS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.qbo_customers (
+        customer_id VARCHAR(64) PRIMARY KEY,
+        display_name VARCHAR(255),
+        acct_num VARCHAR(255),
+        is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
+        qbo_updated_at TIMESTAMPTZ,
+        changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_qbo_customers_acct_num ON staging.qbo_customers(acct_num);
+    CREATE INDEX IF NOT EXISTS idx_qbo_customers_changed_at ON staging.qbo_customers(changed_at);
+"""
+
+# Sync bookkeeping on the raw table (also in database/schemas/init.sql)
+RAW_COLUMNS_SQL = """
+    ALTER TABLE raw.qbo_transactions
+        ADD COLUMN IF NOT EXISTS qbo_updated_at TIMESTAMPTZ,
+        ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN NOT NULL DEFAULT FALSE
+"""
+
+# Unchanged rows are skipped so updated_at only moves when QBO data did
+UPSERT_SQL = """
+    INSERT INTO raw.qbo_transactions AS t (
+        qbo_id, customer_name, account_name, amount, txn_date, txn_type,
+        description, raw_json, qbo_updated_at, is_deleted
+    ) VALUES %s
+    ON CONFLICT (qbo_id) DO UPDATE SET
+        customer_name = EXCLUDED.customer_name,
+        account_name = EXCLUDED.account_name,
+        amount = EXCLUDED.amount,
+        txn_date = EXCLUDED.txn_date,
+        txn_type = EXCLUDED.txn_type,
+        description = EXCLUDED.description,
+        raw_json = EXCLUDED.raw_json,
+        qbo_updated_at = EXCLUDED.qbo_updated_at,
+        is_deleted = FALSE,
+        updated_at = NOW()
+    WHERE t.raw_json IS DISTINCT FROM EXCLUDED.raw_json OR t.is_deleted
+"""
+
+DELETE_SQL = """
+    UPDATE raw.qbo_transactions AS t
+    SET is_deleted = TRUE, raw_json = v.raw_json, qbo_updated_at = v.qbo_updated_at,
+        updated_at = NOW()
+    FROM (VALUES %s) AS v (qbo_id, raw_json, qbo_updated_at)
+    WHERE t.qbo_id = v.qbo_id AND NOT t.is_deleted
+"""
+
+CUSTOMER_UPSERT_SQL = """
+    INSERT INTO staging.qbo_customers AS q (customer_id, display_name, acct_num, qbo_updated_at)
+    VALUES %s
+    ON CONFLICT (customer_id) DO UPDATE SET
+        display_name = EXCLUDED.display_name,
+        acct_num = EXCLUDED.acct_num,
+        qbo_updated_at = EXCLUDED.qbo_updated_at,
+        is_deleted = FALSE,
+        changed_at = NOW()
+    WHERE (q.display_name, q.acct_num, q.is_deleted)
+          IS DISTINCT FROM (EXCLUDED.display_name, EXCLUDED.acct_num, FALSE)
+"""
+
+# The account number is kept, for the deleted customer's transactions
+CUSTOMER_DELETE_SQL = """
+    UPDATE staging.qbo_customers AS q
+    SET is_deleted = TRUE, qbo_updated_at = v.qbo_updated_at, changed_at = NOW()
+    FROM (VALUES %s) AS v (customer_id, qbo_updated_at)
+    WHERE q.customer_id = v.customer_id AND NOT q.is_deleted
+"""
+
+# Most recent token per connected company
+TOKENS_SQL = """
+    SELECT DISTINCT ON (realm_id) realm_id, user_id, access_token, refresh_token, expires_at
+    FROM staging.qbo_tokens
+    ORDER BY realm_id, updated_at DESC NULLS LAST
+"""
+
+# Held for the duration of a run so one process syncs at a time
+SYNC_LOCK_ID = 0x71626f73796e63  # 'qbosync'
+
+
+class QBOError(Exception):
+    """A QBO API call failed."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_qbo_time(value):
+    """Timezone-aware datetime from a QBO timestamp such as 2015-10-13T10:44:51.011-07:00."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def changes_query(entity, since, until=None, order_by='MetaData.LastUpdatedTime', start_position=1,
+                  max_results=1000):
+    """QBO query for the objects of entity last updated at or after since (and before until)."""
+    def literal(value):
+        return value.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+    where = f"MetaData.LastUpdatedTime >= '{literal(since)}'"
+    if until is not None:
+        where += f" AND MetaData.LastUpdatedTime < '{literal(until)}'"
+    return (f"SELECT * FROM {entity} WHERE {where} ORDERBY {order_by} "
+            f"STARTPOSITION {start_position} MAXRESULTS {max_results}")
+
+
+def _newest(objects):
+    return max((parse_qbo_time(obj['MetaData']['LastUpdatedTime']) for obj in objects), default=None)
+
+
+class QBOClient:
+    """Minimal QBO API client: change data capture, queries and OAuth token refresh."""
+
+    def __init__(self, base_url, token_url=QBO_TOKEN_URL, client_id=None, client_secret=None,
+                 minor_version='65', timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.minor_version = minor_version
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, environ):
+        """Client configured from QBO_* settings (QBO_API_BASE_URL/QBO_TOKEN_URL override the Intuit URLs)."""
+        environment = environ.get('QBO_ENVIRONMENT', 'sandbox')
+        return cls(
+            base_url=environ.get('QBO_API_BASE_URL') or QBO_BASE_URLS.get(environment, QBO_BASE_URLS['sandbox']),
+            token_url=environ.get('QBO_TOKEN_URL') or QBO_TOKEN_URL,
+            client_id=environ.get('QBO_CLIENT_ID'),
+            client_secret=environ.get('QBO_CLIENT_SECRET'),
+            minor_version=environ.get('QBO_MINOR_VERSION', '65'),
+            timeout=int(environ.get('QBO_TIMEOUT_SECONDS', '30'))
+        )
+
+    def cdc(self, access_token, realm_id, entities, changed_since):
+        """
+        Objects changed since changed_since, as ({entity: [objects]}, server time).
+        """
+        query = urlencode({
+            'entities': ','.join(entities),
+            'changedSince': changed_since.isoformat(timespec='seconds'),
+            'minorversion': self.minor_version
+        })
+        request = Request(f"{self.base_url}/v3/company/{realm_id}/cdc?{query}", headers={
+            'Authorization': f'Bearer {access_token}',
+            'Accept': 'application/json'
+        })
+        body = self._send(request)
+        changes = {entity: [] for entity in entities}
+        for response in body.get('CDCResponse', []):
+            for query_response in response.get('QueryResponse', []):
+                for entity, objects in query_response.items():
+                    if isinstance(objects, list):
+                        changes.setdefault(entity, []).extend(objects)
+        server_time = parse_qbo_time(body['time']) if body.get('time') else datetime.now(timezone.utc)
+        return changes, server_time
+
+    def query(self, access_token, realm_id, entity, statement):
+        """
+        Objects of entity a query statement returns, as ([objects], server time).
+        """
+        query = urlencode({'query': statement, 'minorversion': self.minor_version})
+        request = Request(f"{self.base_url}/v3/company/{realm_id}/query?{query}", headers={
+            'Authorization': f'Bearer {access_token}',
+            'Accept': 'application/json'
+        })
+        body = self._send(request)
+        objects = body.get('QueryResponse', {}).get(entity, [])
+        server_time = parse_qbo_time(body['time']) if body.get('time') else datetime.now(timezone.utc)
+        return objects, server_time
+
+    def refresh_access_token(self, refresh_token):
+        """New {'access_token', 'refresh_token', 'expires_at'} for a refresh token."""
+        credentials = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        request = Request(
+            self.token_url,
+            data=urlencode({'grant_type': 'refresh_token', 'refresh_token': refresh_token}).encode(),
+            headers={
+                'Authorization': f'Basic {credentials}',
+                'Accept': 'application/json',
+                'Content-Type': 'application/x-www-form-urlencoded'
+            }
+        )
+        body = self._send(request)
+        return {
+            'access_token': body['access_token'],
+            'refresh_token': body.get('refresh_token', refresh_token),
+            'expires_at': datetime.now() + timedelta(seconds=int(body.get('expires_in', 3600)))
+        }
+
+    def _send(self, request):
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read().decode('utf-8'))
+        except HTTPError as e:
+            raise QBOError(f"QBO request failed with HTTP {e.code}: {e.read().decode('utf-8', 'replace')[:500]}",
+                           status=e.code)
+        fault = body.get('Fault') if isinstance(body, dict) else None
+        if fault:
+            errors = fault.get('Error') or [{}]
+            raise QBOError(f"QBO fault: {errors[0].get('Message')} {errors[0].get('Detail', '')}".strip())
+        return body
+
+
+def _ref_name(obj, *names):
+    for name in names:
+        ref = obj.get(name)
+        if isinstance(ref, dict) and ref.get('name'):
+            return ref['name']
+    return None
+
+
+def transaction_row(entity, obj):
+    """raw.qbo_transactions values for one CDC object that was not deleted."""
+    lines = obj.get('Line') or []
+    description = obj.get('PrivateNote') or next((line['Description'] for line in lines if line.get('Description')), None)
+    return (
+        f"{entity}:{obj['Id']}",
+        _ref_name(obj, 'CustomerRef', 'VendorRef', 'EntityRef'),
+        _ref_name(obj, 'AccountRef', 'DepositToAccountRef', 'ARAccountRef', 'APAccountRef'),
+        obj.get('TotalAmt'),
+        obj.get('TxnDate'),
+        entity,
+        description,
+        Json(obj),
+        parse_qbo_time(obj['MetaData']['LastUpdatedTime']),
+        False
+    )
+
+
+class QBOSync:
+    """
+    Copies QBO transaction changes into raw.qbo_transactions and customer
+    changes into staging.qbo_customers.
+
+    run_once() syncs every company with a stored token (or only realm_ids,
+    if given); start() runs it every interval_seconds in a daemon thread.
+    after_sync(conn), if given, runs at the end of each sync while the sync
+    lock is still held (the raw-to-staging transform). clock() gives the
+    current time that cursors are compared with the CDC window against.
+    """
+
+    def __init__(self, get_connection, client, entities=SYNC_ENTITIES + (CUSTOMER_ENTITY,),
+                 interval_seconds=300, initial_days=30, page_limit=1000, after_sync=None, realm_ids=None,
+                 clock=None):
+        self.get_connection = get_connection
+        self.client = client
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.after_sync = after_sync
+        self.entities = tuple(entities)
+        self.interval_seconds = interval_seconds
+        self.initial_days = initial_days
+        self.page_limit = page_limit
+        self.realm_ids = set(realm_ids) if realm_ids is not None else None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._tables_ready = False
+
+    def start(self):
+        """Run the sync every interval_seconds in a background thread."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='qbo-sync', daemon=True)
+                self._thread.start()
+
+    def run_once(self):
+        """
+        Sync every connected company. Returns {realm_id: records written},
+        or None if another process holds the sync lock.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (SYNC_LOCK_ID,))
+            if not cursor.fetchone()[0]:
+                conn.rollback()
+                return None
+            try:
+                self._ensure_tables(cursor)
+                cursor.execute(TOKENS_SQL)
+                tokens = [token for token in cursor.fetchall()
+                          if self.realm_ids is None or token[0] in self.realm_ids]
+                conn.commit()
+                results = {}
+                for token in tokens:
+                    realm_id = token[0]
+                    try:
+                        results[realm_id] = self._sync_realm(conn, cursor, token)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Error syncing QBO company {realm_id}: {e}")
+                        self._record_error(conn, cursor, realm_id, str(e))
+                        results[realm_id] = None
+                if self.after_sync is not None:
+                    try:
+                        self.after_sync(conn)
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Error after QBO sync: {e}")
+                return results
+            finally:
+                # Leave a transaction aborted by a failed statement first, or
+                # the unlock fails and hides the error; the session-level lock
+                # is not released by the rollback
+                conn.rollback()
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (SYNC_LOCK_ID,))
+                conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def status(self):
+        """Sync state rows as JSON-ready dicts."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            self._ensure_tables(cursor)
+            cursor.execute("""
+                SELECT realm_id, entity, changed_since, synced_at, records_synced, error_message
+                FROM staging.qbo_sync_state ORDER BY realm_id, entity
+            """)
+            rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return [{
+            'realm_id': realm_id,
+            'entity': entity,
+            'changed_since': changed_since.isoformat(),
+            'synced_at': synced_at.isoformat() if synced_at else None,
+            'records_synced': records_synced,
+            'error': error_message
+        } for realm_id, entity, changed_since, synced_at, records_synced, error_message in rows]
+
+    def _loop(self):
+        while True:
+            try:
+                started = time.perf_counter()
+                results = self.run_once()
+                if results is not None:
+                    print(f"[DEBUG] QBO sync wrote {results} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                print(f"Error in QBO sync: {e}")
+            time.sleep(self.interval_seconds)
+
+    def _sync_realm(self, conn, cursor, token):
+        realm_id, user_id, access_token, refresh_token, expires_at = token
+        if expires_at is not None and expires_at <= datetime.now() + timedelta(minutes=1):
+            access_token = self._refresh_token(conn, cursor, user_id, realm_id, refresh_token)
+            refresh_token = None
+
+        def call(method, *args):
+            # QBO API call for this realm; an expired token is refreshed once
+            nonlocal access_token, refresh_token
+            try:
+                return method(access_token, realm_id, *args)
+            except QBOError as e:
+                if e.status != 401 or refresh_token is None:
+                    raise
+                access_token = self._refresh_token(conn, cursor, user_id, realm_id, refresh_token)
+                refresh_token = None
+                return method(access_token, realm_id, *args)
+
+        cursor.execute("""
+            SELECT entity, changed_since FROM staging.qbo_sync_state WHERE realm_id = %s
+        """, (realm_id,))
+        cursors = dict(cursor.fetchall())
+        now = self.clock()
+        start = now - timedelta(days=self.initial_days)
+        pending = {entity: cursors.get(entity, start) for entity in self.entities}
+        written = 0
+
+        # Cursors CDC no longer answers for are caught up by query; CDC takes
+        # over from the next run
+        for entity in [entity for entity, since in pending.items() if since < now - CDC_WINDOW]:
+            written += self._catch_up(conn, cursor, call, realm_id, entity, pending.pop(entity))
+        while pending:
+            # One CDC call per distinct cursor; after the first run every
+            # entity normally shares the previous response's server time
+            changed_since = min(pending.values())
+            entities = [entity for entity, since in pending.items() if since == changed_since]
+            changes, server_time = call(self.client.cdc, entities, changed_since)
+
+            advanced = {}
+            for entity in entities:
+                objects = changes.get(entity, [])
+                count = self._write(cursor, entity, objects)
+                if len(objects) >= self.page_limit:
+                    # Page was full: continue from the newest change
+                    since, read = self._next_page(call, cursor, entity, changed_since, _newest(objects))
+                    count += read
+                else:
+                    since = server_time
+                written += count
+                advanced[entity] = (since, count)
+            self._save_cursors(cursor, realm_id, advanced)
+            conn.commit()
+
+            for entity in entities:
+                if advanced[entity][0] != server_time:
+                    pending[entity] = advanced[entity][0]
+                else:
+                    del pending[entity]
+        return written
+
+    def _catch_up(self, conn, cursor, call, realm_id, entity, since):
+        """
+        Read the changes to entity since a cursor older than the CDC window
+        with queries, one page per transaction, up to the server time of the
+        last page. Returns the number of objects read.
+        """
+        written = 0
+        while True:
+            objects, server_time = call(self.client.query, entity,
+                                        changes_query(entity, since, max_results=self.page_limit))
+            count = self._write(cursor, entity, objects)
+            if len(objects) >= self.page_limit:
+                next_since, read = self._next_page(call, cursor, entity, since, _newest(objects))
+                count += read
+            else:
+                next_since = server_time
+            self._save_cursors(cursor, realm_id, {entity: (next_since, count)})
+            conn.commit()
+            written += count
+            if next_since == server_time:
+                return written
+            since = next_since
+
+    def _next_page(self, call, cursor, entity, since, newest):
+        """
+        Cursor after a full page of changes since since whose newest object
+        changed at newest, and the objects read to get there. A page that
+        never got past the cursor's second is finished with a query of that
+        second, paged by STARTPOSITION, and the cursor moves to the next one.
+        """
+        second = since.replace(microsecond=0)
+        if newest >= second + ONE_SECOND:
+            return newest, 0
+        read = 0
+        start_position = 1
+        while True:
+            objects, _ = call(self.client.query, entity, changes_query(
+                entity, second, second + ONE_SECOND, order_by='Id', start_position=start_position,
+                max_results=self.page_limit))
+            read += self._write(cursor, entity, objects)
+            if len(objects) < self.page_limit:
+                return second + ONE_SECOND, read
+            start_position += len(objects)
+
+    def _save_cursors(self, cursor, realm_id, advanced):
+        """Store {entity: (cursor, objects read)}; the caller commits."""
+        execute_values(cursor, """
+            INSERT INTO staging.qbo_sync_state (realm_id, entity, changed_since, synced_at, records_synced)
+            VALUES %s
+            ON CONFLICT (realm_id, entity) DO UPDATE SET
+                changed_since = EXCLUDED.changed_since, synced_at = EXCLUDED.synced_at,
+                records_synced = qbo_sync_state.records_synced + EXCLUDED.records_synced,
+                error_message = NULL
+        """, [(realm_id, entity, since, datetime.now(), count) for entity, (since, count) in advanced.items()])
+
+    def _write(self, cursor, entity, objects):
+        """Upsert live objects and flag deleted ones; returns the number of objects."""
+        latest = {}
+        for obj in objects:
+            qbo_id = f"{entity}:{obj['Id']}"
+            updated = parse_qbo_time(obj['MetaData']['LastUpdatedTime'])
+            if qbo_id not in latest or updated >= latest[qbo_id][0]:
+                latest[qbo_id] = (updated, obj)
+        if entity == CUSTOMER_ENTITY:
+            return self._write_customers(cursor, latest.values())
+        live = [transaction_row(entity, obj) for _, obj in latest.values() if obj.get('status') != 'Deleted']
+        deleted = [(qbo_id, Json(obj), updated) for qbo_id, (updated, obj) in latest.items()
+                   if obj.get('status') == 'Deleted']
+        if live:
+            execute_values(cursor, UPSERT_SQL, live, page_size=500)
+        if deleted:
+            execute_values(cursor, DELETE_SQL, deleted, template='(%s, %s::jsonb, %s::timestamptz)', page_size=500)
+        return len(latest)
+
+    def _write_customers(self, cursor, latest):
+        live = [(obj['Id'], obj.get('DisplayName'), (obj.get('AcctNum') or '').strip() or None, updated)
+                for updated, obj in latest if obj.get('status') != 'Deleted']
+        deleted = [(obj['Id'], updated) for updated, obj in latest if obj.get('status') == 'Deleted']
+        if live:
+            execute_values(cursor, CUSTOMER_UPSERT_SQL, live, page_size=500)
+        if deleted:
+            execute_values(cursor, CUSTOMER_DELETE_SQL, deleted, template='(%s, %s::timestamptz)', page_size=500)
+        return len(live) + len(deleted)
+
+    def _refresh_token(self, conn, cursor, user_id, realm_id, refresh_token):
+        tokens = self.client.refresh_access_token(refresh_token)
+        cursor.execute("""
+            UPDATE staging.qbo_tokens
+            SET access_token = %s, refresh_token = %s, expires_at = %s, updated_at = NOW()
+            WHERE user_id = %s AND realm_id = %s
+        """, (tokens['access_token'], tokens['refresh_token'], tokens['expires_at'], user_id, realm_id))
+        conn.commit()
+        return tokens['access_token']
+
+    def _record_error(self, conn, cursor, realm_id, message):
+        try:
+            cursor.execute("""
+                UPDATE staging.qbo_sync_state SET error_message = %s WHERE realm_id = %s
+            """, (message, realm_id))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error recording QBO sync failure for {realm_id}: {e}")
+
+    def _ensure_tables(self, cursor):
+        if self._tables_ready:
+            return
+        try:
+            cursor.execute("SAVEPOINT qbo_sync_tables")
+            cursor.execute(SYNC_STATE_TABLE_SQL)
+            cursor.execute(CUSTOMERS_TABLE_SQL)
+            cursor.execute(RAW_COLUMNS_SQL)
+            cursor.execute("RELEASE SAVEPOINT qbo_sync_tables")
+        except psycopg2.errors.UniqueViolation:
+            cursor.execute("ROLLBACK TO SAVEPOINT qbo_sync_tables")  # created concurrently by another worker
+        self._tables_ready = True
@@ -0,0 +1,280 @@
+"""
+Raw-to-staging transform for synced QBO transactions.
+
+Copies raw.qbo_transactions into staging.transactions_cleaned with the
+territory, sales rep and region of the account mapping in force on the
+transaction date, then rebuilds the monthly analytics.territory_performance
+rows for the months it touched.
+
+Each batch is one set-based statement: it takes the next batch_size raw rows
+after the high-water mark (ordered by updated_at, id), upserts the live ones
+joined to staging.account_territory_mapping and removes the ones deleted in
+QBO. Only raw rows changed since the last run are read. The mark is moved back
+overlap_seconds at the start of a run, because rows committed late by a
+concurrent sync can carry an earlier updated_at; re-processing a row is
+harmless.
+
+Transactions are attributed through their customer: CustomerRef.value is
+the QBO customer id, staging.qbo_customers (synced by app/services/qbo_sync.py)
+gives its AcctNum, and that billing account number is the account_number of
+the mapping, the same key the drilldown matches to
+sample_billing.client_account_number. Transactions of a customer without an
+AcctNum, or of an account without a mapping on the date, have no territory.
+
+Attributions are re-derived when they can change underneath already
+transformed rows: for customers whose row changed since the last run, and by
+retag_transactions() for the accounts of a mapping refresh.
+"""
+
+from datetime import datetime, timedelta
+
+from app.services.qbo_sync import CUSTOMERS_TABLE_SQL
+
+
+TRANSFORM_JOB = 'qbo_transform'
+# Mark over staging.qbo_customers.changed_at
+CUSTOMERS_JOB = 'qbo_transform_customers'
+
+TRANSFORM_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.transform_state (
+        job_name VARCHAR(100) PRIMARY KEY,
+        high_water_at TIMESTAMP NOT NULL,
+        high_water_id INTEGER NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    ALTER TABLE staging.transactions_cleaned
+        ADD COLUMN IF NOT EXISTS txn_type VARCHAR(100),
+        ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_cleaned_qbo_id ON staging.transactions_cleaned(qbo_id);
+"""
+
+# Rows are only rewritten when a value changed
+TRANSFORM_BATCH_SQL = """
+    WITH batch AS (
+        SELECT r.id, r.qbo_id, r.amount, r.txn_date, r.txn_type, r.is_deleted, r.updated_at,
+               r.raw_json->'CustomerRef'->>'value' AS customer_id,
+               COALESCE(r.raw_json->'AccountRef'->>'value', r.raw_json->'DepositToAccountRef'->>'value',
+                        r.raw_json->'ARAccountRef'->>'value', r.raw_json->'APAccountRef'->>'value') AS account_id,
+               r.raw_json->'Line'->0->'SalesItemLineDetail'->'ItemRef'->>'name' AS product_category
+        FROM raw.qbo_transactions r
+        WHERE (r.updated_at, r.id) > (%(after_at)s, %(after_id)s)
+        ORDER BY r.updated_at, r.id
+        LIMIT %(batch_size)s
+    ),
+    previous AS (
+        SELECT c.txn_date FROM staging.transactions_cleaned c JOIN batch b ON b.qbo_id = c.qbo_id
+    ),
+    removed AS (
+        DELETE FROM staging.transactions_cleaned c
+        USING batch b
+        WHERE b.is_deleted AND c.qbo_id = b.qbo_id
+    ),
+    upserted AS (
+        INSERT INTO staging.transactions_cleaned AS c (
+            qbo_id, customer_id, account_id, amount, txn_date, region, territory, sales_rep,
+            product_category, txn_type
+        )
+        SELECT b.qbo_id, b.customer_id, b.account_id, b.amount, b.txn_date, m.region, m.territory_name,
+               m.sales_rep_name, b.product_category, b.txn_type
+        FROM batch b
+        LEFT JOIN staging.qbo_customers q ON q.customer_id = b.customer_id
+        LEFT JOIN staging.account_territory_mapping m
+               ON m.account_number = q.acct_num
+              AND daterange(m.effective_date, m.end_date, '[]') @> b.txn_date
+        WHERE NOT b.is_deleted
+        ON CONFLICT (qbo_id) DO UPDATE SET
+            customer_id = EXCLUDED.customer_id, account_id = EXCLUDED.account_id, amount = EXCLUDED.amount,
+            txn_date = EXCLUDED.txn_date, region = EXCLUDED.region, territory = EXCLUDED.territory,
+            sales_rep = EXCLUDED.sales_rep, product_category = EXCLUDED.product_category,
+            txn_type = EXCLUDED.txn_type, updated_at = NOW()
+        WHERE (c.customer_id, c.account_id, c.amount, c.txn_date, c.region, c.territory, c.sales_rep,
+               c.product_category, c.txn_type)
+              IS DISTINCT FROM
+              (EXCLUDED.customer_id, EXCLUDED.account_id, EXCLUDED.amount, EXCLUDED.txn_date, EXCLUDED.region,
+               EXCLUDED.territory, EXCLUDED.sales_rep, EXCLUDED.product_category, EXCLUDED.txn_type)
+    ),
+    last_row AS (
+        SELECT updated_at, id FROM batch ORDER BY updated_at DESC, id DESC LIMIT 1
+    )
+    SELECT (SELECT COUNT(*) FROM batch),
+           (SELECT updated_at FROM last_row),
+           (SELECT id FROM last_row),
+           ARRAY(SELECT DISTINCT DATE_TRUNC('month', txn_date)::date FROM (
+               SELECT txn_date FROM batch UNION ALL SELECT txn_date FROM previous
+           ) dates WHERE txn_date IS NOT NULL)
+"""
+
+# Same attribution as TRANSFORM_BATCH_SQL for transformed rows of the given
+# customers and/or accounts (NULL for all); returns the months of changed rows
+RETAG_SQL = """
+    WITH derived AS (
+        SELECT c.qbo_id, m.region, m.territory_name, m.sales_rep_name
+        FROM staging.transactions_cleaned c
+        LEFT JOIN staging.qbo_customers q ON q.customer_id = c.customer_id
+        LEFT JOIN staging.account_territory_mapping m
+               ON m.account_number = q.acct_num
+              AND daterange(m.effective_date, m.end_date, '[]') @> c.txn_date
+        WHERE (%(customer_ids)s::text[] IS NULL OR c.customer_id = ANY(%(customer_ids)s::text[]))
+          AND (%(account_numbers)s::text[] IS NULL OR q.acct_num = ANY(%(account_numbers)s::text[]))
+    ),
+    retagged AS (
+        UPDATE staging.transactions_cleaned c
+        SET region = d.region, territory = d.territory_name, sales_rep = d.sales_rep_name, updated_at = NOW()
+        FROM derived d
+        WHERE c.qbo_id = d.qbo_id
+          AND (c.region, c.territory, c.sales_rep) IS DISTINCT FROM (d.region, d.territory_name, d.sales_rep_name)
+        RETURNING c.txn_date
+    )
+    SELECT ARRAY(SELECT DISTINCT DATE_TRUNC('month', txn_date)::date FROM retagged WHERE txn_date IS NOT NULL)
+"""
+
+# Monthly territory sales: invoices and sales receipts less credit memos and refunds
+TERRITORY_PERFORMANCE_SQL = """
+    DELETE FROM analytics.territory_performance
+    WHERE period_type = 'monthly' AND report_date = ANY(%(months)s);
+
+    INSERT INTO analytics.territory_performance (
+        territory_name, total_sales, num_accounts, avg_revenue_per_account, report_date, period_type
+    )
+    SELECT territory, SUM(sales), COUNT(DISTINCT customer_id),
+           ROUND(SUM(sales) / NULLIF(COUNT(DISTINCT customer_id), 0), 2), month, 'monthly'
+    FROM (
+        SELECT territory, customer_id, DATE_TRUNC('month', txn_date)::date AS month,
+               CASE WHEN txn_type IN ('Invoice', 'SalesReceipt') THEN amount
+                    WHEN txn_type IN ('CreditMemo', 'RefundReceipt') THEN -amount
+               END AS sales
+        FROM staging.transactions_cleaned
+        WHERE territory IS NOT NULL
+          AND DATE_TRUNC('month', txn_date)::date = ANY(%(months)s)
+    ) monthly
+    WHERE sales IS NOT NULL
+    GROUP BY territory, month
+"""
+
+
+def ensure_transform_tables(cursor):
+    """Create the transform's tables and columns (idempotent)."""
+    cursor.execute(CUSTOMERS_TABLE_SQL)
+    cursor.execute(TRANSFORM_TABLES_SQL)
+
+
+def retag_transactions(cursor, account_numbers=None, customer_ids=None):
+    """
+    Re-derive the territory, sales rep and region of transformed
+    transactions of the given accounts and/or customers (all if both are
+    None) and rebuild the territory performance months that changed. The
+    caller commits. Returns the months rebuilt.
+    """
+    # No DDL here, so a mapping import does not wait on dashboard reads
+    cursor.execute("SELECT to_regclass('staging.transform_state') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return []  # nothing transformed yet
+    cursor.execute(RETAG_SQL, {
+        'account_numbers': None if account_numbers is None else list(account_numbers),
+        'customer_ids': None if customer_ids is None else list(customer_ids)
+    })
+    months = cursor.fetchone()[0]
+    if months:
+        cursor.execute(TERRITORY_PERFORMANCE_SQL, {'months': months})
+    return months
+
+
+def _retag_changed_customers(cursor, overlap_seconds, full):
+    """retag_transactions() for customers changed since the last run; returns the months rebuilt."""
+    cursor.execute("SELECT high_water_at FROM staging.transform_state WHERE job_name = %s", (CUSTOMERS_JOB,))
+    state = cursor.fetchone()
+    after_at = datetime.min if state is None or full else state[0] - timedelta(seconds=overlap_seconds)
+    cursor.execute("""
+        SELECT COALESCE(ARRAY_AGG(customer_id), '{}'), MAX(changed_at)
+        FROM staging.qbo_customers WHERE changed_at > %s
+    """, (after_at,))
+    customer_ids, last_at = cursor.fetchone()
+    if not customer_ids:
+        return []
+    months = retag_transactions(cursor, customer_ids=customer_ids)
+    cursor.execute("""
+        INSERT INTO staging.transform_state (job_name, high_water_at, high_water_id)
+        VALUES (%s, %s, 0)
+        ON CONFLICT (job_name) DO UPDATE SET high_water_at = EXCLUDED.high_water_at, updated_at = NOW()
+        WHERE EXCLUDED.high_water_at > transform_state.high_water_at
+    """, (CUSTOMERS_JOB, last_at))
+    return months
+
+
+def transform_qbo_transactions(conn, batch_size=5000, overlap_seconds=300, full=False):
+    """
+    Transform raw QBO transactions changed since the last run (all of them
+    with full=True), then re-attribute the transactions of customers changed
+    since the last run. Commits after each batch; returns
+    {'processed': raw rows read, 'batches': n, 'months': months rebuilt}.
+    """
+    cursor = conn.cursor()
+    ensure_transform_tables(cursor)
+    cursor.execute("""
+        INSERT INTO staging.etl_job_log (job_name, status, start_time)
+        VALUES (%s, 'running', NOW()) RETURNING id
+    """, (TRANSFORM_JOB,))
+    log_id = cursor.fetchone()[0]
+    conn.commit()
+
+    processed = batches = 0
+    months = set()
+    try:
+        cursor.execute("""
+            SELECT high_water_at, high_water_id FROM staging.transform_state WHERE job_name = %s
+        """, (TRANSFORM_JOB,))
+        state = cursor.fetchone()
+        if state is None or full:
+            after_at, after_id = datetime.min, 0
+        elif overlap_seconds > 0:
+            after_at, after_id = state[0] - timedelta(seconds=overlap_seconds), 0
+        else:
+            after_at, after_id = state
+
+        while True:
+            cursor.execute(TRANSFORM_BATCH_SQL, {'after_at': after_at, 'after_id': after_id, 'batch_size': batch_size})
+            count, last_at, last_id, batch_months = cursor.fetchone()
+            if count == 0:
+                break
+            if batch_months:
+                cursor.execute(TERRITORY_PERFORMANCE_SQL, {'months': batch_months})
+            # The mark never moves back, even when a run starts inside the overlap
+            cursor.execute("""
+                INSERT INTO staging.transform_state (job_name, high_water_at, high_water_id)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (job_name) DO UPDATE SET
+                    high_water_at = EXCLUDED.high_water_at, high_water_id = EXCLUDED.high_water_id,
+                    updated_at = NOW()
+                WHERE (EXCLUDED.high_water_at, EXCLUDED.high_water_id)
+                      > (transform_state.high_water_at, transform_state.high_water_id)
+            """, (TRANSFORM_JOB, last_at, last_id))
+            conn.commit()
+            processed += count
+            batches += 1
+            months.update(batch_months)
+            after_at, after_id = last_at, last_id
+            if count < batch_size:
+                break
+
+        # Customers whose account number changed move their earlier transactions
+        months.update(_retag_changed_customers(cursor, overlap_seconds, full))
+        conn.commit()
+
+        cursor.execute("""
+            UPDATE staging.etl_job_log
+            SET status = 'success', end_time = NOW(), records_processed = %s
+            WHERE id = %s
+        """, (processed, log_id))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        cursor.execute("""
+            UPDATE staging.etl_job_log
+            SET status = 'failed', end_time = NOW(), records_processed = %s, error_message = %s
+            WHERE id = %s
+        """, (processed, str(e), log_id))
+        conn.commit()
+        raise
+    finally:
+        cursor.close()
+    return {'processed': processed, 'batches': batches, 'months': sorted(month.isoformat() for month in months)}
@@ -0,0 +1,298 @@
+"""
+Prefix-sum index of daily per-practice billing totals.
+
+For every (practice, territory) the index holds running totals by placement
+day of placed amount, charges, payments (all in cents) and sample count,
+built from one grouped query over sample_billing (whose practice and
+territory are resolved from account_data at load time).
+The total over any start/end date range is then the difference of two
+entries, so a range aggregate costs O(1) per practice instead of a scan.
+
+Range totals match the SQL aggregates they replace exactly: sums are exact
+integer cents and the sample count equals COUNT(DISTINCT client_account_number)
+whenever no client account appears twice under the same practice (checked
+when the index is built; see distinct_samples).
+
+The index is kept in memory, saved to disk with numpy so new worker
+processes start from it, and rebuilt in the background when the underlying
+tables change. Loads bump the shared range-index generation
+(app/utils/generations.py), which is checked on every get(): an index built
+under an older generation is not served (callers fall back to SQL) while
+its replacement is built. Other writes are detected from PostgreSQL's
+per-table write counters, checked at most every check_seconds. Builds in a
+process run one at a time, so a slow build can never replace a newer index.
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+
+INDEX_SQL = '''
+    SELECT sb.practice_name, sb.territory, DATE(sb.placement_date) AS day,
+           (COALESCE(SUM(sb.initial_balance),0) * 100)::bigint AS placed_cents,
+           (COALESCE(SUM(sb.total_charges),0) * 100)::bigint AS charges_cents,
+           (COALESCE(SUM(sb.total_payments),0) * 100)::bigint AS payments_cents,
+           COUNT(sb.client_account_number) AS samples
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL AND sb.placement_date IS NOT NULL
+    GROUP BY sb.practice_name, sb.territory, DATE(sb.placement_date)
+'''
+
+# Whether some client account is placed more than once under one practice,
+# in which case range sample counts would overcount distinct accounts
+DUPLICATE_SAMPLES_SQL = '''
+    SELECT EXISTS (
+        SELECT 1
+        FROM sample_billing sb
+        WHERE sb.account_id IS NOT NULL AND sb.placement_date IS NOT NULL
+        GROUP BY sb.practice_name, sb.territory, sb.client_account_number
+        HAVING COUNT(*) > 1
+    )
+'''
+
+# Write counters of the source tables; a change means the index is stale
+FINGERPRINT_SQL = '''
+    SELECT relname, n_tup_ins + n_tup_upd + n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relid IN ('sample_billing'::regclass, 'account_data'::regclass)
+    ORDER BY relname
+'''
+
+METRICS = ('placed_cents', 'charges_cents', 'payments_cents', 'samples')
+PLACED, CHARGES, PAYMENTS, SAMPLES = range(len(METRICS))
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+class PracticeRangeIndex:
+    """
+    Cumulative daily totals per (practice, territory).
+
+    cumulative has shape (len(METRICS), len(keys), days + 1); entry
+    [m, k, d] is the total of metric m for key k over the days before
+    origin + d, so the range [a, b] is [m, k, b + 1] - [m, k, a].
+    """
+
+    def __init__(self, keys, origin, cumulative, distinct_samples, fingerprint, generation=0):
+        self.keys = keys
+        self.origin = origin
+        self.cumulative = cumulative
+        self.distinct_samples = distinct_samples
+        self.fingerprint = fingerprint
+        self.generation = generation
+        self._by_practice = {}
+        self._by_territory = {}
+        for position, (practice, territory) in enumerate(keys):
+            self._by_practice.setdefault(practice, []).append(position)
+            self._by_territory.setdefault(territory, []).append(position)
+        self._by_practice = {name: np.array(rows) for name, rows in self._by_practice.items()}
+
+    @classmethod
+    def build(cls, cursor, generation=0):
+        """Build the index from the database; generation is the one read before building."""
+        cursor.execute(FINGERPRINT_SQL)
+        fingerprint = [list(row) for row in cursor.fetchall()]
+        cursor.execute(DUPLICATE_SAMPLES_SQL)
+        distinct_samples = not cursor.fetchone()[0]
+        cursor.execute(INDEX_SQL)
+        rows = cursor.fetchall()
+
+        keys = sorted({(row[0], row[1]) for row in rows}, key=lambda key: (str(key[0]), str(key[1])))
+        if not rows:
+            return cls(keys, date.today(), np.zeros((len(METRICS), 0, 1), dtype=np.int64), distinct_samples,
+                       fingerprint, generation)
+        positions = {key: position for position, key in enumerate(keys)}
+        origin = min(row[2] for row in rows)
+        days = (max(row[2] for row in rows) - origin).days + 1
+
+        daily = np.zeros((len(METRICS), len(keys), days + 1), dtype=np.int64)
+        for practice, territory, day, *values in rows:
+            daily[:, positions[(practice, territory)], (day - origin).days + 1] = values
+        return cls(keys, origin, np.cumsum(daily, axis=2), distinct_samples, fingerprint, generation)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save()."""
+        with np.load(path, allow_pickle=False) as data:
+            keys = [(practice or None, territory or None)
+                    for practice, territory in zip(data['practices'].tolist(), data['territories'].tolist())]
+            return cls(
+                keys,
+                date.fromisoformat(str(data['origin'])),
+                data['cumulative'],
+                bool(data['distinct_samples']),
+                [[name, int(count)] for name, count in zip(data['fingerprint_tables'].tolist(),
+                                                           data['fingerprint_counts'].tolist())],
+                int(data['generation']) if 'generation' in data.files else 0
+            )
+
+    def save(self, path):
+        """Write the index to path atomically."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary,
+            practices=np.array([practice or '' for practice, _ in self.keys], dtype=str),
+            territories=np.array([territory or '' for _, territory in self.keys], dtype=str),
+            origin=np.array(self.origin.isoformat()),
+            cumulative=self.cumulative,
+            distinct_samples=np.array(self.distinct_samples),
+            fingerprint_tables=np.array([name for name, _ in self.fingerprint], dtype=str),
+            fingerprint_counts=np.array([count for _, count in self.fingerprint], dtype=np.int64),
+            generation=np.array(self.generation, dtype=np.int64)
+        )
+        os.replace(temporary, path)
+
+    def _bounds(self, start, end):
+        """Clipped cumulative positions (a, b) for the inclusive day range [start, end]."""
+        days = self.cumulative.shape[2] - 1
+        a = min(max((_day(start) - self.origin).days, 0), days)
+        b = min(max((_day(end) - self.origin).days + 1, 0), days)
+        return a, max(a, b)
+
+    def range_totals(self, start, end):
+        """Array (len(METRICS), len(keys)) of totals over [start, end]."""
+        a, b = self._bounds(start, end)
+        return self.cumulative[:, :, b] - self.cumulative[:, :, a]
+
+    def practice_placements(self, start, end, territory=None):
+        """
+        (practice, territory, placed_cents, sample_count) for keys with samples
+        in [start, end], like the practice_placements queries.
+        """
+        totals = self.range_totals(start, end)
+        positions = self._by_territory.get(territory, []) if territory else range(len(self.keys))
+        return [
+            (self.keys[k][0], self.keys[k][1], int(totals[PLACED, k]), int(totals[SAMPLES, k]))
+            for k in positions if totals[SAMPLES, k] > 0
+        ]
+
+    def territory_samples(self, start, end):
+        """{territory: samples placed in [start, end]}, like the territory_samples query."""
+        totals = self.range_totals(start, end)
+        samples = {}
+        for territory, positions in self._by_territory.items():
+            count = int(totals[SAMPLES, positions].sum())
+            if count > 0:
+                samples[territory] = count
+        return samples
+
+    def practice_collections(self, practice_name, start, end):
+        """(charges, payments) in dollars for a practice name over [start, end]."""
+        positions = self._by_practice.get(practice_name)
+        if positions is None:
+            return 0.0, 0.0
+        a, b = self._bounds(start, end)
+        charges = int(self.cumulative[CHARGES, positions, b].sum() - self.cumulative[CHARGES, positions, a].sum())
+        payments = int(self.cumulative[PAYMENTS, positions, b].sum() - self.cumulative[PAYMENTS, positions, a].sum())
+        return charges / 100, payments / 100
+
+
+class RangeIndexManager:
+    """
+    Owns the current PracticeRangeIndex for a worker process.
+
+    get() never blocks on a build: it returns the current index (or None
+    while the first one is being built, or while the current one is older
+    than the shared generation) and starts a background check or rebuild
+    when one is due. read_generation, if given, returns the current shared
+    generation.
+    """
+
+    def __init__(self, get_connection, path, check_seconds=60, enabled=True, read_generation=None):
+        self.get_connection = get_connection
+        self.path = path
+        self.check_seconds = check_seconds
+        self.enabled = enabled
+        self.read_generation = read_generation
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._index = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._working = False
+
+    def get(self):
+        """The current index, or None if there is no current one yet."""
+        if not self.enabled:
+            return None
+        generation = self._generation()
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._index = self._load()
+            stale = self._index is not None and generation is not None and self._index.generation != generation
+            due = time.monotonic() - self._checked_at >= self.check_seconds
+            if (due or stale or self._index is None) and not self._working:
+                self._working = True
+                threading.Thread(target=self._background_refresh, name='range-index', daemon=True).start()
+            return None if stale else self._index
+
+    def refresh(self):
+        """Rebuild the index now, in the calling thread (after any build in progress); returns it."""
+        self._refresh(force=True)
+        return self._index
+
+    def _generation(self):
+        if self.read_generation is None:
+            return None
+        try:
+            return self.read_generation()
+        except Exception as e:
+            print(f"Error reading range index generation: {e}")
+            return None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            return PracticeRangeIndex.load(self.path)
+        except Exception as e:
+            print(f"Error loading range index from {self.path}: {e}")
+            return None
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            with self._lock:
+                self._working = False
+
+    def _refresh(self, force=False):
+        # One build at a time: each starts after the previous one is installed
+        with self._build_lock:
+            try:
+                generation = self._generation()
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(FINGERPRINT_SQL)
+                    fingerprint = [list(row) for row in cursor.fetchall()]
+                    current = self._index
+                    if (force or current is None or current.fingerprint != fingerprint
+                            or (generation is not None and current.generation != generation)):
+                        started = time.perf_counter()
+                        index = PracticeRangeIndex.build(cursor, generation or 0)
+                        print(f"[DEBUG] Built range index: {len(index.keys)} practices, "
+                              f"{index.cumulative.shape[2] - 1} days in {time.perf_counter() - started:.2f}s")
+                        try:
+                            index.save(self.path)
+                        except OSError as e:
+                            print(f"Error saving range index to {self.path}: {e}")
+                        with self._lock:
+                            self._index = index
+                finally:
+                    cursor.close()
+                    conn.rollback()
+                    conn.close()
+            except Exception as e:
+                print(f"Error refreshing range index: {e}")
+            finally:
+                with self._lock:
+                    self._checked_at = time.monotonic()
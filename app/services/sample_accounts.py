@@ -0,0 +1,164 @@
+"""
+Account attributes of sample_billing rows, resolved at load time.
+
+The dashboard aggregates sample_billing by practice and territory. Instead of
+joining every billing row to account_data on client_account_number in each
+query, the loaders copy the account's id, practice_name, territory and
+sales_rep onto the billing rows once (resolve_sample_accounts): after
+sample_billing is imported and after account_data is reloaded. Aggregations
+then group sample_billing alone.
+
+Rows whose client account is not in account_data (orphans) keep a NULL
+account_id and are left out of the aggregates, as the join left them out.
+scripts/check_sample_accounts.py compares the queries with the join form.
+
+The copied values are the account's current ones, as the join gave:
+re-assigning an account in account_data moves all of its samples at the
+next resolve. Only the drilldown is point-in-time; it attributes samples
+through the staging.account_territory_mapping version in force on the
+placement date and falls back to these columns.
+
+The columns are part of sample_billing in database/schemas/init.sql. On a
+database created before they existed, scripts/backup/resolve_sample_accounts.py
+adds them once (add_sample_account_columns) and fills them. Resolving itself
+runs no DDL: an ALTER TABLE would hold an ACCESS EXCLUSIVE lock on
+sample_billing, blocking every dashboard query, until the load commits.
+
+The payer-mix cube groups sample_billing by the resolved practice, so it is
+rebuilt in the same transaction.
+
+Resolving follows a load of either table, so it also bumps the account-table
+and range-index generations: workers drop the account tables and the range
+index they built before the load.
+"""
+
+from app.services.payer_mix import replace_payer_mix
+from app.utils.generations import ACCOUNT_TABLE, RANGE_INDEX, bump_generations
+
+RESOLVED_COLUMNS = ('account_id', 'practice_name', 'territory', 'sales_rep')
+
+MISSING_COLUMNS_SQL = """
+    SELECT column_name FROM unnest(%s::text[]) AS wanted(column_name)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM information_schema.columns c
+        WHERE c.table_schema = current_schema() AND c.table_name = 'sample_billing'
+          AND c.column_name = wanted.column_name
+    )
+"""
+
+# One-time migration, as scripts/backup/add_sample_account_columns.sql
+SAMPLE_ACCOUNT_COLUMNS_SQL = """
+    ALTER TABLE sample_billing
+        ADD COLUMN IF NOT EXISTS account_id INTEGER,
+        ADD COLUMN IF NOT EXISTS practice_name VARCHAR(255),
+        ADD COLUMN IF NOT EXISTS territory VARCHAR(255),
+        ADD COLUMN IF NOT EXISTS sales_rep VARCHAR(255)
+"""
+
+# Only rows that are new or whose account changed are written
+RESOLVE_SQL = """
+    UPDATE sample_billing sb
+    SET account_id = ad.id, practice_name = ad.practice_name, territory = ad.territory,
+        sales_rep = ad.sales_rep
+    FROM account_data ad
+    WHERE ad.account_number = sb.client_account_number
+      AND (sb.account_id, sb.practice_name, sb.territory, sb.sales_rep)
+          IS DISTINCT FROM (ad.id, ad.practice_name, ad.territory, ad.sales_rep)
+"""
+
+# Rows whose account is no longer in account_data
+UNRESOLVE_SQL = """
+    UPDATE sample_billing sb
+    SET account_id = NULL, practice_name = NULL, territory = NULL, sales_rep = NULL
+    WHERE sb.account_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM account_data ad WHERE ad.account_number = sb.client_account_number)
+"""
+
+ORPHANS_SQL = """
+    SELECT client_account_number, COUNT(*)
+    FROM sample_billing
+    WHERE account_id IS NULL
+    GROUP BY client_account_number
+    ORDER BY COUNT(*) DESC, client_account_number
+"""
+
+
+def missing_sample_account_columns(cursor):
+    """Resolved columns sample_billing does not have yet; a catalog read, no lock."""
+    cursor.execute(MISSING_COLUMNS_SQL, (list(RESOLVED_COLUMNS),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def add_sample_account_columns(conn):
+    """
+    Add the resolved columns to sample_billing if any are missing; the
+    one-time migration of scripts/backup/resolve_sample_accounts.py.
+
+    Returns the columns that were added.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('sample_billing') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return []
+        missing = missing_sample_account_columns(cursor)
+        if missing:
+            cursor.execute(SAMPLE_ACCOUNT_COLUMNS_SQL)
+        conn.commit()
+        return missing
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def resolve_sample_accounts(conn):
+    """
+    Copy account attributes onto sample_billing and rebuild the payer-mix
+    cube in one transaction.
+
+    Returns {'resolved': rows written, 'cleared': rows whose account went
+    away, 'orphans': [(client_account_number, samples), ...] most samples
+    first, 'payer_mix_rows': rows in the rebuilt cube}. Raises RuntimeError
+    when sample_billing lacks the resolved columns.
+    """
+    cursor = conn.cursor()
+    try:
+        # Accounts can be loaded before any sample_billing rows exist
+        cursor.execute("SELECT to_regclass('sample_billing') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return {'resolved': 0, 'cleared': 0, 'orphans': [], 'payer_mix_rows': 0}
+        missing = missing_sample_account_columns(cursor)
+        if missing:
+            raise RuntimeError(f"sample_billing is missing the {', '.join(missing)} columns; "
+                               "run scripts/backup/resolve_sample_accounts.py once to add them")
+        cursor.execute(RESOLVE_SQL)
+        resolved = cursor.rowcount
+        cursor.execute(UNRESOLVE_SQL)
+        cleared = cursor.rowcount
+        cursor.execute(ORPHANS_SQL)
+        orphans = cursor.fetchall()
+        payer_mix_rows = replace_payer_mix(cursor)
+        bump_generations(cursor, ACCOUNT_TABLE, RANGE_INDEX)
+        conn.commit()
+        return {'resolved': resolved, 'cleared': cleared, 'orphans': orphans, 'payer_mix_rows': payer_mix_rows}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def print_orphans(orphans, limit=10):
+    """Report orphan client account numbers the way the import scripts print summaries."""
+    if not orphans:
+        print("All sample_billing rows matched an account in account_data")
+        return
+    samples = sum(count for _, count in orphans)
+    print(f"{len(orphans)} client account numbers ({samples} samples) are not in account_data "
+          f"and are left out of the dashboard:")
+    for account_number, count in orphans[:limit]:
+        print(f"  {account_number}: {count} samples")
+    if len(orphans) > limit:
+        print(f"  ... and {len(orphans) - limit} more")
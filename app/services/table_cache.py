@@ -0,0 +1,160 @@
+"""
+Cache of computed account tables, patched in place on collector edits.
+
+Each entry keeps the per-practice inputs and per-territory partitions the
+table was built from. A collector cost edit only changes collector inputs,
+so the affected territories are recomputed from the cached inputs with the
+pure engine (no per-practice history queries) and the totals row is rebuilt
+from the partitions; everything else is reused. Each patch bumps the
+entry's version. Tables computed by another worker process (picked up
+through single-flight) come without their inputs; they are cached too, and
+dropped instead of patched on a collector edit.
+
+The cache is per worker process. Collector edits and imports bump the
+shared account-table generation (app/utils/generations.py); callers pass
+the current generation to check_generation() before reading, which drops
+every entry cached under an older one. The worker that made an edit patches
+its entries and keeps them (advance_generation()); the others recompute.
+"""
+
+import threading
+import time
+
+from app.services.account_table import compute_partition, merge_partitions, partition_totals
+
+
+class _CachedTable:
+    """A computed account table and the inputs it was built from."""
+
+    def __init__(self, payload, positions, partitions, territories, expires_at):
+        self.payload = payload
+        self.positions = positions      # {territory: row indexes in payload['accounts']}
+        self.partitions = partitions    # {territory: TablePartition}
+        self.territories = territories  # TerritoryInputs
+        self.expires_at = expires_at
+
+
+class AccountTableCache:
+    """Account table payloads by request key, with in-place collector patches."""
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = 0
+        self._generation = 0
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0
+
+    @property
+    def generation(self):
+        """The shared generation the cached entries are current for."""
+        return self._generation
+
+    def check_generation(self, generation):
+        """Drop every entry if the shared generation moved since it was last checked."""
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._generation = generation
+
+    def advance_generation(self, generation):
+        """
+        Record a bump to generation made by this worker after patching its
+        entries; they are kept unless another bump happened in between.
+        """
+        with self._lock:
+            if generation != self._generation + 1:
+                self._entries.clear()
+            self._generation = generation
+
+    def get(self, key):
+        """Cached payload for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry.payload
+
+    def put(self, key, payload, positions=None, partitions=None, territories=None, generation=None):
+        """
+        Cache a payload built from per-territory partitions; returns it with
+        its version set. Without partitions the entry cannot be patched. A
+        payload computed under another generation than the current one is
+        returned without being cached.
+        """
+        if not self.enabled:
+            return payload
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return payload
+            self._version += 1
+            payload = dict(payload, version=self._version)
+            self._entries[key] = _CachedTable(
+                payload, positions, partitions, territories, time.monotonic() + self.ttl_seconds
+            )
+        return payload
+
+    def patch_collectors(self, collectors, collector_cents):
+        """
+        Apply collector changes to every cached table.
+
+        collectors maps (practice name, territory) to (collector,
+        collector_cost_cents);
+        collector_cents is the fresh per-territory collector cost total.
+        Only territories whose inputs changed are recomputed; tables cached
+        without their inputs are dropped. Returns the number of tables patched.
+        """
+        patched = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.partitions is None:
+                    del self._entries[key]
+                elif self._patch_entry(entry, collectors, collector_cents):
+                    patched += 1
+        return patched
+
+    def invalidate(self):
+        """Drop every cached table."""
+        with self._lock:
+            self._entries.clear()
+
+    def _patch_entry(self, entry, collectors, collector_cents):
+        old_cents = entry.territories.collector_cents
+        territories = entry.territories._replace(collector_cents=collector_cents)
+        recompute = {territory for territory in set(collector_cents) | set(old_cents)
+                     if collector_cents.get(territory, 0) != old_cents.get(territory, 0)}
+        totals_changed = bool(recompute)
+
+        partitions = dict(entry.partitions)
+        for territory, part in entry.partitions.items():
+            practices = []
+            for p in part.practices:
+                if (p.practice, p.territory) in collectors:
+                    collector, cost_cents = collectors[(p.practice, p.territory)]
+                    if (collector, cost_cents) != (p.collector, p.collector_cost_cents):
+                        p = p._replace(collector=collector, collector_cost_cents=cost_cents)
+                        recompute.add(territory)
+                practices.append(p)
+            if territory in recompute:
+                partitions[territory] = compute_partition(practices, territories)
+                totals_changed = True
+        if not totals_changed:
+            return False
+
+        accounts = list(entry.payload['accounts'])
+        for territory in recompute & set(partitions):
+            for index, row in zip(entry.positions[territory], partitions[territory].accounts):
+                accounts[index] = row
+        totals = partition_totals(merge_partitions(partitions.values()), territories)
+
+        self._version += 1
+        entry.payload = dict(entry.payload, accounts=accounts, totals=totals, version=self._version)
+        entry.partitions = partitions
+        entry.territories = territories
+        return True
@@ -0,0 +1,134 @@
+"""
+Point-in-time (SCD type 2) account territory mapping.
+
+staging.account_territory_mapping keeps every version of an account's
+territory and sales rep. A version is in force from effective_date through
+end_date inclusive; end_date is NULL on the current version, and there is at
+most one current version per account. A mapping refresh never rewrites a
+version that was already in force before the refresh date: it closes it the
+day before and opens a new one, so reports over past periods keep the
+territory each sample was placed under.
+
+Queries match an account and a date against account_number and
+daterange(effective_date, end_date, '[]'), which one GiST index covers
+(btree_gist), so attributing samples is one set-based join instead of a
+lookup per sample.
+
+The table, the one-current-version unique index and the GiST index are
+created by database/schemas/init.sql; scripts/backup/add_mapping_table.sql
+converts a table created before versions were kept. That conversion takes an
+ACCESS EXCLUSIVE lock, so it is run once as a migration, never by a refresh.
+
+Refreshes are applied from a staging table in two statements regardless of
+the number of accounts: close the current versions that changed, then upsert
+the current versions (new accounts and closed ones get a new version,
+versions opened on the refresh date itself are corrected in place).
+"""
+
+import csv
+import io
+
+# Staged columns, in COPY order; account_number is the key
+MAPPING_COLUMNS = ('account_number', 'sales_rep_name', 'sales_rep_id', 'territory_name', 'territory_id', 'region')
+
+STAGE_TABLE_SQL = """
+    CREATE TEMP TABLE account_mapping_stage (
+        account_number VARCHAR(255) PRIMARY KEY,
+        sales_rep_name VARCHAR(255),
+        sales_rep_id VARCHAR(255),
+        territory_name VARCHAR(255),
+        territory_id VARCHAR(255),
+        region VARCHAR(255)
+    ) ON COMMIT DROP
+"""
+
+CLOSE_CHANGED_SQL = """
+    UPDATE staging.account_territory_mapping m
+    SET end_date = %(as_of)s::date - 1, is_active = FALSE, updated_at = NOW()
+    FROM account_mapping_stage s
+    WHERE m.account_number = s.account_number
+      AND m.end_date IS NULL
+      AND m.effective_date < %(as_of)s::date
+      AND (m.sales_rep_name, m.sales_rep_id, m.territory_name, m.territory_id, m.region)
+          IS DISTINCT FROM (s.sales_rep_name, s.sales_rep_id, s.territory_name, s.territory_id, s.region)
+"""
+
+# xmax is 0 on freshly inserted rows, which tells inserts from in-place updates
+UPSERT_CURRENT_SQL = """
+    WITH upserted AS (
+        INSERT INTO staging.account_territory_mapping AS m
+            (account_number, sales_rep_name, sales_rep_id, territory_name, territory_id, region,
+             is_active, effective_date)
+        SELECT account_number, sales_rep_name, sales_rep_id, territory_name, territory_id, region,
+               TRUE, %(as_of)s::date
+        FROM account_mapping_stage
+        ON CONFLICT (account_number) WHERE end_date IS NULL DO UPDATE SET
+            sales_rep_name = EXCLUDED.sales_rep_name, sales_rep_id = EXCLUDED.sales_rep_id,
+            territory_name = EXCLUDED.territory_name, territory_id = EXCLUDED.territory_id,
+            region = EXCLUDED.region, is_active = TRUE, updated_at = NOW()
+        WHERE (m.sales_rep_name, m.sales_rep_id, m.territory_name, m.territory_id, m.region)
+              IS DISTINCT FROM (EXCLUDED.sales_rep_name, EXCLUDED.sales_rep_id, EXCLUDED.territory_name,
+                                EXCLUDED.territory_id, EXCLUDED.region)
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FROM upserted
+"""
+
+# Only accounts without a current version
+INSERT_NEW_SQL = """
+    INSERT INTO staging.account_territory_mapping
+        (account_number, sales_rep_name, sales_rep_id, territory_name, territory_id, region,
+         is_active, effective_date)
+    SELECT account_number, sales_rep_name, sales_rep_id, territory_name, territory_id, region,
+           TRUE, %(as_of)s::date
+    FROM account_mapping_stage
+    ON CONFLICT (account_number) WHERE end_date IS NULL DO NOTHING
+"""
+
+
+def create_mapping_stage(cursor):
+    """Create the temp table a refresh is staged in; it is dropped at commit."""
+    cursor.execute(STAGE_TABLE_SQL)
+
+
+def copy_mapping_stage(cursor, rows):
+    """COPY rows (tuples in MAPPING_COLUMNS order, None for NULL) into the stage table."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        tuple('' if value is None else value for value in row) for row in rows
+    )
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY account_mapping_stage ({', '.join(MAPPING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def apply_mapping_stage(cursor, as_of, update_existing=True):
+    """
+    Apply the accounts staged in account_mapping_stage as the mapping in
+    force from as_of (a date). Accounts that are not staged keep their
+    current version, and so do staged ones unless update_existing. The
+    caller commits.
+
+    Returns {'inserted': new accounts, 'updated': accounts whose mapping
+    changed, 'unchanged': staged accounts left as they were}.
+    """
+    # Refreshes run one at a time; SHARE ROW EXCLUSIVE does not conflict with
+    # the ACCESS SHARE locks of dashboard reads
+    cursor.execute("LOCK TABLE staging.account_territory_mapping IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("SELECT COUNT(*) FROM account_mapping_stage")
+    staged = cursor.fetchone()[0]
+
+    if not update_existing:
+        cursor.execute(INSERT_NEW_SQL, {'as_of': as_of})
+        return {'inserted': cursor.rowcount, 'updated': 0, 'unchanged': staged - cursor.rowcount}
+
+    cursor.execute(CLOSE_CHANGED_SQL, {'as_of': as_of})
+    closed = cursor.rowcount
+    cursor.execute(UPSERT_CURRENT_SQL, {'as_of': as_of})
+    opened, upserted = cursor.fetchone()
+
+    inserted = opened - closed
+    updated = closed + upserted - opened
+    return {'inserted': inserted, 'updated': updated, 'unchanged': staged - inserted - updated}
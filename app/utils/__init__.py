@@ -0,0 +1,3 @@
+# Utilities Package 
+
+# This file makes the app/utils directory a Python package 
\ No newline at end of file
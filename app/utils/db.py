@@ -0,0 +1,100 @@
+"""
+Pooled database connections for work the dashboard runs concurrently.
+
+Request handlers still open their own connection with get_db_connection();
+the pool is for fan-out inside a request (per-territory partitions,
+independent queries), where opening a fresh connection per task would cost
+more than the task itself.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from app.utils.queries import queries
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections created by connect().
+
+    At most max_connections are open at once; callers beyond that wait for
+    one to be returned. A connection goes back to the pool rolled back, and
+    is dropped instead if it was closed or the caller raised. Pooled
+    connections are long-lived, so registered queries are prepared on them.
+    """
+
+    def __init__(self, connect, max_connections=8):
+        self.connect = connect
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block."""
+        self._slots.acquire()
+        conn = None
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None or conn.closed:
+                conn = self.connect()
+                queries.mark_long_lived(conn)
+            yield conn
+            conn.rollback()
+            with self._lock:
+                self._idle.append(conn)
+            conn = None
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            if not conn.closed:
+                conn.close()
+
+
+# Workers for fan-out within a request. Tasks run here must not wait on other
+# tasks in the same executor, and callers should not hold a pooled connection
+# while they wait for tasks that need one.
+DB_WORKERS = int(os.getenv('DB_WORKERS', '6'))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='db')
+
+
+def _fetch_all(pool, name, params):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            queries.execute(cursor, name, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def fetch_concurrently(pool, requests):
+    """
+    Run independent read queries at the same time, one pooled connection each.
+
+    requests maps a key to (registered query name, params); returns
+    {key: fetchall() rows}. The first query to fail raises once all of them
+    have finished.
+    """
+    futures = {key: db_executor.submit(_fetch_all, pool, name, params)
+               for key, (name, params) in requests.items()}
+    results = {}
+    error = None
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,60 @@
+"""
+Shared generation stamps for per-process caches.
+
+Each worker process caches derived data in memory (account tables, the
+placement range index, the P&L facts). Whatever changes the data underneath them, whether a
+dashboard edit in another worker or an import script, bumps a named
+generation in staging.cache_generations in the same transaction. Workers read
+the generation before serving from their cache and drop what they cached
+under an older one, so no worker serves data older than the last committed
+change.
+"""
+
+import psycopg2
+
+# Generation names
+ACCOUNT_TABLE = 'account_table'
+RANGE_INDEX = 'range_index'
+PL_FACTS = 'pl_facts'
+
+GENERATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.cache_generations (
+        name TEXT PRIMARY KEY,
+        generation BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+"""
+
+BUMP_SQL = """
+    INSERT INTO staging.cache_generations AS g (name, generation)
+    SELECT name, 1 FROM UNNEST(%s::text[]) AS name
+    ON CONFLICT (name) DO UPDATE SET generation = g.generation + 1, updated_at = NOW()
+    RETURNING name, generation
+"""
+
+
+def ensure_generations_table(cursor):
+    """Create staging.cache_generations (idempotent)."""
+    try:
+        cursor.execute("SAVEPOINT cache_generations_table")
+        cursor.execute(GENERATIONS_TABLE_SQL)
+        cursor.execute("RELEASE SAVEPOINT cache_generations_table")
+    except psycopg2.errors.UniqueViolation:
+        cursor.execute("ROLLBACK TO SAVEPOINT cache_generations_table")  # created concurrently by another worker
+
+
+def bump_generations(cursor, *names):
+    """Advance the named generations; the caller commits. Returns {name: new generation}."""
+    ensure_generations_table(cursor)
+    cursor.execute(BUMP_SQL, (list(names),))
+    return dict(cursor.fetchall())
+
+
+def read_generation(cursor, name):
+    """Current generation of name (0 if it was never bumped)."""
+    cursor.execute("SELECT to_regclass('staging.cache_generations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT generation FROM staging.cache_generations WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
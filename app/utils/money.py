@@ -0,0 +1,66 @@
+"""
+Fixed-point money helpers for the dashboard compute paths.
+
+Amounts are carried as integer cents (SQL returns them already scaled, e.g.
+``(SUM(amount) * 100)::bigint``). Ratios such as collection percentages are
+carried as exact integer fractions, so every derived figure is an exact
+rational number until it leaves the compute path.
+
+Rounding is defined once, in dollars() and whole_percent(): the result is the
+exact value converted to the nearest double and rounded with Python's round().
+That is the sequence the previous Decimal code performed with
+``round(float(value), 2)``, so outputs match it to the cent, including on
+half-cent ties. dollars() gets there with integer division and only takes the
+float route when the value is within float precision of a half cent.
+"""
+
+from decimal import Decimal
+from fractions import Fraction
+
+
+def ratio(value):
+    """
+    Return an exact (numerator, denominator) pair for a ratio.
+
+    Floats are taken at their shortest decimal representation, matching the
+    old ``Decimal(str(value))`` conversion, with a power-of-ten denominator so
+    that sums over many practices share a handful of denominators.
+    """
+    if isinstance(value, Fraction):
+        return value.numerator, value.denominator
+    if isinstance(value, int):
+        return value, 1
+    if isinstance(value, float):
+        text = repr(value)
+        if 'e' not in text and 'n' not in text:
+            whole, _, decimals = text.partition('.')
+            return int(whole + decimals), 10 ** len(decimals)
+        value = Decimal(text)
+    return value.as_integer_ratio()
+
+
+def dollars(cents_numerator, denominator=1):
+    """Convert an exact amount in cents (numerator / denominator) to dollars, rounded to the cent."""
+    if denominator == 0:
+        return 0
+    cents, remainder = divmod(cents_numerator, denominator)
+    twice = 2 * remainder
+    # Within float precision of a half cent, defer to the double-then-round()
+    # sequence so ties resolve exactly as round(float(value), 2) always has.
+    if abs(twice - denominator) * 10 ** 15 <= 2 * denominator * (abs(cents) + 1):
+        return round(cents_numerator / (denominator * 100), 2)
+    if twice > denominator:
+        cents += 1
+    if cents == 0 and cents_numerator < 0:
+        return -0.0
+    return cents / 100
+
+
+def fraction_dollars(cents):
+    """dollars() for an exact Fraction of cents."""
+    return dollars(cents.numerator, cents.denominator)
+
+
+def whole_percent(numerator, denominator):
+    """numerator / denominator * 100, rounded to a whole percent (half to even)."""
+    return round(numerator * 100 / denominator)
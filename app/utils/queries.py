@@ -0,0 +1,268 @@
+"""
+Named query registry for the dashboard SQL.
+
+Queries are registered once under a name and executed by name. On pooled
+(long-lived) connections each query is PREPAREd the first time that
+connection runs it and EXECUTEd afterwards, so it is parsed and planned once
+per connection instead of once per call. On short-lived connections the SQL
+is sent as-is. Every execution is timed, and stats() reports the totals per
+query.
+
+SQL is written with psycopg2 %s placeholders; they are numbered $1, $2, ...
+for PREPARE.
+"""
+
+import threading
+import time
+import weakref
+
+
+class QueryRegistry:
+    """Registered queries, the connections they are prepared on, and timings."""
+
+    def __init__(self):
+        self._queries = {}
+        self._lock = threading.Lock()
+        self._long_lived = weakref.WeakSet()
+        self._prepared = weakref.WeakKeyDictionary()
+        self._stats = {}
+
+    def register(self, name, sql):
+        """Register sql under name (a SQL identifier) and return the name."""
+        if name in self._queries and self._queries[name] != sql:
+            raise ValueError(f"Query {name} is already registered with different SQL")
+        self._queries[name] = sql
+        return name
+
+    def sql(self, name):
+        """The SQL registered under name."""
+        return self._queries[name]
+
+    def mark_long_lived(self, conn):
+        """Prepare statements on conn, which will be reused across requests."""
+        with self._lock:
+            self._long_lived.add(conn)
+
+    def execute(self, cursor, name, params=()):
+        """Execute a registered query on cursor; fetch results from the cursor as usual."""
+        sql = self._queries[name]
+        conn = cursor.connection
+        started = time.perf_counter()
+        prepared_now = False
+        with self._lock:
+            prepare = conn in self._long_lived
+            if prepare:
+                prepared = self._prepared.setdefault(conn, set())
+                prepared_now = name not in prepared
+        if not prepare:
+            cursor.execute(sql, params or None)
+        else:
+            if prepared_now:
+                cursor.execute(f"PREPARE {name} AS {_numbered(sql)}")
+                with self._lock:
+                    prepared.add(name)
+            if params:
+                cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            else:
+                cursor.execute(f"EXECUTE {name}")
+        self._record(name, time.perf_counter() - started, prepared_now)
+
+    def stats(self):
+        """Per-query call counts and timings in milliseconds, slowest total first."""
+        with self._lock:
+            items = [(name, dict(entry)) for name, entry in self._stats.items()]
+        report = []
+        for name, entry in items:
+            report.append({
+                'query': name,
+                'calls': entry['calls'],
+                'prepares': entry['prepares'],
+                'total_ms': round(entry['total'] * 1000, 3),
+                'mean_ms': round(entry['total'] * 1000 / entry['calls'], 3),
+                'max_ms': round(entry['max'] * 1000, 3)
+            })
+        report.sort(key=lambda row: row['total_ms'], reverse=True)
+        return report
+
+    def _record(self, name, elapsed, prepared_now):
+        with self._lock:
+            entry = self._stats.setdefault(name, {'calls': 0, 'prepares': 0, 'total': 0.0, 'max': 0.0})
+            entry['calls'] += 1
+            entry['prepares'] += 1 if prepared_now else 0
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+
+
+def _numbered(sql):
+    """Replace %s placeholders with $1, $2, ... in order."""
+    parts = sql.split('%s')
+    numbered = [parts[0]]
+    for index, part in enumerate(parts[1:], start=1):
+        numbered.append(f"${index}{part}")
+    return ''.join(numbered)
+
+
+queries = QueryRegistry()
+
+
+# --- Account table and metrics ---
+
+PRACTICE_PLACEMENTS = queries.register('practice_placements', '''
+    SELECT sb.practice_name, sb.territory,
+           (COALESCE(SUM(sb.initial_balance),0) * 100)::bigint as placed_cents,
+           COUNT(DISTINCT sb.client_account_number) as sample_count
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL
+    AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
+    GROUP BY sb.practice_name, sb.territory
+''')
+
+TERRITORY_ACCOUNT_COUNTS = queries.register('territory_account_counts', '''
+    SELECT ad.territory, COUNT(DISTINCT ad.practice_name) as num_accounts
+    FROM account_data ad
+    GROUP BY ad.territory
+''')
+
+# expense_type is 'Expense' or 'COGS'
+TERRITORY_COGS_EXPENSE = queries.register('territory_cogs_expense', '''
+    SELECT territory, (amount * 100)::bigint FROM cogs_expense
+    WHERE month_year = %s AND expense_type = %s
+''')
+
+# Expense and COGS amounts of several months at once
+TERRITORY_COGS_EXPENSE_MONTHS = queries.register('territory_cogs_expense_months', '''
+    SELECT month_year, expense_type, territory, (amount * 100)::bigint FROM cogs_expense
+    WHERE month_year = ANY(%s) AND expense_type IN ('Expense', 'COGS')
+''')
+
+# practice_placements per calendar month over a date range
+PRACTICE_MONTHLY_PLACEMENTS = queries.register('practice_monthly_placements', '''
+    SELECT DATE_TRUNC('month', sb.placement_date)::date as month,
+           sb.practice_name, sb.territory,
+           (COALESCE(SUM(sb.initial_balance),0) * 100)::bigint as placed_cents,
+           COUNT(DISTINCT sb.client_account_number) as sample_count
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL
+    AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
+    GROUP BY 1, sb.practice_name, sb.territory
+''')
+
+TERRITORY_SAMPLES = queries.register('territory_samples', '''
+    SELECT sb.territory, COUNT(sb.client_account_number) as total_samples
+    FROM sample_billing sb
+    WHERE sb.account_id IS NOT NULL
+    AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
+    GROUP BY sb.territory
+''')
+
+# Collector costs edited from the dashboard (staging.collectors, keyed by
+# account-table practice and territory) override the imported amount of the
+# collectors row the practice's lookup picks (see practice_collector)
+TERRITORY_COLLECTOR_COSTS = queries.register('territory_collector_costs', '''
+    SELECT c.territory,
+           (COALESCE(SUM(COALESCE(o.collector_cost, c.june_amount)),0) * 100)::bigint as total_collector_cost
+    FROM collectors c
+    LEFT JOIN (
+        SELECT DISTINCT ON (picked.id) picked.id, s.collector_cost
+        FROM staging.collectors s
+        CROSS JOIN LATERAL (
+            SELECT c2.id FROM collectors c2
+            WHERE c2.practice LIKE '%' || s.practice_name || '%'
+            ORDER BY (c2.practice = s.practice_name) DESC, c2.id
+            LIMIT 1
+        ) picked
+        ORDER BY picked.id, s.id DESC
+    ) o ON o.id = c.id
+    GROUP BY c.territory
+''')
+
+# Charges and payments of one practice's samples placed in a period
+PRACTICE_PERIOD_COLLECTIONS = queries.register('practice_period_collections', '''
+    SELECT COALESCE(SUM(sb.total_charges),0) as placed,
+           COALESCE(SUM(sb.total_payments),0) as collected
+    FROM sample_billing sb
+    WHERE sb.practice_name = %s
+    AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
+''')
+
+# Collector status and cost of an account-table practice: the collectors row
+# whose practice contains the name (an exact match first), with the
+# practice's dashboard override. Parameters: practice_name, territory,
+# '%practice_name%', practice_name
+PRACTICE_COLLECTOR = queries.register('practice_collector', '''
+    SELECT c.collector,
+           (COALESCE((SELECT s.collector_cost FROM staging.collectors s
+                      WHERE s.practice_name = %s AND s.territory = %s),
+                     c.june_amount) * 100)::bigint
+    FROM collectors c
+    WHERE c.practice LIKE %s
+    ORDER BY (c.practice = %s) DESC, c.id
+    LIMIT 1
+''')
+
+# Placed, charges and payments rolled up territory > sales rep > practice >
+# financial class; the bitmask tells subtotal rows from NULL values. Samples
+# are attributed to the territory and rep mapped on their placement date
+# (staging.account_territory_mapping versions), falling back to the current
+# account_data values resolved onto sample_billing for accounts without a
+# mapping then.
+ACCOUNT_DRILLDOWN = queries.register('account_drilldown', '''
+    SELECT territory, sales_rep, practice_name, financial_class,
+           GROUPING(territory, sales_rep, practice_name, financial_class) as rolled_up,
+           COUNT(client_account_number) as samples,
+           (COALESCE(SUM(initial_balance),0) * 100)::bigint as placed_cents,
+           (COALESCE(SUM(total_charges),0) * 100)::bigint as charges_cents,
+           (COALESCE(SUM(total_payments),0) * 100)::bigint as payments_cents
+    FROM (
+        SELECT COALESCE(m.territory_name, sb.territory) as territory,
+               COALESCE(m.sales_rep_name, sb.sales_rep) as sales_rep,
+               sb.practice_name, sb.financial_class, sb.client_account_number,
+               sb.initial_balance, sb.total_charges, sb.total_payments
+        FROM sample_billing sb
+        LEFT JOIN staging.account_territory_mapping m
+               ON m.account_number = sb.client_account_number
+              AND daterange(m.effective_date, m.end_date, '[]') @> DATE(sb.placement_date)
+        WHERE sb.account_id IS NOT NULL
+        AND DATE(sb.placement_date) >= %s AND DATE(sb.placement_date) <= %s
+    ) samples
+    GROUP BY ROLLUP (territory, sales_rep, practice_name, financial_class)
+''')
+
+# Payer mix per practice over whole months, from the analytics.payer_mix cube
+PAYER_MIX = queries.register('payer_mix', '''
+    SELECT practice_name, financial_class, payer_name, SUM(samples)::integer,
+           (SUM(charges) * 100)::bigint, (SUM(payments) * 100)::bigint
+    FROM analytics.payer_mix
+    WHERE month >= %s AND month <= %s
+    GROUP BY practice_name, financial_class, payer_name
+''')
+
+PAYER_MIX_FOR_PRACTICES = queries.register('payer_mix_for_practices', '''
+    SELECT practice_name, financial_class, payer_name, SUM(samples)::integer,
+           (SUM(charges) * 100)::bigint, (SUM(payments) * 100)::bigint
+    FROM analytics.payer_mix
+    WHERE month >= %s AND month <= %s AND practice_name = ANY(%s)
+    GROUP BY practice_name, financial_class, payer_name
+''')
+
+
+# --- QBO transactions (synced into raw.qbo_transactions by app/services/qbo_sync.py) ---
+
+QBO_TRANSACTION_TOTALS = queries.register('qbo_transaction_totals', '''
+    SELECT txn_type, DATE_TRUNC('month', txn_date)::date as month,
+           COUNT(*) as transactions, (COALESCE(SUM(amount),0) * 100)::bigint as amount_cents
+    FROM raw.qbo_transactions
+    WHERE NOT is_deleted AND txn_date >= %s AND txn_date <= %s
+    GROUP BY txn_type, DATE_TRUNC('month', txn_date)
+    ORDER BY month, txn_type
+''')
+
+# Monthly rows are rebuilt from staging.transactions_cleaned by app/services/qbo_transform.py
+TERRITORY_PERFORMANCE = queries.register('territory_performance', '''
+    SELECT territory_name, total_sales, num_accounts, avg_revenue_per_account, report_date, period_type
+    FROM analytics.territory_performance
+    WHERE period_type = %s
+      AND (%s::date IS NULL OR report_date >= %s::date)
+      AND (%s::date IS NULL OR report_date <= %s::date)
+    ORDER BY report_date DESC, total_sales DESC
+''')
@@ -0,0 +1,158 @@
+"""
+JSON encoding, columnar layout and response compression for large dashboard
+payloads.
+
+json_response() is a drop-in for flask.jsonify that encodes with orjson when
+DASHBOARD_FAST_JSON=true and orjson is installed. to_columnar() lays a list
+of row dicts out as one array per column. compress_response() is an
+after_request hook that gzip- or brotli-compresses responses above a size
+threshold, negotiated from the request's Accept-Encoding header.
+"""
+
+import gzip
+import os
+from decimal import Decimal
+
+from flask import current_app, jsonify, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FAST_JSON = os.getenv('DASHBOARD_FAST_JSON', 'false').lower() == 'true'
+COMPRESS_MIN_BYTES = int(os.getenv('DASHBOARD_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('DASHBOARD_GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.getenv('DASHBOARD_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/csv', 'text/plain', 'application/javascript')
+
+
+def _orjson_default(value):
+    """Encode types orjson does not handle natively the way jsonify would."""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_response(payload):
+    """Build a JSON response like jsonify(), using orjson when enabled."""
+    if FAST_JSON and orjson is not None:
+        body = orjson.dumps(payload, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+        return current_app.response_class(body, mimetype='application/json')
+    return jsonify(payload)
+
+
+def to_columnar(rows, columns, dictionary_columns=()):
+    """
+    Convert a list of row dicts to a columnar block.
+
+    columns is a list of (name, type) pairs. The block carries a schema
+    header, one array per column and, for dictionary_columns, an array of
+    distinct values with the column holding indexes into it.
+    """
+    schema = []
+    data = {}
+    dictionaries = {}
+    for name, value_type in columns:
+        values = [row.get(name) for row in rows]
+        field = {'name': name, 'type': value_type}
+        if name in dictionary_columns:
+            index = {}
+            codes = []
+            for value in values:
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(index)
+                codes.append(code)
+            dictionaries[name] = list(index)
+            values = codes
+            field['dictionary'] = True
+        schema.append(field)
+        data[name] = values
+    return {
+        'schema': schema,
+        'row_count': len(rows),
+        'columns': data,
+        'dictionaries': dictionaries
+    }
+
+
+def accepted_encodings(header):
+    """
+    Parse an Accept-Encoding header into {encoding: q}. Encodings refused
+    with q=0 are kept, so that they are not accepted through '*'.
+    """
+    encodings = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+def choose_encoding(header):
+    """
+    Pick 'br' or 'gzip' from an Accept-Encoding header, or None. An encoding
+    not listed takes the q value of '*'; one listed with q=0 is never used.
+
+    >>> choose_encoding('gzip')
+    'gzip'
+    >>> choose_encoding('gzip, *;q=0')
+    'gzip'
+    >>> choose_encoding('gzip;q=0, br;q=0, *')
+    >>> choose_encoding('gzip;q=0, *') == 'gzip'
+    False
+    >>> choose_encoding('identity')
+    """
+    encodings = accepted_encodings(header)
+    candidates = []
+    if brotli is not None:
+        candidates.append('br')
+    candidates.append('gzip')
+    best = None
+    for name in candidates:
+        q = encodings.get(name, encodings.get('*', 0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (name, q)
+    return best[0] if best else None
+
+
+def compress_response(response):
+    """after_request hook: compress large, compressible responses."""
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,164 @@
+"""
+Request coalescing (single-flight) for expensive dashboard computations.
+
+Concurrent callers asking for the same key share one in-flight computation
+and all receive its result. Within a worker process this is done with threads.
+Across worker processes it can optionally use a PostgreSQL advisory lock to
+elect a leader; followers wait on the lock and pick up the leader's result
+from staging.singleflight_results. Stored results are only read by callers
+that were already waiting, so leaders delete rows older than
+result_ttl_seconds when they store theirs.
+"""
+
+import hashlib
+import threading
+
+import psycopg2
+from psycopg2.extras import Json
+
+
+RESULTS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS staging.singleflight_results (
+        flight_key TEXT PRIMARY KEY,
+        payload JSONB NOT NULL,
+        completed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+    )
+"""
+
+
+def request_key(route, args):
+    """Build a coalescing key from a route name and its normalized arguments."""
+    parts = []
+    for name in sorted(args):
+        value = args[name]
+        if value is None or value == '':
+            continue
+        parts.append(f"{name.lower()}={str(value).strip().lower()}")
+    return f"{route}?{'&'.join(parts)}"
+
+
+def advisory_lock_id(key):
+    """Map a key onto the signed 64-bit id space used by pg_advisory_lock."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class _Call:
+    """A computation in flight for one key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent identical requests.
+
+    The first caller for a key becomes the leader and runs the computation;
+    callers arriving while it runs block until it finishes and receive the
+    same result (or the same exception). Nothing is cached once the call
+    completes. With advisory=True the leader is also elected across processes
+    through pg_try_advisory_lock, so results must be JSON-serializable.
+
+    on_shared(key, result) is called when a result computed by another
+    process is picked up, so callers can cache it like one computed here.
+    """
+
+    def __init__(self, get_connection=None, advisory=False, result_ttl_seconds=300, on_shared=None):
+        self.get_connection = get_connection
+        self.advisory = advisory and get_connection is not None
+        self.result_ttl_seconds = result_ttl_seconds
+        self.on_shared = on_shared
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._table_ready = False
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) once for all concurrent callers of key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.advisory:
+                call.result = self._do_across_processes(key, fn, args, kwargs)
+            else:
+                call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """Number of keys currently being computed in this process."""
+        with self._lock:
+            return len(self._calls)
+
+    def _do_across_processes(self, key, fn, args, kwargs):
+        lock_id = advisory_lock_id(key)
+        conn = self.get_connection()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            if not self._table_ready:
+                try:
+                    cursor.execute(RESULTS_TABLE_SQL)
+                except psycopg2.errors.UniqueViolation:
+                    pass  # created concurrently by another worker
+                self._table_ready = True
+
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (lock_id,))
+            if cursor.fetchone()[0]:
+                try:
+                    result = fn(*args, **kwargs)
+                    cursor.execute("""
+                        INSERT INTO staging.singleflight_results (flight_key, payload, completed_at)
+                        VALUES (%s, %s, clock_timestamp())
+                        ON CONFLICT (flight_key)
+                        DO UPDATE SET payload = EXCLUDED.payload, completed_at = EXCLUDED.completed_at
+                    """, (key, Json(result)))
+                    cursor.execute("""
+                        DELETE FROM staging.singleflight_results
+                        WHERE completed_at < clock_timestamp() - make_interval(secs => %s)
+                    """, (self.result_ttl_seconds,))
+                    return result
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+
+            # Another process is the leader: wait for it to release the lock,
+            # then take the result it published after we started waiting.
+            cursor.execute("SELECT clock_timestamp()")
+            waiting_since = cursor.fetchone()[0]
+            cursor.execute("SELECT pg_advisory_lock(%s)", (lock_id,))
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+            cursor.execute("""
+                SELECT payload FROM staging.singleflight_results
+                WHERE flight_key = %s AND completed_at >= %s
+            """, (key, waiting_since))
+            row = cursor.fetchone()
+            if row:
+                if self.on_shared is not None:
+                    self.on_shared(key, row[0])
+                return row[0]
+
+            # The leader failed or finished before we started waiting.
+            print(f"[DEBUG] No shared result for {key}, computing locally")
+            return fn(*args, **kwargs)
+        finally:
+            cursor.close()
+            conn.close()
@@ -7,6 +7,9 @@ CREATE SCHEMA IF NOT EXISTS staging;
 CREATE SCHEMA IF NOT EXISTS analytics;
 CREATE SCHEMA IF NOT EXISTS auth;
 
+-- GiST indexes over a btree column and a range (account territory mapping)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Raw Tables (unprocessed data from sources)
 CREATE TABLE IF NOT EXISTS raw.qbo_transactions (
     id SERIAL PRIMARY KEY,
@@ -18,6 +21,8 @@ CREATE TABLE IF NOT EXISTS raw.qbo_transactions (
     txn_type VARCHAR(100),
     description TEXT,
     raw_json JSONB,
+    qbo_updated_at TIMESTAMPTZ, -- MetaData.LastUpdatedTime in QBO
+    is_deleted BOOLEAN NOT NULL DEFAULT FALSE, -- deleted in QBO
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
@@ -45,7 +50,9 @@ CREATE TABLE IF NOT EXISTS staging.transactions_cleaned (
     territory VARCHAR(255),
     sales_rep VARCHAR(255),
     product_category VARCHAR(255),
-    created_at TIMESTAMP DEFAULT NOW()
+    txn_type VARCHAR(100),
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS staging.external_data_cleaned (
@@ -60,9 +67,11 @@ CREATE TABLE IF NOT EXISTS staging.external_data_cleaned (
 );
 
 -- Account to Territory/Rep Mapping Table
+-- One row per version of an account's mapping, in force from effective_date
+-- through end_date (NULL on the current version); see app/services/territory_mapping.py
 CREATE TABLE IF NOT EXISTS staging.account_territory_mapping (
     id SERIAL PRIMARY KEY,
-    account_number VARCHAR(255) UNIQUE NOT NULL,
+    account_number VARCHAR(255) NOT NULL,
     sales_rep_name VARCHAR(255),
     sales_rep_id VARCHAR(255),
     territory_name VARCHAR(255),
@@ -170,19 +179,167 @@ CREATE TABLE IF NOT EXISTS staging.etl_job_log (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Collector costs edited from the dashboard, one per account-table practice
+-- (account_data practice_name and territory); they override
+-- collectors.june_amount (app/services/collector_costs.py)
+CREATE TABLE IF NOT EXISTS staging.collectors (
+    id SERIAL PRIMARY KEY,
+    practice_name VARCHAR(255),
+    territory VARCHAR(255),
+    collector_cost NUMERIC(15,2),
+    CONSTRAINT collectors_practice_name_territory_key UNIQUE (practice_name, territory)
+);
+
+-- Generations bumped by writes that invalidate per-worker caches (app/utils/generations.py)
+CREATE TABLE IF NOT EXISTS staging.cache_generations (
+    name TEXT PRIMARY KEY,
+    generation BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Results shared between worker processes by request coalescing (app/utils/singleflight.py)
+CREATE TABLE IF NOT EXISTS staging.singleflight_results (
+    flight_key TEXT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    completed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Background report jobs (app/services/jobs.py)
+CREATE TABLE IF NOT EXISTS staging.report_jobs (
+    job_id TEXT PRIMARY KEY,
+    spec JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL, -- queued, running, succeeded, failed
+    filename TEXT,
+    mimetype TEXT,
+    result_bytes BIGINT,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    owner TEXT -- host:pid of the process that accepted the job
+);
+
+-- Tables created before jobs recorded their owner
+ALTER TABLE staging.report_jobs ADD COLUMN IF NOT EXISTS owner TEXT;
+
+-- Generated AI summaries by hash of the data they describe (app/services/ai_summary.py)
+CREATE TABLE IF NOT EXISTS staging.ai_summaries (
+    summary_key TEXT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL, -- pending, ready, failed
+    backend VARCHAR(50),
+    analysis TEXT,
+    error_message TEXT,
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+-- QBO customers by id with their AcctNum, the billing account number QBO
+-- transactions are mapped to territories by (app/services/qbo_sync.py)
+CREATE TABLE IF NOT EXISTS staging.qbo_customers (
+    customer_id VARCHAR(64) PRIMARY KEY,
+    display_name VARCHAR(255),
+    acct_num VARCHAR(255),
+    is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
+    qbo_updated_at TIMESTAMPTZ,
+    changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- High-water marks of the incremental QBO sync per company and entity (app/services/qbo_sync.py)
+CREATE TABLE IF NOT EXISTS staging.qbo_sync_state (
+    realm_id VARCHAR(64) NOT NULL,
+    entity VARCHAR(50) NOT NULL,
+    changed_since TIMESTAMPTZ NOT NULL, -- changedSince of the next CDC call
+    synced_at TIMESTAMP,
+    records_synced BIGINT NOT NULL DEFAULT 0,
+    error_message TEXT,
+    PRIMARY KEY (realm_id, entity)
+);
+
+-- High-water marks of incremental transforms by job (app/services/qbo_transform.py)
+CREATE TABLE IF NOT EXISTS staging.transform_state (
+    job_name VARCHAR(100) PRIMARY KEY,
+    high_water_at TIMESTAMP NOT NULL, -- updated_at and id of the last source row processed
+    high_water_id INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Sample billing rows, loaded by scripts/backup/import_sample_billing.py.
+-- account_id, practice_name, territory and sales_rep are copied from
+-- account_data at load time (app/services/sample_accounts.py)
+CREATE TABLE IF NOT EXISTS sample_billing (
+    id SERIAL PRIMARY KEY,
+    account_number VARCHAR(255),
+    billed_date DATE,
+    billing_provider_name TEXT,
+    billing_provider_npi_number TEXT,
+    client_account_number VARCHAR(255),
+    current_balance NUMERIC(15,2),
+    facility TEXT,
+    financial_class TEXT,
+    initial_balance NUMERIC(15,2),
+    insurance_cob_sequence TEXT,
+    insurance_group_number TEXT,
+    insurance_name TEXT,
+    medical_record_number TEXT,
+    payer_name_primary TEXT,
+    payer_name_secondary TEXT,
+    place_of_service TEXT,
+    placement_date TIMESTAMP,
+    service_date_from DATE,
+    service_date_thru DATE,
+    subscriber_id TEXT,
+    total_adjustments NUMERIC(15,2),
+    total_charges NUMERIC(15,2),
+    total_payments NUMERIC(15,2),
+    total_payments_by_insurance NUMERIC(15,2),
+    total_payments_by_patient NUMERIC(15,2),
+    account_id INTEGER,
+    practice_name VARCHAR(255),
+    territory VARCHAR(255),
+    sales_rep VARCHAR(255)
+);
+
+-- Tables created before the account columns existed
+-- (also scripts/backup/add_sample_account_columns.sql)
+ALTER TABLE sample_billing
+    ADD COLUMN IF NOT EXISTS account_id INTEGER,
+    ADD COLUMN IF NOT EXISTS practice_name VARCHAR(255),
+    ADD COLUMN IF NOT EXISTS territory VARCHAR(255),
+    ADD COLUMN IF NOT EXISTS sales_rep VARCHAR(255);
+
+-- Payer-mix cube: sample_billing by practice, placement month, financial class
+-- and primary payer; rebuilt after each sample_billing import (app/services/payer_mix.py)
+CREATE TABLE IF NOT EXISTS analytics.payer_mix (
+    practice_name VARCHAR(255) NOT NULL,
+    month DATE NOT NULL,
+    financial_class VARCHAR(255) NOT NULL,
+    payer_name VARCHAR(255) NOT NULL,
+    samples INTEGER NOT NULL,
+    placed NUMERIC(15,2) NOT NULL,
+    charges NUMERIC(15,2) NOT NULL,
+    payments NUMERIC(15,2) NOT NULL,
+    PRIMARY KEY (practice_name, month, financial_class, payer_name)
+);
+
 -- Indexes for Performance
 CREATE INDEX IF NOT EXISTS idx_qbo_transactions_date ON raw.qbo_transactions(txn_date);
 CREATE INDEX IF NOT EXISTS idx_qbo_transactions_customer ON raw.qbo_transactions(customer_name);
 CREATE INDEX IF NOT EXISTS idx_qbo_transactions_qbo_id ON raw.qbo_transactions(qbo_id);
+CREATE INDEX IF NOT EXISTS idx_sample_billing_client_account ON sample_billing(client_account_number);
 
 CREATE INDEX IF NOT EXISTS idx_transactions_cleaned_date ON staging.transactions_cleaned(txn_date);
 CREATE INDEX IF NOT EXISTS idx_transactions_cleaned_territory ON staging.transactions_cleaned(territory);
 CREATE INDEX IF NOT EXISTS idx_transactions_cleaned_customer ON staging.transactions_cleaned(customer_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_cleaned_qbo_id ON staging.transactions_cleaned(qbo_id);
 
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_account ON staging.account_territory_mapping(account_number);
+CREATE INDEX IF NOT EXISTS idx_qbo_customers_acct_num ON staging.qbo_customers(acct_num);
+CREATE INDEX IF NOT EXISTS idx_qbo_customers_changed_at ON staging.qbo_customers(changed_at);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_rep ON staging.account_territory_mapping(sales_rep_name);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_territory ON staging.account_territory_mapping(territory_name);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_active ON staging.account_territory_mapping(is_active);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_account_territory_mapping_current ON staging.account_territory_mapping(account_number) WHERE end_date IS NULL;
+CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_account_valid ON staging.account_territory_mapping USING GIST (account_number, daterange(effective_date, end_date, '[]'));
 
 CREATE INDEX IF NOT EXISTS idx_financial_summary_period ON analytics.financial_summary(period_start, period_end);
 CREATE INDEX IF NOT EXISTS idx_financial_summary_territory ON analytics.financial_summary(territory);
@@ -193,6 +350,7 @@ CREATE INDEX IF NOT EXISTS idx_territory_performance_name ON analytics.territory
 
 CREATE INDEX IF NOT EXISTS idx_account_kpis_date ON analytics.account_kpis(report_date);
 CREATE INDEX IF NOT EXISTS idx_account_kpis_account ON analytics.account_kpis(account_id);
+CREATE INDEX IF NOT EXISTS idx_payer_mix_month ON analytics.payer_mix(month);
 
 -- Sample data for testing (optional)
 INSERT INTO auth.users (username, email, password_hash, role) VALUES
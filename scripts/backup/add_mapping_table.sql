@@ -4,10 +4,15 @@
 -- Create staging schema if it doesn't exist
 CREATE SCHEMA IF NOT EXISTS staging;
 
+-- GiST index over account_number and the validity range
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
 -- Account to Territory/Rep Mapping Table
+-- One row per version of an account's mapping, in force from effective_date
+-- through end_date (NULL on the current version); see app/services/territory_mapping.py
 CREATE TABLE IF NOT EXISTS staging.account_territory_mapping (
     id SERIAL PRIMARY KEY,
-    account_number VARCHAR(255) UNIQUE NOT NULL,
+    account_number VARCHAR(255) NOT NULL,
     sales_rep_name VARCHAR(255),
     sales_rep_id VARCHAR(255),
     territory_name VARCHAR(255),
@@ -20,11 +25,19 @@ CREATE TABLE IF NOT EXISTS staging.account_territory_mapping (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Tables created before mapping versions were kept allowed one row per account.
+-- This locks the table against reads until commit: run the script once, before
+-- deploying versioned mapping imports, not during a refresh
+ALTER TABLE staging.account_territory_mapping DROP CONSTRAINT IF EXISTS account_territory_mapping_account_number_key;
+
 -- Add indexes for performance
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_account ON staging.account_territory_mapping(account_number);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_rep ON staging.account_territory_mapping(sales_rep_name);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_territory ON staging.account_territory_mapping(territory_name);
 CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_active ON staging.account_territory_mapping(is_active);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_account_territory_mapping_current ON staging.account_territory_mapping(account_number) WHERE end_date IS NULL;
+DROP INDEX IF EXISTS staging.idx_account_territory_mapping_valid;
+CREATE INDEX IF NOT EXISTS idx_account_territory_mapping_account_valid ON staging.account_territory_mapping USING GIST (account_number, daterange(effective_date, end_date, '[]'));
 
 -- Verify the table was created
 SELECT 'Table staging.account_territory_mapping created successfully!' as status; 
\ No newline at end of file
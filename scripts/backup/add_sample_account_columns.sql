@@ -0,0 +1,15 @@
+-- Add the resolved account columns to sample_billing in an existing healthtech database
+-- Run this once before deploying the dashboard queries that read them, then
+-- fill them with scripts/backup/resolve_sample_accounts.py
+
+ALTER TABLE sample_billing
+    ADD COLUMN IF NOT EXISTS account_id INTEGER,
+    ADD COLUMN IF NOT EXISTS practice_name VARCHAR(255),
+    ADD COLUMN IF NOT EXISTS territory VARCHAR(255),
+    ADD COLUMN IF NOT EXISTS sales_rep VARCHAR(255);
+
+-- The resolve joins sample_billing to account_data on the client account number
+CREATE INDEX IF NOT EXISTS idx_sample_billing_client_account ON sample_billing(client_account_number);
+
+-- Verify the columns were added
+SELECT 'sample_billing account columns added successfully!' as status;
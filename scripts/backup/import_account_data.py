@@ -11,6 +11,9 @@ import sys
 
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.sample_accounts import print_orphans, resolve_sample_accounts
 
 def load_config():
     """Load configuration from environment variables."""
@@ -130,6 +133,12 @@ def import_excel_data(config):
         for row in sample_data:
             print(f"  {row}")
         
+        # Copy the new accounts' practice and territory onto sample_billing
+        resolution = resolve_sample_accounts(conn)
+        print(f"\nResolved {resolution['resolved']} sample_billing rows")
+        print_orphans(resolution['orphans'])
+        print(f"Rebuilt analytics.payer_mix: {resolution['payer_mix_rows']} rows")
+        
         cursor.close()
         conn.close()
         
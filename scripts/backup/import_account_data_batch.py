@@ -12,6 +12,9 @@ from psycopg2.extras import execute_batch
 
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.sample_accounts import print_orphans, resolve_sample_accounts
 
 def load_config():
     """Load configuration from environment variables."""
@@ -156,6 +159,12 @@ def import_excel_data_batch(config):
         for territory, count in territory_data:
             print(f"  {territory}: {count} accounts")
         
+        # Copy the new accounts' practice and territory onto sample_billing
+        resolution = resolve_sample_accounts(conn)
+        print(f"\nResolved {resolution['resolved']} sample_billing rows")
+        print_orphans(resolution['orphans'])
+        print(f"Rebuilt analytics.payer_mix: {resolution['payer_mix_rows']} rows")
+        
         cursor.close()
         conn.close()
         
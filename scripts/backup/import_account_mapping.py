@@ -8,13 +8,18 @@ import os
 import sys
 import pandas as pd
 import psycopg2
-from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 import argparse
 from datetime import datetime
 
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.qbo_transform import retag_transactions
+from app.services.territory_mapping import (
+    MAPPING_COLUMNS, apply_mapping_stage, copy_mapping_stage, create_mapping_stage
+)
 
 def load_config():
     """Load configuration from environment variables."""
@@ -153,9 +158,15 @@ def map_columns(df, account_col=None, rep_col=None, territory_col=None, region_c
     
     return mapped_df
 
-def import_to_database(config, df, dry_run=False):
+def import_to_database(config, df, dry_run=False, update_existing=False):
     """
     Import the mapped data into the database.
+
+    The rows are COPYed into a temp table and applied in bulk. Accounts that
+    already have a mapping are left as they are unless update_existing, in
+    which case changed mappings are closed and new versions start today.
+    QBO transactions of the imported accounts are re-attributed and their
+    territory performance months rebuilt in the same transaction.
     """
     try:
         conn = psycopg2.connect(
@@ -173,52 +184,26 @@ def import_to_database(config, df, dry_run=False):
             print(df.head().to_string())
             return
         
-        # Check for existing records
-        account_numbers = tuple(df['account_number'].tolist())
-        if len(account_numbers) == 1:
-            account_numbers = f"('{account_numbers[0]}')"
-        
-        cursor.execute(f"""
-            SELECT account_number FROM staging.account_territory_mapping 
-            WHERE account_number IN {account_numbers}
-        """)
-        existing_accounts = [row[0] for row in cursor.fetchall()]
+        # The last row of an account listed more than once wins
+        unique_df = df.drop_duplicates(subset=['account_number'], keep='last')
+        if len(unique_df) < len(df):
+            print(f"Ignored {len(df) - len(unique_df)} earlier rows of repeated account numbers")
         
-        if existing_accounts:
-            print(f"\nWarning: {len(existing_accounts)} account numbers already exist in database:")
-            print(f"Existing accounts: {existing_accounts[:10]}{'...' if len(existing_accounts) > 10 else ''}")
-            
-            response = input("\nDo you want to update existing records? (y/n): ").lower()
-            if response == 'y':
-                # Update existing records
-                for _, row in df.iterrows():
-                    cursor.execute("""
-                        UPDATE staging.account_territory_mapping 
-                        SET sales_rep_name = %s, sales_rep_id = %s, territory_name = %s, 
-                            territory_id = %s, region = %s, updated_at = NOW()
-                        WHERE account_number = %s
-                    """, (
-                        row['sales_rep_name'], row['sales_rep_id'], row['territory_name'],
-                        row['territory_id'], row['region'], row['account_number']
-                    ))
-                
-                # Insert new records
-                new_df = df[~df['account_number'].isin(existing_accounts)]
-                if len(new_df) > 0:
-                    insert_records(cursor, new_df)
-            else:
-                # Only insert new records
-                new_df = df[~df['account_number'].isin(existing_accounts)]
-                if len(new_df) > 0:
-                    insert_records(cursor, new_df)
-                else:
-                    print("No new records to insert.")
-        else:
-            # Insert all records
-            insert_records(cursor, df)
+        create_mapping_stage(cursor)
+        copy_mapping_stage(cursor, unique_df[list(MAPPING_COLUMNS)].itertuples(index=False, name=None))
+        summary = apply_mapping_stage(cursor, datetime.now().date(), update_existing)
+        months = []
+        if summary['inserted'] or summary['updated']:
+            months = retag_transactions(cursor, account_numbers=unique_df['account_number'].tolist())
         
         conn.commit()
-        print(f"\nSuccessfully imported {len(df)} account mappings!")
+        print(f"\nInserted: {summary['inserted']}")
+        print(f"Updated: {summary['updated']}")
+        if update_existing:
+            print(f"Unchanged: {summary['unchanged']}")
+        else:
+            print(f"Already mapped (not updated, use --update-existing): {summary['unchanged']}")
+        print(f"Territory performance months rebuilt: {len(months)}")
         
         cursor.close()
         conn.close()
@@ -227,37 +212,6 @@ def import_to_database(config, df, dry_run=False):
         print(f"Error importing to database: {e}")
         sys.exit(1)
 
-def insert_records(cursor, df):
-    """Insert records into the database."""
-    # Prepare data for bulk insert
-    data = []
-    for _, row in df.iterrows():
-        data.append((
-            row['account_number'],
-            row['sales_rep_name'],
-            row['sales_rep_id'],
-            row['territory_name'],
-            row['territory_id'],
-            row['region'],
-            row['is_active'],
-            row['effective_date'],
-            row['end_date']
-        ))
-    
-    # Bulk insert
-    execute_values(
-        cursor,
-        """
-        INSERT INTO staging.account_territory_mapping 
-        (account_number, sales_rep_name, sales_rep_id, territory_name, territory_id, 
-         region, is_active, effective_date, end_date)
-        VALUES %s
-        """,
-        data
-    )
-    
-    print(f"Inserted {len(data)} new records")
-
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(description='Import account-territory mapping data')
@@ -268,6 +222,8 @@ def main():
     parser.add_argument('--region-col', help='Column name for region')
     parser.add_argument('--file-type', choices=['csv', 'excel'], help='File type (auto-detected if not specified)')
     parser.add_argument('--dry-run', action='store_true', help='Show what would be imported without actually importing')
+    parser.add_argument('--update-existing', action='store_true',
+                        help='Start new mapping versions today for accounts whose rep or territory changed')
     
     args = parser.parse_args()
     
@@ -296,7 +252,7 @@ def main():
     mapped_df = map_columns(df, args.account_col, args.rep_col, args.territory_col, args.region_col)
     
     # Import to database
-    import_to_database(config, mapped_df, args.dry_run)
+    import_to_database(config, mapped_df, args.dry_run, args.update_existing)
     
     print("\nImport completed successfully!")
 
@@ -6,9 +6,15 @@ Import COGS Expense data from Excel spreadsheet into database.
 import pandas as pd
 import psycopg2
 import os
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.utils.generations import ACCOUNT_TABLE, bump_generations
+
 load_dotenv()
 
 def get_db_connection():
@@ -76,6 +82,8 @@ def import_cogs_expense_data():
                 data['expense_type'],
                 data['amount']
             ))
+        # Dashboard workers drop the account tables they cached
+        bump_generations(cursor, ACCOUNT_TABLE)
         
         conn.commit()
         print(f"Successfully imported {len(parsed_data)} COGS Expense records")
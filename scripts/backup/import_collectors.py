@@ -9,6 +9,11 @@ import os
 import sys
 from psycopg2.extras import execute_batch
 
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.utils.generations import ACCOUNT_TABLE, bump_generations
+
 # Database configuration
 DB_CONFIG = {
     'db_name': os.getenv('DB_NAME', 'healthtech'),
@@ -104,6 +109,8 @@ def import_excel_data(config):
             INSERT INTO collectors (territory, practice, collector, march_amount, april_amount, may_amount, june_amount)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
         """, data_to_insert, page_size=100)
+        # Dashboard workers drop the account tables they cached
+        bump_generations(cursor, ACCOUNT_TABLE)
         
         conn.commit()
         
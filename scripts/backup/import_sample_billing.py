@@ -13,6 +13,9 @@ import numpy as np
 
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.sample_accounts import print_orphans, resolve_sample_accounts
 
 def load_config():
     """Load configuration from environment variables."""
@@ -154,6 +157,12 @@ def import_excel_data_batch(config):
         print(f"Successfully imported: {count} records")
         print(f"Errors encountered: {errors}")
         
+        # Resolve each row's practice and territory from account_data once, at load time
+        resolution = resolve_sample_accounts(conn)
+        print(f"Resolved {resolution['resolved']} rows against account_data")
+        print_orphans(resolution['orphans'])
+        print(f"Rebuilt analytics.payer_mix: {resolution['payer_mix_rows']} rows")
+        
         cursor.close()
         conn.close()
         
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Add the resolved account columns to sample_billing and fill them.
+
+The dashboard reads the practice, territory and sales rep of each
+sample_billing row from columns copied from account_data at load time
+(app/services/sample_accounts.py). The imports fill them; run this once on a
+database loaded before those columns existed, or any time after changing
+account_data or sample_billing outside the import scripts. If the columns
+are missing it first adds them, in a transaction of its own (as
+add_sample_account_columns.sql does; database/schemas/init.sql has them on
+new databases). It then resolves every row, reports orphan client account
+numbers and rebuilds the payer-mix cube, in one transaction.
+"""
+
+import os
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.sample_accounts import add_sample_account_columns, print_orphans, resolve_sample_accounts
+
+load_dotenv()
+
+
+def main():
+    """Resolve sample_billing against account_data."""
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL not found in .env file")
+        sys.exit(1)
+    try:
+        conn = psycopg2.connect(database_url)
+        added = add_sample_account_columns(conn)
+        if added:
+            print(f"Added sample_billing columns: {', '.join(added)}")
+        resolution = resolve_sample_accounts(conn)
+        conn.close()
+    except Exception as e:
+        print(f"Error resolving sample_billing accounts: {e}")
+        sys.exit(1)
+
+    print(f"Resolved {resolution['resolved']} sample_billing rows against account_data")
+    print(f"Cleared {resolution['cleared']} rows whose account is no longer in account_data")
+    print_orphans(resolution['orphans'])
+    print(f"Rebuilt analytics.payer_mix: {resolution['payer_mix_rows']} rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Time the bulk account mapping import and check the versions it writes.
+
+Runs the path of scripts/backup/import_account_mapping.py
+(app/services/territory_mapping.py: COPY into a temp table, then the bulk
+close and upsert) on generated accounts: a first import dated 30 days ago,
+a re-import today that changes some accounts and adds new ones, and an
+import without --update-existing. The reported counts and the resulting
+rows of staging.account_territory_mapping are compared with what the
+import must produce: changed accounts keep their old version closed
+yesterday and get a new one from today, unchanged accounts keep theirs,
+and without --update-existing only new accounts are added. Timings cover
+the database work, not reading the file. Everything runs in one
+transaction that is rolled back, so the mapping table is left as it was.
+Needs DATABASE_URL.
+
+    python scripts/check_account_mapping_import.py --accounts 20000 --changed 2500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.territory_mapping import apply_mapping_stage, copy_mapping_stage, create_mapping_stage
+
+load_dotenv()
+
+PREFIX = 'CHECK-MAP-'
+
+
+def get_db_connection():
+    """Get database connection."""
+    return psycopg2.connect(os.getenv('DATABASE_URL'))
+
+
+def mapping_row(number, territory):
+    """A staged row in MAPPING_COLUMNS order."""
+    return (f"{PREFIX}{number:07d}", f"Rep {territory % 40}", None, f"Territory {territory}", None,
+            f"Region {territory % 4}")
+
+
+def run_import(cursor, rows, as_of, update_existing):
+    """Stage and apply rows as the import does; returns (summary, seconds)."""
+    started = time.perf_counter()
+    create_mapping_stage(cursor)
+    copy_mapping_stage(cursor, rows)
+    summary = apply_mapping_stage(cursor, as_of, update_existing)
+    seconds = time.perf_counter() - started
+    cursor.execute("DROP TABLE account_mapping_stage")  # dropped at commit by the import itself
+    return summary, seconds
+
+
+def main():
+    """Run the imports, compare counts and rows, and exit non-zero on a difference."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=20000, help='accounts in the first import')
+    parser.add_argument('--changed', type=int, default=2500, help='accounts whose mapping the re-import changes')
+    parser.add_argument('--new', type=int, default=500, help='accounts the re-import adds')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for a repeatable run')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    first_day = today - timedelta(days=30)
+    territories = {number: rng.randrange(200) for number in range(args.accounts)}
+    changed = set(rng.sample(range(args.accounts), min(args.changed, args.accounts)))
+    added = range(args.accounts, args.accounts + args.new)
+    late = range(args.accounts + args.new, args.accounts + args.new + 100)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    failures = []
+    try:
+        cursor.execute("SELECT COUNT(*) FROM staging.account_territory_mapping WHERE account_number LIKE %s",
+                       (PREFIX + '%',))
+        if cursor.fetchone()[0]:
+            print(f"staging.account_territory_mapping already has {PREFIX}* accounts; not touching them")
+            sys.exit(2)
+
+        # First import, 30 days ago
+        summary, seconds = run_import(
+            cursor, [mapping_row(n, t) for n, t in territories.items()], first_day, True)
+        print(f"First import of {args.accounts} accounts: {seconds:.2f}s {summary}")
+        if summary != {'inserted': args.accounts, 'updated': 0, 'unchanged': 0}:
+            failures.append(f"first import counts {summary}")
+
+        # Re-import today: every account again, some changed, some new
+        current = {n: (t + 1) % 200 if n in changed else t for n, t in territories.items()}
+        current.update({n: rng.randrange(200) for n in added})
+        summary, seconds = run_import(cursor, [mapping_row(n, t) for n, t in current.items()], today, True)
+        print(f"Re-import of {len(current)} accounts ({len(changed)} changed, {args.new} new): "
+              f"{seconds:.2f}s {summary}")
+        expected = {'inserted': args.new, 'updated': len(changed), 'unchanged': args.accounts - len(changed)}
+        if summary != expected:
+            failures.append(f"re-import counts {summary}, expected {expected}")
+
+        # Without --update-existing only accounts without a mapping are added
+        reverted = {n: territories[n] for n in changed}
+        reverted.update({n: rng.randrange(200) for n in late})
+        summary, seconds = run_import(cursor, [mapping_row(n, t) for n, t in reverted.items()], today, False)
+        print(f"Import without --update-existing of {len(reverted)} accounts: {seconds:.2f}s {summary}")
+        expected = {'inserted': len(late), 'updated': 0, 'unchanged': len(changed)}
+        if summary != expected:
+            failures.append(f"insert-only counts {summary}, expected {expected}")
+        current.update({n: reverted[n] for n in late})
+
+        # Every version the imports must have left
+        want = set()
+        for n, t in current.items():
+            account, rep, _, territory, _, region = mapping_row(n, t)
+            if n in changed:
+                old = mapping_row(n, territories[n])
+                want.add((account, old[1], old[3], old[5], first_day, today - timedelta(days=1)))
+                want.add((account, rep, territory, region, today, None))
+            else:
+                want.add((account, rep, territory, region, first_day if n in territories else today, None))
+        cursor.execute("""
+            SELECT account_number, sales_rep_name, territory_name, region, effective_date, end_date
+            FROM staging.account_territory_mapping WHERE account_number LIKE %s
+        """, (PREFIX + '%',))
+        have = set(cursor.fetchall())
+        for label, rows in (('missing', want - have), ('unexpected', have - want)):
+            if rows:
+                failures.append(f"{len(rows)} {label} versions, e.g. {sorted(rows, key=str)[0]}")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"{len(failures)} failed checks (all changes rolled back)")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Compare the integer-cents account table engine with the Decimal code it replaced.
+
+Generates random practice and territory inputs, computes the account table
+with app/services/account_table.py and with a copy of the previous
+Decimal/float implementation, and reports every row and totals field that
+differs. No database is needed.
+
+    python scripts/check_account_table_cents.py --trials 3000 --seed 1
+"""
+
+import argparse
+import os
+import random
+import sys
+from decimal import Decimal
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.account_table import PracticeInput, TerritoryInputs, compute_account_table
+
+
+def decimal_account_table(practices, territories):
+    """The account table as computed before the move to integer cents."""
+    def amount(cents):
+        return Decimal(cents) / 100
+
+    expenses = {t: amount(c) for t, c in territories.expenses_cents.items()}
+    cogs = {t: amount(c) for t, c in territories.cogs_cents.items()}
+    collector_costs = {t: amount(c) for t, c in territories.collector_cents.items()}
+    samples_by_territory = territories.samples
+
+    actual_revenue = {}
+    actual_placed = {}
+    for p in practices:
+        if p.collection_pct is not None:
+            placed = amount(p.placed_cents)
+            actual_revenue[p.territory] = actual_revenue.get(p.territory, Decimal('0')) + placed * Decimal(str(p.collection_pct))
+            actual_placed[p.territory] = actual_placed.get(p.territory, Decimal('0')) + placed
+    averages = {}
+    for territory in actual_revenue:
+        if actual_placed[territory] > 0:
+            averages[territory] = actual_revenue[territory] / actual_placed[territory]
+        else:
+            averages[territory] = Decimal('0.6')
+
+    baseline_eps = {}
+    for territory in expenses:
+        total_samples = samples_by_territory.get(territory, 0)
+        if total_samples > 0:
+            baseline_eps[territory] = (expenses[territory] - collector_costs.get(territory, Decimal('0'))) / total_samples
+        else:
+            baseline_eps[territory] = Decimal('0')
+
+    rows = []
+    total_revenue = total_cogs = total_profit = total_sales_expense = total_net_income = Decimal('0')
+    total_collector_cost = Decimal('0')
+    total_samples = 0
+    for p in practices:
+        if p.collection_pct is not None:
+            collection_pct_str = f"{round(p.collection_pct * 100)}%"
+            pct = Decimal(str(p.collection_pct))
+            revenue_periods = p.revenue_periods
+        else:
+            pct = averages.get(p.territory, Decimal('0.9'))
+            collection_pct_str = f"{round(pct * 100)}%"
+            revenue_periods = 0
+        count = p.sample_count
+        placed = amount(p.placed_cents)
+        revenue = placed * pct
+        territory_samples = samples_by_territory.get(p.territory, 0)
+        cogs_per_sample = cogs.get(p.territory, Decimal('0')) / territory_samples if territory_samples > 0 else Decimal('0')
+        cogs_allocated = cogs_per_sample * count
+        collector_cost = amount(p.collector_cost_cents)
+        profit = revenue - cogs_allocated
+        eps = baseline_eps.get(p.territory, Decimal('0'))
+        if p.collector == 'Y' and count > 0:
+            eps += collector_cost / count
+        territory_expenses = expenses.get(p.territory, Decimal('0'))
+        sales_expense = territory_expenses / territory_samples * count if territory_samples > 0 else Decimal('0')
+        net_income = revenue - cogs_allocated - sales_expense
+
+        total_revenue += revenue
+        total_cogs += cogs_allocated
+        total_profit += profit
+        total_sales_expense += sales_expense
+        total_net_income += net_income
+        total_collector_cost += collector_cost
+        total_samples += count
+        rows.append({
+            'practice': p.practice,
+            'territory': p.territory,
+            'placed': round(float(placed), 2),
+            'revenue': round(float(revenue), 2),
+            'cogs': round(float(cogs_allocated), 2),
+            'profit': round(float(profit), 2),
+            'sales_expense': round(float(sales_expense), 2),
+            'net_income': round(float(net_income), 2),
+            'ros': round(float(net_income / sales_expense * 100)) if sales_expense > 0 else 0,
+            'collection_pct': collection_pct_str,
+            'revenue_periods': revenue_periods,
+            'rps': round(float(revenue / count), 2) if count > 0 else 0.0,
+            'bps': round(float(placed / count), 2) if count > 0 else 0.0,
+            'gpps': round(float(profit / count), 2) if count > 0 else 0.0,
+            'eps': round(float(eps), 2),
+            'nips': round(float(net_income / count), 2) if count > 0 else 0.0,
+            'collector': p.collector,
+            'collector_cost': round(float(collector_cost), 2),
+            'sample_count': count
+        })
+
+    total_placed = sum((amount(p.placed_cents) for p in practices), Decimal('0'))
+    net = total_revenue - total_cogs - total_sales_expense
+    placed_with_history = sum(actual_placed.values())
+    avg_collection_pct = sum(actual_revenue.values()) / placed_with_history * 100 if placed_with_history > 0 else 0
+    totals = {
+        'practice': 'TOTAL',
+        'territory': '',
+        'placed': round(float(total_placed), 2),
+        'revenue': round(float(total_revenue), 2),
+        'cogs': round(float(total_cogs), 2),
+        'profit': round(float(total_profit), 2),
+        'sales_expense': round(float(total_sales_expense), 2),
+        'net_income': round(float(net), 2),
+        'ros': round(float(net / total_sales_expense * 100)) if total_sales_expense > 0 else 0,
+        'collection_pct': f"{round(avg_collection_pct, 1)}%",
+        'rps': round(float(total_revenue / total_samples), 2) if total_samples > 0 else 0.0,
+        'bps': round(float(total_placed / total_samples), 2) if total_samples > 0 else 0.0,
+        'gpps': round(float(total_profit / total_samples), 2) if total_samples > 0 else 0.0,
+        'eps': round(float((sum(expenses.values()) - sum(collector_costs.values())) / total_samples), 2) if total_samples > 0 else 0.0,
+        'nips': round(float(net / total_samples), 2) if total_samples > 0 else 0,
+        'collector': '',
+        'collector_cost': round(float(total_collector_cost / len(rows)), 2) if rows else 0.0,
+        'sample_count': total_samples
+    }
+    return rows, totals
+
+
+def random_inputs(rng):
+    """Random practices over a few territories, including the edge cases the engine handles."""
+    territories = [f"T{i}" for i in range(rng.randint(1, 4))]
+    practices = []
+    for i in range(rng.randint(1, 25)):
+        territory = rng.choice(territories)
+        has_history = rng.random() < 0.7
+        collection_pct = rng.choice([
+            rng.random(), round(rng.random(), 2), rng.randint(1, 9) / 7, 1.0, 0.0
+        ]) if has_history else None
+        practices.append(PracticeInput(
+            practice=f"Practice {i}",
+            territory=territory,
+            placed_cents=rng.choice([0, rng.randint(0, 10 ** 9), rng.randint(0, 10 ** 5)]),
+            sample_count=rng.choice([0, rng.randint(1, 500)]),
+            collection_pct=collection_pct,
+            revenue_periods=rng.randint(1, 6) if has_history else 0,
+            collector=rng.choice('YN'),
+            collector_cost_cents=rng.randint(0, 10 ** 7)
+        ))
+    samples = {t: sum(p.sample_count for p in practices if p.territory == t) + rng.choice([0, rng.randint(0, 50)])
+               for t in territories}
+    some = lambda: {t: rng.randint(0, 10 ** 8) for t in territories if rng.random() < 0.8}
+    return practices, TerritoryInputs(some(), some(), samples, some())
+
+
+def main():
+    """Run the comparison and exit non-zero on any difference."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trials', type=int, default=1000, help='random account tables to compare')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for a repeatable run')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    for trial in range(args.trials):
+        practices, territories = random_inputs(rng)
+        rows, totals = compute_account_table(practices, territories)
+        expected_rows, expected_totals = decimal_account_table(practices, territories)
+        for row, expected in zip(rows + [totals], expected_rows + [expected_totals]):
+            for field, value in expected.items():
+                if row.get(field) != value:
+                    mismatches += 1
+                    print(f"trial {trial} {row['practice']} {field}: cents={row.get(field)!r} decimal={value!r}")
+    print(f"Compared {args.trials} account tables: {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
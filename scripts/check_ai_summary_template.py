@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Check that the template AI summary is deterministic.
+
+TemplateGenerator (app/services/ai_summary.py) is used offline and in place
+of the model, and its text is cached under summary_key(). This generates
+summaries for fixed and random figures and checks that the text and the key
+depend only on the figures: repeated calls, fresh generators, reordered
+dict keys and a second interpreter with another hash seed all give the same
+result. No database or network is needed.
+
+    python scripts/check_ai_summary_template.py --trials 200 --seed 1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ai_summary import OpenAIGenerator, TemplateGenerator, summary_key
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+# Fixed cases: a normal year, a year with losses, no monthly trend, no revenue
+FIXED_INPUTS = [
+    ({'total_revenue': 1200000.0, 'total_cogs': 240000.0, 'total_expenses': 600000.0,
+      'net_operating_income': 360000.0, 'bps': 0.61},
+     [{'month_name': 'January', 'revenue': 90000.0, 'income': 20000.0},
+      {'month_name': 'February', 'revenue': 110000.0, 'income': 35000.0},
+      {'month_name': 'March', 'revenue': 130000.0, 'income': 41000.0}]),
+    ({'total_revenue': 300000.0, 'total_cogs': 150000.0, 'total_expenses': 180000.0,
+      'net_operating_income': -30000.0, 'bps': 0.42},
+     [{'month_name': 'April', 'revenue': 120000.0, 'income': -5000.0},
+      {'month_name': 'May', 'revenue': 80000.0, 'income': -40000.0},
+      {'month_name': 'June', 'revenue': 100000.0, 'income': 15000.0}]),
+    ({'total_revenue': 50000.0, 'total_cogs': 5000.0, 'total_expenses': 10000.0,
+      'net_operating_income': 35000.0}, []),
+    ({'total_revenue': 0.0, 'total_cogs': 0.0, 'total_expenses': 0.0,
+      'net_operating_income': 0.0, 'bps': 0}, [{'month_name': 'July', 'revenue': 0.0, 'income': 0.0}]),
+]
+
+
+def random_inputs(rng):
+    """Random figures shaped like the dashboard's financial summary and monthly trend."""
+    revenue = rng.choice([0.0, round(rng.uniform(0, 5e6), 2)])
+    cogs = round(rng.uniform(0, revenue or 1000), 2)
+    expenses = round(rng.uniform(0, revenue or 1000), 2)
+    summary = {'total_revenue': revenue, 'total_cogs': cogs, 'total_expenses': expenses,
+               'net_operating_income': round(revenue - cogs - expenses, 2), 'bps': round(rng.random(), 4)}
+    start = rng.randrange(len(MONTHS))
+    monthly = [{'month_name': MONTHS[(start + i) % len(MONTHS)],
+                'revenue': rng.choice([0.0, round(rng.uniform(0, 5e5), 2)]),
+                'income': round(rng.uniform(-1e5, 1e5), 2)}
+               for i in range(rng.randint(0, 12))]
+    return summary, monthly
+
+
+def reordered(value):
+    """The same data with every dict's keys in reverse order."""
+    if isinstance(value, dict):
+        return {key: reordered(value[key]) for key in reversed(list(value))}
+    if isinstance(value, list):
+        return [reordered(item) for item in value]
+    return value
+
+
+def digest(cases):
+    """sha256 over the summaries and keys of cases, to compare interpreters."""
+    generator = TemplateGenerator()
+    h = hashlib.sha256()
+    for summary, monthly in cases:
+        h.update(generator.generate(summary, monthly).encode('utf-8'))
+        h.update(summary_key(summary, monthly, TemplateGenerator.name).encode('utf-8'))
+    return h.hexdigest()
+
+
+def main():
+    """Run the checks and exit non-zero on any difference."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trials', type=int, default=200, help='random figures to check')
+    parser.add_argument('--seed', type=int, default=None, help='random seed, for a repeatable run')
+    parser.add_argument('--digest', metavar='CASES_JSON', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.digest:
+        # Child process of the cross-interpreter check
+        print(digest(json.load(open(args.digest))))
+        return
+
+    rng = random.Random(args.seed)
+    cases = FIXED_INPUTS + [random_inputs(rng) for _ in range(args.trials)]
+    failures = 0
+    for number, (summary, monthly) in enumerate(cases):
+        text = TemplateGenerator().generate(summary, monthly)
+        key = summary_key(summary, monthly, TemplateGenerator.name)
+        checks = {
+            'repeated call': TemplateGenerator().generate(summary, monthly) == text,
+            'reordered keys': TemplateGenerator().generate(reordered(summary), reordered(monthly)) == text,
+            'key of reordered keys': summary_key(reordered(summary), reordered(monthly), TemplateGenerator.name) == key,
+            'inputs unchanged': summary_key(summary, monthly, TemplateGenerator.name) == key,
+            'key per backend': summary_key(summary, monthly, OpenAIGenerator.name) != key,
+        }
+        for name, passed in checks.items():
+            if not passed:
+                failures += 1
+                print(f"case {number}: {name} differs")
+
+    # Another interpreter with another hash seed must produce the same text and keys
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f".ai_summary_cases.{os.getpid()}.json")
+    try:
+        with open(path, 'w') as f:
+            json.dump(cases, f)
+        env = dict(os.environ, PYTHONHASHSEED=str(rng.randint(1, 2 ** 31)))
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--digest', path],
+                               env=env, capture_output=True, text=True, check=True)
+    finally:
+        os.remove(path)
+    if child.stdout.strip() != digest(json.loads(json.dumps(cases))):
+        failures += 1
+        print("a second interpreter produced different summaries or keys")
+
+    print(f"Checked {len(cases)} template summaries: {failures} failures")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
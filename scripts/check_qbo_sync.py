@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Run the QBO sync against recorded responses and check what it wrote.
+
+Starts scripts/qbo_replay_server.py on a local port with
+scripts/fixtures/qbo_sync_session.json, stores a token for the fixture's
+company with its cursors at the start of the recording and runs
+app/services/qbo_sync.py six times against it, on the recording's clock: an
+expired token refreshed on a 401, CDC paging of a full page, deleted
+objects, an unchanged object that must not be rewritten, an edited object, a
+throttled request, a full page within one second read by query with
+STARTPOSITION, and cursors older than the CDC window caught up by query.
+Each run's rows in raw.qbo_transactions, cursors in staging.qbo_sync_state
+and the stored token are checked, and so are the requests the sync made. Needs DATABASE_URL; only the fixture's company and
+transactions are touched, and they are removed again at the end.
+
+    python scripts/check_qbo_sync.py
+"""
+
+import argparse
+import os
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.qbo_sync import SYNC_LOCK_ID, SYNC_STATE_TABLE_SQL, QBOClient, QBOSync, parse_qbo_time
+from qbo_replay_server import ReplayServer  # scripts/, next to this script
+
+load_dotenv()
+
+SESSION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'qbo_sync_session.json')
+REALM_ID = '9341453050000001'
+USER_ID = 0
+QBO_IDS = ['Invoice:990001', 'Invoice:990002', 'Invoice:990003', 'Invoice:990004', 'Invoice:990005',
+           'Invoice:990006', 'Payment:990101']
+# Where the recording starts; stored as the cursors so the first call does not depend on today's date
+STARTED_AT = '2025-05-20T00:00:00-07:00'
+# The sync's clock: within the CDC window of every cursor until run 6
+RECORDED_AT = '2025-06-03T09:00:00-07:00'
+CATCH_UP_AT = '2025-07-20T08:00:00-07:00'
+
+failures = []
+
+
+def check(name, passed, detail=''):
+    print(f"{'ok' if passed else 'FAILED'}: {name}{f' ({detail})' if detail and not passed else ''}")
+    if not passed:
+        failures.append(name)
+
+
+def get_db_connection():
+    """Get database connection."""
+    return psycopg2.connect(os.getenv('DATABASE_URL'))
+
+
+def fetch_rows(cursor):
+    cursor.execute("""
+        SELECT qbo_id, amount, description, is_deleted, updated_at
+        FROM raw.qbo_transactions WHERE qbo_id = ANY(%s)
+    """, (QBO_IDS,))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def fetch_cursors(cursor):
+    cursor.execute("""
+        SELECT entity, changed_since, error_message FROM staging.qbo_sync_state WHERE realm_id = %s
+    """, (REALM_ID,))
+    return {entity: (changed_since, error) for entity, changed_since, error in cursor.fetchall()}
+
+
+def at(value):
+    return parse_qbo_time(value)
+
+
+def cleanup(conn):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM raw.qbo_transactions WHERE qbo_id = ANY(%s)", (QBO_IDS,))
+    cursor.execute("DELETE FROM staging.qbo_tokens WHERE realm_id = %s", (REALM_ID,))
+    cursor.execute("SELECT to_regclass('staging.qbo_sync_state') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("DELETE FROM staging.qbo_sync_state WHERE realm_id = %s", (REALM_ID,))
+    conn.commit()
+    cursor.close()
+
+
+def main():
+    """Run the replayed syncs and exit non-zero on any failed check."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT qbo_id FROM raw.qbo_transactions WHERE qbo_id = ANY(%s)", (QBO_IDS,))
+    existing = [row[0] for row in cursor.fetchall()]
+    if existing:
+        print(f"raw.qbo_transactions already has the fixture transactions {existing}; not touching them")
+        sys.exit(2)
+    cleanup(conn)
+    cursor.execute("""
+        INSERT INTO staging.qbo_tokens (user_id, realm_id, access_token, refresh_token, expires_at)
+        VALUES (%s, %s, 'replay-access-token-1', 'replay-refresh-token-1', NOW() + INTERVAL '1 hour')
+    """, (USER_ID, REALM_ID))
+    cursor.execute(SYNC_STATE_TABLE_SQL)
+    cursor.execute("""
+        INSERT INTO staging.qbo_sync_state (realm_id, entity, changed_since)
+        VALUES (%s, 'Invoice', %s), (%s, 'Payment', %s)
+    """, (REALM_ID, at(STARTED_AT), REALM_ID, at(STARTED_AT)))
+    conn.commit()
+
+    server = ReplayServer.from_file(SESSION).start()
+    client = QBOClient(server.base_url, token_url=server.token_url, client_id='replay', client_secret='replay')
+    clock = {'now': at(RECORDED_AT)}
+    sync = QBOSync(get_db_connection, client, entities=('Invoice', 'Payment'), page_limit=2, realm_ids=[REALM_ID],
+                   clock=lambda: clock['now'])
+    try:
+        # Run 1: 401 -> token refresh -> retry; a full invoice page is followed by a second call
+        results = sync.run_once()
+        check('run 1 syncs the company', results == {REALM_ID: 4}, results)
+        cursor.execute("SELECT access_token, refresh_token FROM staging.qbo_tokens WHERE realm_id = %s", (REALM_ID,))
+        check('refreshed token is stored', cursor.fetchone() == ('replay-access-token-2', 'replay-refresh-token-2'))
+        rows = fetch_rows(cursor)
+        check('all changed objects are written', sorted(rows) == QBO_IDS[:3] + QBO_IDS[-1:], sorted(rows))
+        check('amounts are copied', float(rows.get('Invoice:990002', (0,))[0]) == 80.5)
+        cursors = fetch_cursors(cursor)
+        check('full page continues from its newest change, then the server time',
+              cursors.get('Invoice', (None,))[0] == at('2025-06-01T10:00:05-07:00'), cursors.get('Invoice'))
+        check('entity without a full page moves to the server time',
+              cursors.get('Payment', (None,))[0] == at('2025-06-01T10:00:00-07:00'), cursors.get('Payment'))
+        unchanged_at = rows.get('Invoice:990002', (None,) * 4)[3]
+        conn.commit()
+
+        # Run 2: one call per cursor; a deleted invoice and an unchanged one fill the invoice page
+        results = sync.run_once()
+        check('run 2 reads both changes', results == {REALM_ID: 2}, results)
+        rows = fetch_rows(cursor)
+        check('deleted object is flagged, not removed', rows.get('Invoice:990001', (None,) * 3)[2] is True)
+        check('unchanged object is not rewritten', rows.get('Invoice:990002', (None,) * 4)[3] == unchanged_at)
+        cursors = fetch_cursors(cursor)
+        check('cursors move to the server time',
+              {entity: since for entity, (since, _) in cursors.items()} ==
+              {'Invoice': at('2025-06-02T08:00:00-07:00'), 'Payment': at('2025-06-02T08:00:00-07:00')}, cursors)
+        conn.commit()
+
+        # Run 3: an edited invoice
+        results = sync.run_once()
+        check('run 3 reads the edit', results == {REALM_ID: 1}, results)
+        rows = fetch_rows(cursor)
+        amount, description = rows.get('Invoice:990003', (None, None))[:2]
+        check('edited object is updated', (amount, description) == (75.25, 'Panel C, corrected'),
+              (amount, description))
+        conn.commit()
+
+        # Run 4: throttled; the error is recorded and nothing moves
+        results = sync.run_once()
+        check('throttled run fails the company', results == {REALM_ID: None}, results)
+        cursors = fetch_cursors(cursor)
+        check('cursors stay put after a failure',
+              all(since == at('2025-06-03T08:00:00-07:00') for since, _ in cursors.values()), cursors)
+        check('failure is recorded', all(error and 'HTTP 429' in error for _, error in cursors.values()), cursors)
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", (SYNC_LOCK_ID,))
+        check('sync lock is released', cursor.fetchone()[0])
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (SYNC_LOCK_ID,))
+        conn.commit()
+
+        # Run 5: a full invoice page within the cursor's second is finished by query
+        results = sync.run_once()
+        check('run 5 reads the whole second', results == {REALM_ID: 5}, results)
+        rows = fetch_rows(cursor)
+        check('objects past the full page are written',
+              all(qbo_id in rows for qbo_id in ('Invoice:990004', 'Invoice:990005', 'Invoice:990006')), sorted(rows))
+        cursors = fetch_cursors(cursor)
+        check('cursor moves past the second, then to the server time',
+              {entity: since for entity, (since, _) in cursors.items()} ==
+              {'Invoice': at('2025-06-03T09:00:03-07:00'), 'Payment': at('2025-06-03T09:00:00-07:00')}, cursors)
+        conn.commit()
+
+        # Run 6: six weeks later both cursors are older than the CDC window
+        clock['now'] = at(CATCH_UP_AT)
+        results = sync.run_once()
+        check('run 6 catches up by query', results == {REALM_ID: 1}, results)
+        rows = fetch_rows(cursor)
+        check('change found by query is written', float(rows.get('Invoice:990003', (0,))[0]) == 77.0,
+              rows.get('Invoice:990003'))
+        cursors = fetch_cursors(cursor)
+        check('caught-up cursors move to the query server time',
+              {entity: since for entity, (since, _) in cursors.items()} ==
+              {'Invoice': at('2025-07-20T08:00:00-07:00'), 'Payment': at('2025-07-20T08:00:01-07:00')}, cursors)
+        conn.commit()
+
+        check('requests match the recording', not server.errors, '; '.join(server.errors))
+        check('every recorded exchange was requested', server.remaining == 0, f"{server.remaining} left")
+    finally:
+        server.stop()
+        conn.rollback()
+        cleanup(conn)
+        cursor.close()
+        conn.close()
+
+    print(f"{len(failures)} failed checks")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
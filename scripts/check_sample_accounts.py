@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compare the sample_billing queries with the account_data join they replaced.
+
+sample_billing carries the practice, territory and sales rep of its client
+account, resolved from account_data at load time
+(app/services/sample_accounts.py), and the dashboard, range index, payer-mix
+cube and exports group it alone. This runs each of those queries as it is
+and again with sample_billing replaced by its join to account_data on
+client_account_number, the form they had before, over the whole placement
+date range, and checks that both return the same rows. It also reports
+rows whose resolved values are stale and account numbers listed more than
+once in account_data, either of which makes the two differ. Timings are the
+best of --repeat runs of each form. Read-only; needs DATABASE_URL.
+
+    python scripts/check_sample_accounts.py --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.exports import dataset_query
+from app.services.payer_mix import REBUILD_SQL
+from app.services.range_index import DUPLICATE_SAMPLES_SQL, INDEX_SQL
+from app.services.sample_accounts import RESOLVED_COLUMNS
+from app.utils.queries import (
+    ACCOUNT_DRILLDOWN, PRACTICE_MONTHLY_PLACEMENTS, PRACTICE_PERIOD_COLLECTIONS, PRACTICE_PLACEMENTS,
+    TERRITORY_SAMPLES, queries
+)
+
+load_dotenv()
+
+# Rows that resolve_sample_accounts() would still write
+STALE_SQL = """
+    SELECT COUNT(*) FROM sample_billing sb
+    LEFT JOIN account_data ad ON ad.account_number = sb.client_account_number
+    WHERE (sb.account_id, sb.practice_name, sb.territory, sb.sales_rep)
+          IS DISTINCT FROM (ad.id, ad.practice_name, ad.territory, ad.sales_rep)
+"""
+
+
+def get_db_connection():
+    """Get database connection."""
+    return psycopg2.connect(os.getenv('DATABASE_URL'))
+
+
+def joined(sql, base_columns):
+    """sql with sample_billing sb replaced by its join to account_data."""
+    source = (
+        f"(SELECT {', '.join('b.' + column for column in base_columns)}, ad.id AS account_id, "
+        "ad.practice_name, ad.territory, ad.sales_rep "
+        "FROM sample_billing b JOIN account_data ad ON b.client_account_number = ad.account_number) sb"
+    )
+    if sql.count('FROM sample_billing sb') != 1:
+        raise ValueError(f"expected one 'FROM sample_billing sb' in {sql}")
+    return sql.replace('FROM sample_billing sb', f"FROM {source}")
+
+
+def run(cursor, sql, params, repeat):
+    """(rows as a multiset, best time in seconds)."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return Counter(rows), best
+
+
+def main():
+    """Run both forms of every query and exit non-zero on any difference."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each form; the best time is shown')
+    parser.add_argument('--practices', type=int, default=5, help='practices to check per-practice queries for')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    conn.set_session(readonly=True)
+    cursor = conn.cursor()
+    failures = 0
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'sample_billing' AND table_schema = current_schema()
+            ORDER BY ordinal_position
+        """)
+        base_columns = [row[0] for row in cursor.fetchall() if row[0] not in RESOLVED_COLUMNS]
+        cursor.execute("SELECT MIN(DATE(placement_date)), MAX(DATE(placement_date)) FROM sample_billing")
+        start, end = cursor.fetchone()
+        cursor.execute("""
+            SELECT practice_name FROM sample_billing WHERE practice_name IS NOT NULL
+            GROUP BY practice_name ORDER BY COUNT(*) DESC, practice_name LIMIT %s
+        """, (args.practices,))
+        practices = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT territory FROM sample_billing WHERE territory IS NOT NULL ORDER BY territory LIMIT 1")
+        territory = (cursor.fetchone() or (None,))[0]
+
+        cursor.execute(STALE_SQL)
+        stale = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) - COUNT(DISTINCT account_number) FROM account_data")
+        repeated = cursor.fetchone()[0]
+        print(f"Placement dates {start} to {end}; {stale} rows with stale resolved values; "
+              f"{repeated} repeated account numbers in account_data")
+        if stale:
+            failures += 1
+            print("FAILED: run the resolve (scripts/backup/resolve_sample_accounts.py) before comparing")
+
+        cases = [
+            ('practice_placements', queries.sql(PRACTICE_PLACEMENTS), (start, end)),
+            ('practice_monthly_placements', queries.sql(PRACTICE_MONTHLY_PLACEMENTS), (start, end)),
+            ('territory_samples', queries.sql(TERRITORY_SAMPLES), (start, end)),
+            ('account_drilldown', queries.sql(ACCOUNT_DRILLDOWN), (start, end)),
+            ('range index', INDEX_SQL, None),
+            ('range index duplicates', DUPLICATE_SAMPLES_SQL, None),
+            ('payer-mix cube', REBUILD_SQL[REBUILD_SQL.index('SELECT'):], None),
+            ('export practice_month', *dataset_query('practice_month', start, end)),
+            ('export practice_month by territory', *dataset_query('practice_month', start, end, territory=territory)),
+            ('export sample_billing', *dataset_query('sample_billing', start, end)),
+        ]
+        cases += [(f"practice_period_collections {practice}", queries.sql(PRACTICE_PERIOD_COLLECTIONS),
+                   (practice, start, end)) for practice in practices]
+
+        print(f"{'query':<48} {'rows':>8} {'resolved':>10} {'join':>10}")
+        for name, sql, params in cases:
+            resolved_rows, resolved_time = run(cursor, sql, params, args.repeat)
+            join_rows, join_time = run(cursor, joined(sql, base_columns), params, args.repeat)
+            same = resolved_rows == join_rows
+            print(f"{name:<48} {sum(resolved_rows.values()):>8} {resolved_time * 1000:>8.1f}ms "
+                  f"{join_time * 1000:>8.1f}ms{'' if same else '  DIFFERENT'}")
+            if not same:
+                failures += 1
+                print(f"  only resolved: {sorted((resolved_rows - join_rows).elements(), key=str)[:3]}")
+                print(f"  only join: {sorted((join_rows - resolved_rows).elements(), key=str)[:3]}")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+    print(f"{failures} failed checks")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
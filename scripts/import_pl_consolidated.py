@@ -7,9 +7,15 @@ Creates a table structure suitable for the Company Overview dashboard.
 import pandas as pd
 import psycopg2
 import os
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.generations import PL_FACTS, bump_generations
+
 load_dotenv()
 
 def get_db_connection():
@@ -103,6 +109,8 @@ def import_pl_consolidated_data():
                 float(row['amount'])
             ))
         
+        # Dashboard workers reload their P&L facts once this commits
+        bump_generations(cursor, PL_FACTS)
         conn.commit()
         print("✅ PL Consolidated data imported successfully")
         
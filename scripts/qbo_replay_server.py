@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the QBO API that replays recorded responses.
+
+A session file is a JSON list of exchanges in the order the sync makes its
+requests:
+
+    {"request": {"method": "GET", "path": "/v3/company/<realm>/cdc",
+                 "query": {"entities": "Invoice,Payment", "changedSince": "..."},
+                 "headers": {"Authorization": "Bearer ..."}},
+     "response": {"status": 200, "body": {...}}}
+
+An optional "note" describes the exchange. POST requests can list the form
+fields they must carry under "form". Each
+request must match the next exchange on its method, path and every query
+parameter, header and form field the exchange lists (timestamps are
+compared as instants). A request that does not match, or comes after the
+last exchange, is answered with HTTP 500 and recorded in errors.
+
+Point the sync at it with QBO_API_BASE_URL=http://127.0.0.1:<port> and
+QBO_TOKEN_URL=http://127.0.0.1:<port>/oauth2/v1/tokens/bearer:
+
+    python scripts/qbo_replay_server.py scripts/fixtures/qbo_sync_session.json --port 8765
+"""
+
+import argparse
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TOKEN_PATH = '/oauth2/v1/tokens/bearer'
+
+
+def _same(expected, actual):
+    """Whether a recorded value matches a request value; timestamps match as instants."""
+    if expected == actual:
+        return True
+    try:
+        return datetime.fromisoformat(expected.replace('Z', '+00:00')) == \
+            datetime.fromisoformat(actual.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return False
+
+
+class ReplayServer:
+    """Replays a list of recorded exchanges over HTTP on a background thread."""
+
+    def __init__(self, exchanges, host='127.0.0.1', port=0):
+        self.exchanges = list(exchanges)
+        self.requests = []
+        self.errors = []
+        self._lock = threading.Lock()
+        self._position = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self):
+        return f"{self.base_url}{TOKEN_PATH}"
+
+    @property
+    def remaining(self):
+        """Exchanges not requested yet."""
+        with self._lock:
+            return len(self.exchanges) - self._position
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='qbo-replay', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, method, path, query, headers, form):
+        """(status, body) for a request, from the next exchange."""
+        with self._lock:
+            self.requests.append({'method': method, 'path': path, 'query': query, 'form': form})
+            if self._position >= len(self.exchanges):
+                return self._error(f"unexpected request {method} {path} {query}: no exchanges left")
+            exchange = self.exchanges[self._position]
+            self._position += 1
+        expected = exchange['request']
+        problems = []
+        if expected.get('method', 'GET') != method or expected['path'] != path:
+            problems.append(f"expected {expected.get('method', 'GET')} {expected['path']}, got {method} {path}")
+        for source, name in ((query, 'query'), (headers, 'headers'), (form, 'form')):
+            for key, value in expected.get(name, {}).items():
+                if not _same(value, source.get(key)):
+                    problems.append(f"{name} {key}: expected {value!r}, got {source.get(key)!r}")
+        if problems:
+            return self._error(f"exchange {self._position}: " + '; '.join(problems))
+        response = exchange['response']
+        return response.get('status', 200), response.get('body', {})
+
+    def _error(self, message):
+        self.errors.append(message)
+        return 500, {'Fault': {'Error': [{'Message': 'Replay mismatch', 'Detail': message}], 'type': 'REPLAY'}}
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._reply({})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                self._reply(form)
+
+            def _reply(self, form):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = replay.respond(self.command, url.path, query, dict(self.headers), form)
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    """Serve a session file until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('session', help='JSON file of recorded exchanges')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ReplayServer.from_file(args.session, host=args.host, port=args.port).start()
+    print(f"Replaying {len(server.exchanges)} exchanges on {server.base_url} (token URL {server.token_url})")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        for error in server.errors:
+            print(f"Mismatch: {error}")
+        print(f"{server.remaining} exchanges not requested")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Sync QuickBooks Online transactions into raw.qbo_transactions.
+
+Pulls only the changes since the last run (see app/services/qbo_sync.py)
+and transforms them into staging.transactions_cleaned and
+analytics.territory_performance (app/services/qbo_transform.py).
+Runs once by default; --interval keeps syncing every N seconds, which is how
+the sync runs as its own process instead of inside the web workers.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.qbo_sync import QBOClient, QBOSync
+from app.services.qbo_transform import transform_qbo_transactions
+
+load_dotenv()
+
+def get_db_connection():
+    """Get database connection."""
+    return psycopg2.connect(os.getenv('DATABASE_URL'))
+
+def main():
+    """Run the QBO sync once or on an interval."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--interval', type=int, default=0,
+                        help='seconds between syncs; 0 (default) syncs once and exits')
+    parser.add_argument('--initial-days', type=int, default=int(os.getenv('QBO_SYNC_INITIAL_DAYS', '30')),
+                        help="how far back a company synced for the first time starts "
+                             "(past QBO's 30-day CDC window it is read by query)")
+    args = parser.parse_args()
+
+    sync = QBOSync(get_db_connection, QBOClient.from_env(os.environ), initial_days=args.initial_days,
+                   after_sync=transform_qbo_transactions)
+    while True:
+        started = time.perf_counter()
+        results = sync.run_once()
+        if results is None:
+            print("Another QBO sync is running, skipped")
+        else:
+            for realm_id, written in results.items():
+                print(f"{realm_id}: {'failed' if written is None else f'{written} changes'}")
+            print(f"QBO sync finished in {time.perf_counter() - started:.2f}s")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()